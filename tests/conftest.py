@@ -1,4 +1,6 @@
 import os
+import shutil
+import tempfile
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 root_dir_content = os.listdir(BASE_DIR)
@@ -37,3 +39,21 @@ pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+def pytest_sessionstart(session):
+    """Файлы кэша во временном каталоге, как у yatube.test_runner:
+    тесты не пишут в кэш работающего сайта. Кэш нужен уже при сборе
+    тестов, поэтому настройки меняются до него, а не в фикстуре."""
+    from django.test.utils import override_settings
+    from yatube.settings import cache_settings
+
+    session.cache_dir = tempfile.mkdtemp(prefix='yatube-cache-')
+    session.cache_override = override_settings(
+        CACHES=cache_settings(session.cache_dir))
+    session.cache_override.enable()
+
+
+def pytest_sessionfinish(session):
+    session.cache_override.disable()
+    shutil.rmtree(session.cache_dir, ignore_errors=True)
@@ -0,0 +1,51 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Job, OutboxMessage
+
+
+@admin.register(OutboxMessage)
+class OutboxMessageAdmin(admin.ModelAdmin):
+    list_display = (
+        'subject',
+        'recipients',
+        'created',
+        'attempts',
+        'next_attempt',
+        'dead',
+    )
+    list_filter = ('dead',)
+    search_fields = ('recipients',)
+    exclude = ('message',)
+    readonly_fields = ('subject', 'recipients', 'created', 'last_error')
+    actions = ('retry',)
+
+    def retry(self, request, queryset):
+        updated = queryset.update(
+            dead=False, attempts=0, next_attempt=timezone.now())
+        self.message_user(request, f'Писем снова в очереди: {updated}')
+    retry.short_description = 'Отправить ещё раз'
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = (
+        'task',
+        'queue',
+        'status',
+        'priority',
+        'run_at',
+        'attempts',
+        'finished',
+    )
+    list_filter = ('status', 'queue')
+    search_fields = ('task', 'key')
+    readonly_fields = ('created', 'started', 'finished', 'last_error')
+    actions = ('retry',)
+
+    def retry(self, request, queryset):
+        updated = queryset.filter(status=Job.FAILED).update(
+            status=Job.QUEUED, attempts=0, run_at=timezone.now(),
+            finished=None)
+        self.message_user(request, f'Задач снова в очереди: {updated}')
+    retry.short_description = 'Выполнить ещё раз'
@@ -0,0 +1,341 @@
+"""Кэш в отображённом в память файле, общий для всех процессов хоста.
+
+Файл состоит из заголовка и хэш-таблицы фиксированного размера.
+Таблица разбита на корзины по `WAYS` слотов: ключ попадает в одну
+корзину и занимает в ней свободный, устаревший или давно не читанный
+слот (LRU в пределах корзины).
+
+Размеры таблицы входят в имя файла: процесс с другими SLOTS,
+SLOT_SIZE или WAYS (например, во время выкладки) открывает свой файл,
+а не переформатирует тот, который отображён в память другими
+процессами.
+
+Чтение не берёт блокировок: у каждого слота есть счётчик `seq`, который
+запись делает нечётным на время изменения. Читатель копирует слот и
+повторяет чтение, если счётчик был нечётным или изменился. Записи в
+одну корзину сериализуются блокировкой диапазона байтов файла (между
+процессами) и `threading.Lock` (между потоками процесса).
+"""
+import fcntl
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import threading
+import time
+import zlib
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+
+MAGIC = b'YTCACHE1'
+HEADER = struct.Struct('=8sIIIQ')
+HEADER_SIZE = 64
+GENERATION_OFFSET = 20
+
+SLOT = struct.Struct('=QQQdQIIH')
+SLOT_HEADER_SIZE = 64
+TICK_OFFSET = 8
+
+COMPRESSED = 1
+READ_RETRIES = 100
+LOCK_STRIPES = 64
+
+_tables = {}
+_tables_lock = threading.Lock()
+
+
+def table_path(location, slots, slot_size, ways):
+    """Путь к файлу таблицы: LOCATION с размерами перед расширением."""
+    root, extension = os.path.splitext(location)
+    return f'{root}.{slots}x{slot_size}x{ways}{extension}'
+
+
+def key_hash(key):
+    digest = hashlib.blake2b(key, digest_size=8).digest()
+    return int.from_bytes(digest, 'little') or 1
+
+
+class Table:
+    """Хэш-таблица в общем файле, без знания о ключах Django."""
+
+    def __init__(self, location, slots, slot_size, ways):
+        self.slots = slots - slots % ways
+        self.slot_size = slot_size
+        self.ways = ways
+        self.buckets = self.slots // ways
+        self.size = HEADER_SIZE + self.slots * slot_size
+        self.capacity = slot_size - SLOT_HEADER_SIZE
+        self.stripes = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self.evictions = 0
+        path = self.path = table_path(location, self.slots, slot_size, ways)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        with self.locked(0, HEADER_SIZE):
+            self._format()
+        self.map = mmap.mmap(self.fd, self.size)
+
+    def _format(self):
+        """Размечает новый файл. Файл, который могут отображать другие
+        процессы, никогда не укорачивается: обращение к отрезанным
+        страницам убило бы их сигналом SIGBUS."""
+        header = os.pread(self.fd, HEADER.size, 0)
+        expected = (MAGIC, self.slots, self.slot_size, self.ways)
+        size = os.fstat(self.fd).st_size
+        if not header.strip(b'\0'):
+            if size < self.size:
+                os.ftruncate(self.fd, self.size)
+            os.pwrite(self.fd, HEADER.pack(*expected, 1), 0)
+        elif size != self.size or HEADER.unpack(header)[:4] != expected:
+            raise ImproperlyConfigured(
+                f'Файл кэша {self.path} размечен под другие параметры. '
+                f'Удалите его, когда его не использует ни один процесс.')
+
+    def locked(self, start, length):
+        return _RangeLock(self, start, length)
+
+    @property
+    def generation(self):
+        return struct.unpack_from('=Q', self.map, GENERATION_OFFSET)[0]
+
+    def bucket_range(self, hashed):
+        first = (hashed % self.buckets) * self.ways
+        start = HEADER_SIZE + first * self.slot_size
+        return start, self.ways * self.slot_size
+
+    def offsets(self, hashed):
+        start, length = self.bucket_range(hashed)
+        return range(start, start + length, self.slot_size)
+
+    def read(self, offset):
+        """Согласованная копия слота или None, если слот занят записью."""
+        for _ in range(READ_RETRIES):
+            fields = SLOT.unpack_from(self.map, offset)
+            seq = fields[0]
+            if seq & 1:
+                time.sleep(0)
+                continue
+            start = offset + SLOT_HEADER_SIZE
+            data = self.map[start:start + fields[5] + fields[6]]
+            if struct.unpack_from('=Q', self.map, offset)[0] == seq:
+                return fields, data
+        return None
+
+    def find(self, key, hashed, generation, now):
+        """Смещение и данные живой записи с ключом `key`."""
+        for offset in self.offsets(hashed):
+            slot = self.read(offset)
+            if slot is None:
+                continue
+            fields, data = slot
+            (_, _, slot_generation, expires, slot_hash,
+             key_length, _, flags) = fields
+            if (slot_hash == hashed and slot_generation == generation
+                    and data[:key_length] == key):
+                if expires and expires <= now:
+                    continue
+                return offset, data[key_length:], flags, expires
+        return None
+
+    def victim(self, hashed, generation, now):
+        """Слот для новой записи: пустой, устаревший или самый старый."""
+        best, best_tick = None, None
+        for offset in self.offsets(hashed):
+            (_, tick, slot_generation, expires,
+             slot_hash, _, _, _) = SLOT.unpack_from(self.map, offset)
+            if (not slot_hash or slot_generation != generation
+                    or (expires and expires <= now)):
+                return offset
+            if best is None or tick < best_tick:
+                best, best_tick = offset, tick
+        self.evictions += 1
+        return best
+
+    def write(self, offset, key, hashed, generation, value, flags, expires):
+        seq = struct.unpack_from('=Q', self.map, offset)[0]
+        struct.pack_into('=Q', self.map, offset, seq + 1)
+        SLOT.pack_into(
+            self.map, offset, seq + 1, time.time_ns(), generation,
+            expires or 0.0, hashed, len(key), len(value), flags,
+        )
+        start = offset + SLOT_HEADER_SIZE
+        self.map[start:start + len(key) + len(value)] = key + value
+        struct.pack_into('=Q', self.map, offset, seq + 2)
+
+    def erase(self, offset):
+        seq = struct.unpack_from('=Q', self.map, offset)[0]
+        struct.pack_into('=Q', self.map, offset, seq + 1)
+        SLOT.pack_into(self.map, offset, seq + 1, 0, 0, 0.0, 0, 0, 0, 0)
+        struct.pack_into('=Q', self.map, offset, seq + 2)
+
+    def touch(self, offset):
+        struct.pack_into('=Q', self.map, offset + TICK_OFFSET, time.time_ns())
+
+    def clear(self):
+        with self.locked(0, HEADER_SIZE):
+            struct.pack_into(
+                '=Q', self.map, GENERATION_OFFSET, self.generation + 1)
+
+
+class _RangeLock:
+    def __init__(self, table, start, length):
+        self.table = table
+        self.start = start
+        self.length = length
+        self.thread_lock = table.stripes[
+            (start // table.slot_size) % LOCK_STRIPES]
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        fcntl.lockf(
+            self.table.fd, fcntl.LOCK_EX, self.length, self.start)
+
+    def __exit__(self, *exc_info):
+        fcntl.lockf(
+            self.table.fd, fcntl.LOCK_UN, self.length, self.start)
+        self.thread_lock.release()
+
+
+def get_table(path, slots, slot_size, ways):
+    """Одна таблица на файл в процессе: Django создаёт бэкенд на поток."""
+    params = (path, slots, slot_size, ways)
+    with _tables_lock:
+        if params not in _tables:
+            _tables[params] = Table(*params)
+        return _tables[params]
+
+
+class MmapCache(BaseCache):
+    """Бэкенд Django для `CACHES`.
+
+    LOCATION - путь к файлу кэша, к имени файла добавляются размеры
+    таблицы. OPTIONS: SLOTS (число слотов), SLOT_SIZE (байт на слот
+    вместе с ключом) и WAYS (слотов в корзине). Значение, которое
+    не помещается в слот даже после сжатия, не кэшируется.
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._table = get_table(
+            location,
+            int(options.get('SLOTS', 4096)),
+            int(options.get('SLOT_SIZE', 16384)),
+            int(options.get('WAYS', 8)),
+        )
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        encoded = key.encode()
+        return encoded, key_hash(encoded)
+
+    def _dump(self, key, value):
+        data = pickle.dumps(value, self.pickle_protocol)
+        room = self._table.capacity - len(key)
+        if len(data) <= room:
+            return data, 0
+        data = zlib.compress(data, 1)
+        if len(data) <= room:
+            return data, COMPRESSED
+        return None, 0
+
+    @staticmethod
+    def _load(data, flags):
+        if flags & COMPRESSED:
+            data = zlib.decompress(data)
+        return pickle.loads(data)
+
+    def _store(self, key, hashed, value, timeout, only_new=False):
+        table = self._table
+        data, flags = self._dump(key, value)
+        with table.locked(*table.bucket_range(hashed)):
+            generation, now = table.generation, time.time()
+            found = table.find(key, hashed, generation, now)
+            if found and only_new:
+                return False
+            if data is None:
+                if found:
+                    table.erase(found[0])
+                return False
+            offset = found[0] if found else table.victim(
+                hashed, generation, now)
+            table.write(
+                offset, key, hashed, generation, data, flags,
+                self.get_backend_timeout(timeout),
+            )
+            return True
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key, hashed = self._key(key, version)
+        return self._store(key, hashed, value, timeout, only_new=True)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key, hashed = self._key(key, version)
+        self._store(key, hashed, value, timeout)
+
+    def get(self, key, default=None, version=None):
+        key, hashed = self._key(key, version)
+        table = self._table
+        found = table.find(key, hashed, table.generation, time.time())
+        if found is None:
+            return default
+        offset, data, flags, _ = found
+        table.touch(offset)
+        try:
+            return self._load(data, flags)
+        except (pickle.UnpicklingError, zlib.error, EOFError):
+            return default
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key, hashed = self._key(key, version)
+        table = self._table
+        with table.locked(*table.bucket_range(hashed)):
+            found = table.find(key, hashed, table.generation, time.time())
+            if found is None:
+                return False
+            offset, data, flags, _ = found
+            table.write(
+                offset, key, hashed, table.generation, data, flags,
+                self.get_backend_timeout(timeout),
+            )
+            return True
+
+    def incr(self, key, delta=1, version=None):
+        key, hashed = self._key(key, version)
+        table = self._table
+        with table.locked(*table.bucket_range(hashed)):
+            generation = table.generation
+            found = table.find(key, hashed, generation, time.time())
+            if found is None:
+                raise ValueError("Key '%s' not found" % key.decode())
+            offset, data, flags, expires = found
+            value = self._load(data, flags) + delta
+            data, flags = self._dump(key, value)
+            table.write(
+                offset, key, hashed, generation, data, flags, expires)
+        return value
+
+    def has_key(self, key, version=None):
+        key, hashed = self._key(key, version)
+        table = self._table
+        return table.find(
+            key, hashed, table.generation, time.time()) is not None
+
+    def delete(self, key, version=None):
+        key, hashed = self._key(key, version)
+        table = self._table
+        with table.locked(*table.bucket_range(hashed)):
+            found = table.find(key, hashed, table.generation, time.time())
+            if found is not None:
+                table.erase(found[0])
+
+    def clear(self):
+        self._table.clear()
+
+    def stats(self):
+        """Вытеснения живых записей, сделанные этим процессом."""
+        return {'evictions': self._table.evictions}
@@ -0,0 +1,240 @@
+"""Фоновые задачи в таблице `core.Job`.
+
+Функция, обёрнутая в `@job`, ставится в очередь вызовом
+`func.delay(*args, **kwargs)` или `func.enqueue(...)` с расписанием,
+приоритетом и ключом идемпотентности. Запись о задаче создаётся в
+текущей транзакции, поэтому задача из представления или сигнала
+выполнится, только если транзакция зафиксирована. Аргументы задачи
+должны сериализоваться в JSON.
+
+`manage.py runworker` запускает исполнителей. Исполнитель забирает
+задачу условным UPDATE, который повторяет условие выборки: из двух
+исполнителей, выбравших одну задачу, её получит только один и в SQLite,
+и в PostgreSQL. Задача занята на `timeout` секунд; если
+исполнитель не успел или упал, её возьмёт другой. Упавшая задача
+повторяется с экспоненциальной задержкой, после `max_attempts` попыток
+она остаётся в таблице в состоянии "не выполнена".
+"""
+import functools
+import json
+import statistics
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+# Сколько раз исполнитель пробует забрать задачу, если её перехватили.
+CLAIM_RETRIES = 5
+
+
+class Task:
+    def __init__(self, func, queue, priority, max_attempts, timeout):
+        functools.update_wrapper(self, func)
+        self.func = func
+        self.name = f'{func.__module__}.{func.__qualname__}'
+        self.queue = queue
+        self.priority = priority
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        return self.enqueue(args, kwargs)
+
+    def enqueue(self, args=(), kwargs=None, run_at=None, countdown=None,
+                priority=None, key=None):
+        """Ставит задачу в очередь. Если в очереди уже есть задача
+        с тем же `key`, возвращает её, а если она отложена дальше
+        `run_at`, переносит её на `run_at`."""
+        if countdown is not None:
+            run_at = timezone.now() + timedelta(seconds=countdown)
+        job = Job(
+            queue=self.queue,
+            task=self.name,
+            arguments=json.dumps({'args': list(args), 'kwargs': kwargs or {}}),
+            priority=self.priority if priority is None else priority,
+            run_at=run_at or timezone.now(),
+            max_attempts=self.max_attempts,
+            key=key,
+        )
+        if key is None:
+            job.save()
+            return job
+        try:
+            with transaction.atomic():
+                job.save()
+        except IntegrityError:
+            queued = Job.objects.filter(key=key, status=Job.QUEUED)
+            queued.filter(run_at__gt=job.run_at).update(run_at=job.run_at)
+            queued = queued.first()
+            if queued is None:
+                return self.enqueue(args, kwargs, run_at, None, priority, key)
+            return queued
+        return job
+
+
+def job(queue='default', priority=0, max_attempts=3, timeout=None):
+    """Делает функцию фоновой задачей. `timeout` - сколько секунд
+    задача может выполняться, прежде чем её возьмёт другой исполнитель."""
+    def decorator(func):
+        return Task(
+            func, queue, priority, max_attempts,
+            timeout or settings.JOB_VISIBILITY_TIMEOUT,
+        )
+    return decorator
+
+
+def claim(queues=None):
+    """Забирает самую приоритетную из задач, которые пора выполнить,
+    или задачу, которую исполнитель не успел выполнить вовремя."""
+    now = timezone.now()
+    due = Job.objects.filter(
+        Q(status=Job.QUEUED, run_at__lte=now)
+        | Q(status=Job.RUNNING, locked_until__lt=now)
+    )
+    if queues:
+        due = due.filter(queue__in=queues)
+    ordered = due.order_by('-priority', 'run_at', 'pk')
+    token = uuid.uuid4().hex
+    for _ in range(CLAIM_RETRIES):
+        pk = ordered.values_list('pk', flat=True).first()
+        if pk is None:
+            return None
+        claimed = due.filter(pk=pk).update(
+            status=Job.RUNNING,
+            claimed_by=token,
+            started=now,
+            locked_until=now + timedelta(
+                seconds=settings.JOB_VISIBILITY_TIMEOUT),
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def finish(job, **fields):
+    return Job.objects.filter(pk=job.pk, claimed_by=job.claimed_by).update(
+        locked_until=None, **fields)
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1))
+
+
+def failed(job, error):
+    now = timezone.now()
+    if job.attempts >= job.max_attempts:
+        return finish(job, status=Job.FAILED, finished=now, last_error=error)
+    try:
+        with transaction.atomic():
+            return finish(
+                job,
+                status=Job.QUEUED,
+                run_at=now + retry_delay(job.attempts),
+                last_error=error,
+            )
+    except IntegrityError:
+        return finish(
+            job, status=Job.FAILED, finished=now,
+            last_error=f'{error}\nВ очереди уже есть задача с тем же ключом',
+        )
+
+
+def execute(job):
+    """Выполняет забранную задачу и записывает результат."""
+    if job.attempts > job.max_attempts:
+        return failed(job, 'Исполнитель не уложился в timeout задачи')
+    try:
+        task = import_string(job.task)
+        Job.objects.filter(pk=job.pk, claimed_by=job.claimed_by).update(
+            locked_until=job.started + timedelta(seconds=task.timeout))
+        arguments = json.loads(job.arguments)
+        task.func(*arguments['args'], **arguments['kwargs'])
+    except Exception:
+        return failed(job, traceback.format_exc())
+    return finish(job, status=Job.DONE, finished=timezone.now())
+
+
+def work(queues=None, burst=False, interval=1.0, stop=None):
+    """Цикл исполнителя. С `burst` завершается, когда задач не осталось.
+    Возвращает число выполненных задач."""
+    processed = 0
+    while stop is None or not stop.is_set():
+        job = claim(queues)
+        if job is None:
+            if burst:
+                break
+            close_old_connections()
+            if stop is None:
+                time.sleep(interval)
+            else:
+                stop.wait(interval)
+            continue
+        execute(job)
+        processed += 1
+    close_old_connections()
+    return processed
+
+
+def prune():
+    """Удаляет выполненные задачи старше JOB_KEEP_DONE секунд."""
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_KEEP_DONE)
+    return Job.objects.filter(
+        status=Job.DONE, finished__lt=cutoff).delete()[0]
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def stats(window=3600):
+    """Статистика очередей за последние `window` секунд: задачи в
+    очереди и упавшие, выполненные в минуту, задержка до начала
+    выполнения и время выполнения в секундах (медиана и 95-й
+    процентиль)."""
+    now = timezone.now()
+    since = now - timedelta(seconds=window)
+    queues = {}
+
+    def queue_stats(name):
+        return queues.setdefault(name, {
+            'queued': 0, 'running': 0, 'failed': 0, 'done': 0,
+            'waits': [], 'runs': [],
+        })
+
+    pending = Job.objects.filter(
+        status__in=(Job.QUEUED, Job.RUNNING), run_at__lte=now)
+    for name, status, count in pending.values('queue', 'status').annotate(
+            count=Count('pk')).values_list('queue', 'status', 'count'):
+        queue_stats(name)[status] = count
+    finished = Job.objects.filter(
+        status__in=(Job.DONE, Job.FAILED), finished__gte=since)
+    for name, status, run_at, started, finished_at in finished.values_list(
+            'queue', 'status', 'run_at', 'started', 'finished').iterator():
+        item = queue_stats(name)
+        item[status] += 1
+        if status == Job.DONE:
+            item['waits'].append((started - run_at).total_seconds())
+            item['runs'].append((finished_at - started).total_seconds())
+    for item in queues.values():
+        waits, runs = item.pop('waits'), item.pop('runs')
+        item['per_minute'] = item['done'] * 60 / window
+        item['wait_p50'] = statistics.median(waits) if waits else None
+        item['wait_p95'] = percentile(waits, 0.95)
+        item['run_p50'] = statistics.median(runs) if runs else None
+        item['run_p95'] = percentile(runs, 0.95)
+    return queues
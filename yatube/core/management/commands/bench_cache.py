@@ -0,0 +1,80 @@
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+BACKENDS = (
+    ('locmem', 'django.core.cache.backends.locmem.LocMemCache', None),
+    ('filebased', 'django.core.cache.backends.filebased.FileBasedCache',
+     'filebased'),
+    ('mmap', 'core.cache.MmapCache', 'mmap.cache'),
+)
+
+
+def worker(backend, location, options, seed, start_at):
+    """Нагрузка одного процесса: доля записей, остальное - чтения."""
+    cache = import_string(backend)(location, {
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': options['keys'] * 2},
+    })
+    rng = random.Random(seed)
+    value = os.urandom(options['value_size'])
+    samples, hits, reads = [], 0, 0
+    while time.time() < start_at:
+        time.sleep(0.001)
+    for _ in range(options['ops']):
+        key = f'bench:{rng.randrange(options["keys"])}'
+        started = time.perf_counter()
+        if rng.random() < options['write_ratio']:
+            cache.set(key, value)
+        else:
+            reads += 1
+            hits += cache.get(key) is not None
+        samples.append(time.perf_counter() - started)
+    return samples, hits, reads
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает бэкенды кэша locmem, filebased и mmap под нагрузкой '
+        'из нескольких процессов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=4)
+        parser.add_argument('--ops', type=int, default=20000,
+                            help='Операций на процесс')
+        parser.add_argument('--keys', type=int, default=1000)
+        parser.add_argument('--value-size', type=int, default=1024)
+        parser.add_argument('--write-ratio', type=float, default=0.1)
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        with tempfile.TemporaryDirectory() as directory:
+            for name, backend, location in BACKENDS:
+                location = os.path.join(directory, location or name)
+                start_at = time.time() + 0.5
+                with context.Pool(options['processes']) as pool:
+                    results = pool.starmap(worker, [
+                        (backend, location, options, seed, start_at)
+                        for seed in range(options['processes'])
+                    ])
+                elapsed = max(sum(samples) for samples, _, _ in results)
+                self.report(name, results, elapsed)
+
+    def report(self, name, results, elapsed):
+        samples = sorted(
+            sample * 1000000 for result in results for sample in result[0])
+        hits = sum(result[1] for result in results)
+        reads = sum(result[2] for result in results)
+        self.stdout.write(
+            f'{name:>9}: {len(samples) / elapsed:10.0f} оп/с, '
+            f'медиана {statistics.median(samples):7.1f} мкс, '
+            f'p99 {samples[int(len(samples) * 0.99) - 1]:8.1f} мкс, '
+            f'попаданий {hits / max(reads, 1):6.1%}'
+        )
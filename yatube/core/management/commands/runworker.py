@@ -0,0 +1,93 @@
+import multiprocessing
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+
+from core import jobs, worker
+
+PRUNE_EVERY = 600
+
+
+def seconds(value):
+    return '-' if value is None else f'{value:.2f}'
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет фоновые задачи core.jobs в нескольких процессах. '
+        'Упавшие процессы перезапускаются, SIGTERM и Ctrl+C завершают '
+        'работу после текущих задач.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument(
+            '--queues',
+            help='Очереди через запятую, по умолчанию все',
+        )
+        parser.add_argument('--interval', type=float, default=1,
+                            help='Пауза в секундах, когда задач нет')
+        parser.add_argument('--burst', action='store_true',
+                            help='Завершиться, когда задачи кончатся')
+        parser.add_argument(
+            '--stats', type=int, metavar='SECONDS', nargs='?', const=3600,
+            help='Показать статистику очередей за SECONDS секунд и выйти',
+        )
+
+    def handle(self, *args, **options):
+        if options['stats'] is not None:
+            return self.show_stats(options['stats'])
+        queues = options['queues'].split(',') if options['queues'] else None
+        if options['processes'] == 1:
+            jobs.prune()
+            processed = jobs.work(
+                queues, options['burst'], options['interval'])
+            self.stdout.write(f'Выполнено задач: {processed}')
+            return
+        self.supervise(queues, options)
+
+    def supervise(self, queues, options):
+        context = multiprocessing.get_context('spawn')
+        stop = context.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+
+        def start():
+            process = context.Process(
+                target=worker.run,
+                args=(queues, options['burst'], options['interval'], stop),
+            )
+            process.start()
+            return process
+
+        processes = [start() for _ in range(options['processes'])]
+        pruned = 0
+        while processes:
+            time.sleep(1)
+            alive = []
+            for process in processes:
+                if process.is_alive():
+                    alive.append(process)
+                elif process.exitcode and not stop.is_set():
+                    self.stderr.write(
+                        f'Исполнитель {process.pid} завершился с кодом '
+                        f'{process.exitcode}, запускаю новый')
+                    alive.append(start())
+            processes = alive
+            if time.monotonic() - pruned > PRUNE_EVERY:
+                jobs.prune()
+                pruned = time.monotonic()
+
+    def show_stats(self, window):
+        self.stdout.write(
+            'очередь     в очереди  выполняется  упали  в минуту  '
+            'ожидание p50/p95, с  выполнение p50/p95, с')
+        for name, item in sorted(jobs.stats(window).items()):
+            self.stdout.write(
+                f'{name:<11} {item["queued"]:>9}  {item["running"]:>11}  '
+                f'{item["failed"]:>5}  {item["per_minute"]:>8.1f}  '
+                f'{seconds(item["wait_p50"]):>8}/'
+                f'{seconds(item["wait_p95"]):<10}  '
+                f'{seconds(item["run_p50"]):>9}/{seconds(item["run_p95"])}'
+            )
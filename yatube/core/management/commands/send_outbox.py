@@ -0,0 +1,33 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core import outbox
+
+
+class Command(BaseCommand):
+    help = (
+        'Отправляет письма из очереди OutboxMessage пачками через одно '
+        'соединение с почтовым сервером.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.OUTBOX_BATCH_SIZE)
+        parser.add_argument('--loop', action='store_true',
+                            help='Не завершаться, а проверять очередь '
+                                 'каждые --interval секунд')
+        parser.add_argument('--interval', type=float, default=5)
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = outbox.drain(options['batch_size'])
+            if sent or failed or not options['loop']:
+                self.stdout.write(
+                    f'Отправлено писем: {sent}, с ошибкой: {failed}')
+            if not options['loop']:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
@@ -0,0 +1,103 @@
+from django.db import models
+from django.utils import timezone
+
+
+class OutboxMessage(models.Model):
+    """Письмо, которое ещё предстоит отправить. Отправленные письма
+    удаляются из таблицы."""
+
+    subject = models.CharField('Тема', max_length=255)
+    recipients = models.TextField('Получатели')
+    message = models.BinaryField('Письмо')
+    created = models.DateTimeField('Создано', auto_now_add=True)
+    next_attempt = models.DateTimeField(
+        'Следующая попытка',
+        default=timezone.now,
+    )
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+    dead = models.BooleanField(
+        'Не отправлено',
+        default=False,
+        help_text='Попытки исчерпаны, письмо больше не отправляется',
+    )
+
+    class Meta:
+        verbose_name = 'Письмо в очереди'
+        verbose_name_plural = 'Письма в очереди'
+        indexes = [
+            models.Index(
+                fields=['dead', 'next_attempt'], name='outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} → {self.recipients}'
+
+
+class Job(models.Model):
+    """Задача фоновой очереди. Выполненные задачи хранятся
+    JOB_KEEP_DONE секунд для статистики, упавшие - пока их не удалят."""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Не выполнена'),
+    )
+
+    queue = models.CharField('Очередь', max_length=50, default='default')
+    task = models.CharField('Задача', max_length=200)
+    arguments = models.TextField('Аргументы', default='{}')
+    priority = models.SmallIntegerField(
+        'Приоритет',
+        default=0,
+        help_text='Задачи с большим приоритетом выполняются раньше',
+    )
+    status = models.CharField(
+        'Состояние', max_length=10, choices=STATUSES, default=QUEUED)
+    key = models.CharField(
+        'Ключ идемпотентности',
+        max_length=200,
+        blank=True,
+        null=True,
+        help_text='В очереди не бывает двух задач с одним ключом',
+    )
+    run_at = models.DateTimeField('Выполнить после', default=timezone.now)
+    created = models.DateTimeField('Создана', auto_now_add=True)
+    started = models.DateTimeField('Начата', blank=True, null=True)
+    finished = models.DateTimeField('Завершена', blank=True, null=True)
+    locked_until = models.DateTimeField(
+        'Занята до',
+        blank=True,
+        null=True,
+        help_text='Если исполнитель не успел, задачу возьмёт другой',
+    )
+    claimed_by = models.CharField('Исполнитель', max_length=32, blank=True)
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    max_attempts = models.PositiveSmallIntegerField(
+        'Попыток не больше', default=3)
+    last_error = models.TextField('Последняя ошибка', blank=True)
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        indexes = [
+            models.Index(
+                fields=['status', '-priority', 'run_at'],
+                name='job_due_idx'),
+            models.Index(fields=['status', 'finished'], name='job_done_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['key'],
+                condition=models.Q(status='queued'),
+                name='job_queued_key_uniq',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.task} [{self.get_status_display()}]'
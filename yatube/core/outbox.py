@@ -0,0 +1,132 @@
+"""Исходящая почта через таблицу в базе.
+
+`OutboxBackend` - почтовый бэкенд Django, который не отправляет письма,
+а записывает их в `OutboxMessage` в текущей транзакции вместе с
+фоновой задачей `send_queued`: письмо уходит, только если транзакция
+запроса зафиксирована, а запрос не ждёт почтовый сервер. Задача и
+команда `send_outbox` отправляют письма пачками через одно соединение
+бэкенда OUTBOX_EMAIL_BACKEND. Неудачная отправка
+повторяется с экспоненциальной задержкой, после OUTBOX_MAX_ATTEMPTS
+попыток письмо помечается как неотправленное и остаётся в таблице.
+"""
+import copy
+import pickle
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import transaction
+from django.utils import timezone
+
+from .jobs import job
+from .models import OutboxMessage
+
+
+class OutboxBackend(BaseEmailBackend):
+    def send_messages(self, email_messages):
+        queued = enqueue(email_messages)
+        if queued:
+            send_queued.enqueue(key='outbox')
+        return len(queued)
+
+
+def serialize(message):
+    message = copy.copy(message)
+    message.connection = None
+    return pickle.dumps(message)
+
+
+def enqueue(email_messages):
+    return OutboxMessage.objects.bulk_create(
+        OutboxMessage(
+            subject=message.subject[:255],
+            recipients=', '.join(message.recipients()),
+            message=serialize(message),
+        )
+        for message in email_messages
+        if message.recipients()
+    )
+
+
+def claim(batch_size):
+    """Забирает пачку писем, которые пора отправить, и откладывает их
+    на OUTBOX_LEASE секунд: если процесс упадёт посреди отправки, письма
+    вернутся в очередь, а параллельный процесс их не возьмёт."""
+    now = timezone.now()
+    lease = now + timedelta(seconds=settings.OUTBOX_LEASE)
+    with transaction.atomic():
+        due = list(
+            OutboxMessage.objects.filter(dead=False, next_attempt__lte=now)
+            .order_by('next_attempt', 'pk')
+            .values_list('pk', flat=True)[:batch_size]
+        )
+        OutboxMessage.objects.filter(
+            pk__in=due, next_attempt__lte=now).update(next_attempt=lease)
+    return list(OutboxMessage.objects.filter(
+        pk__in=due, next_attempt=lease).order_by('pk'))
+
+
+def retry_delay(attempts):
+    delay = settings.OUTBOX_RETRY_BACKOFF * 2 ** (attempts - 1)
+    return timedelta(seconds=delay * random.uniform(1, 1.5))
+
+
+def failed(message, error):
+    message.attempts += 1
+    message.last_error = f'{type(error).__name__}: {error}'
+    message.dead = message.attempts >= settings.OUTBOX_MAX_ATTEMPTS
+    message.next_attempt = timezone.now() + retry_delay(message.attempts)
+    message.save(
+        update_fields=['attempts', 'last_error', 'dead', 'next_attempt'])
+
+
+def send_batch(batch):
+    """Отправляет пачку через одно соединение. Возвращает число
+    отправленных и неотправленных писем."""
+    sent = []
+    connection = get_connection(
+        settings.OUTBOX_EMAIL_BACKEND, fail_silently=False)
+    try:
+        connection.open()
+    except Exception as error:
+        for message in batch:
+            failed(message, error)
+        return 0, len(batch)
+    try:
+        for message in batch:
+            try:
+                connection.send_messages([pickle.loads(message.message)])
+            except Exception as error:
+                failed(message, error)
+            else:
+                sent.append(message.pk)
+    finally:
+        connection.close()
+        OutboxMessage.objects.filter(pk__in=sent).delete()
+    return len(sent), len(batch) - len(sent)
+
+
+def drain(batch_size=None):
+    """Отправляет все письма, которые пора отправить."""
+    batch_size = batch_size or settings.OUTBOX_BATCH_SIZE
+    total_sent = total_failed = 0
+    while True:
+        batch = claim(batch_size)
+        if not batch:
+            return total_sent, total_failed
+        sent, failures = send_batch(batch)
+        total_sent += sent
+        total_failed += failures
+
+
+@job(queue='mail')
+def send_queued():
+    """Отправляет очередь и планирует себя на время ближайшей
+    повторной попытки."""
+    drain()
+    retry_at = OutboxMessage.objects.filter(dead=False).order_by(
+        'next_attempt').values_list('next_attempt', flat=True).first()
+    if retry_at is not None:
+        send_queued.enqueue(run_at=retry_at, key='outbox')
@@ -0,0 +1,152 @@
+"""Работа сайта при заблокированной или медленной базе данных.
+
+`serve_stale` запоминает последнюю удачную отрисовку страницы для чтения
+и отдаёт её, если запрос к базе упал или не уложился в
+STALE_READ_DEADLINE секунд. `retry_write` повторяет запись с
+экспоненциальной задержкой, пока SQLite отвечает "database is locked".
+"""
+import functools
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import OperationalError, connection, transaction
+from django.http import HttpResponse
+
+STALE_COUNTERS = ('error', 'deadline')
+
+
+def stale_cache():
+    """Копии страниц велики и читаются редко, поэтому хранятся в своём
+    кэше 'stale' без L1 и не вытесняют из общего кэша горячие записи."""
+    return caches['stale' if 'stale' in settings.CACHES else 'default']
+
+
+def page_key(request):
+    try:
+        user = request.user
+        viewer = user.pk if user.is_authenticated else 'guest'
+    except OperationalError:
+        viewer = 'guest'
+    return f'stale_page:{viewer}:{request.get_full_path()}'
+
+
+def remember(key, response):
+    """Копия страницы обновляется не чаще раза в STALE_PAGE_REFRESH
+    секунд, чтобы не писать в кэш на каждый запрос."""
+    cache = stale_cache()
+    if cache.add(f'{key}:fresh', True, settings.STALE_PAGE_REFRESH):
+        cache.set(
+            key,
+            (time.time(), response['Content-Type'], response.content),
+            settings.STALE_PAGE_TIMEOUT,
+        )
+
+
+def stale_response(key, reason):
+    cache = stale_cache()
+    page = cache.get(key)
+    if page is None:
+        return None
+    stored, content_type, content = page
+    try:
+        cache.incr(f'stale_served:{reason}')
+    except ValueError:
+        cache.add(f'stale_served:{reason}', 1, None)
+    response = HttpResponse(content, content_type=content_type)
+    response['Age'] = int(time.time() - stored)
+    response['Warning'] = '110 - "Response is Stale"'
+    return response
+
+
+def stale_stats():
+    cache = stale_cache()
+    return {
+        reason: cache.get(f'stale_served:{reason}', 0)
+        for reason in STALE_COUNTERS
+    }
+
+
+class Deadline:
+    """Прерывает запросы SQLite, которые выполняются дольше `seconds`.
+
+    Время проверяется раз в `steps` инструкций виртуальной машины SQLite.
+    """
+
+    steps = 1000
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expired = False
+
+    def check(self):
+        if time.monotonic() > self.deadline:
+            self.expired = True
+            return 1
+        return 0
+
+    def __enter__(self):
+        self.deadline = time.monotonic() + self.seconds
+        if connection.vendor == 'sqlite':
+            connection.ensure_connection()
+            connection.connection.set_progress_handler(self.check, self.steps)
+
+    def __exit__(self, *exc_info):
+        if connection.vendor == 'sqlite' and connection.connection:
+            connection.connection.set_progress_handler(None, 0)
+
+
+def serve_stale(view):
+    """Для GET-представлений: при ошибке базы или превышении срока
+    отдаёт последнюю удачную версию страницы с заголовками Age и
+    Warning. Если сохранённой версии нет, ошибка пробрасывается."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return view(request, *args, **kwargs)
+        key = page_key(request)
+        deadline = Deadline(settings.STALE_READ_DEADLINE)
+        try:
+            with deadline:
+                response = view(request, *args, **kwargs)
+        except OperationalError:
+            reason = 'deadline' if deadline.expired else 'error'
+            response = stale_response(key, reason)
+            if response is None:
+                raise
+            return response
+        if response.status_code == 200 and not response.streaming:
+            remember(key, response)
+        return response
+    return wrapper
+
+
+def is_locked(error):
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def retry_write(func):
+    """Выполняет функцию в транзакции и повторяет её, если база
+    заблокирована. Задержка растёт вдвое с каждой попыткой.
+
+    Оборачивать нужно только запись в базу, например
+    `retry_write(form.save)()`: всё, что функция делает вне базы, при
+    повторе выполнится снова. Поэтому загрузки разбираются до записи.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if connection.in_atomic_block:
+            return func(*args, **kwargs)
+        for attempt in range(settings.DB_WRITE_RETRIES + 1):
+            try:
+                with transaction.atomic():
+                    return func(*args, **kwargs)
+            except OperationalError as error:
+                if (not is_locked(error)
+                        or attempt == settings.DB_WRITE_RETRIES):
+                    raise
+            backoff = settings.DB_RETRY_BACKOFF * 2 ** attempt
+            time.sleep(backoff * random.uniform(1, 2))
+    return wrapper
@@ -0,0 +1,89 @@
+"""Защита от «штормов» пересчёта кэша.
+
+`get_or_compute` хранит значение вместе со временем его вычисления и
+логическим сроком жизни. Ключ в кэше живёт дольше на STALE_GRACE секунд,
+поэтому, пока один процесс пересчитывает значение под блокировкой
+(`cache.add` атомарен), остальные отдают устаревшее. Если устаревшего
+значения нет, они ждут результата, пока блокировка не освободится:
+пересчитывает следующий, кто её возьмёт, а не все ожидавшие сразу.
+Пересчёт начинается заранее с вероятностью, растущей к концу срока
+жизни (XFetch): чем дороже вычисление, тем раньше.
+"""
+import math
+import random
+import time
+from collections import namedtuple
+
+from django.core.cache import cache as default_cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+BETA = 1.0
+STALE_GRACE = 300
+LOCK_TIMEOUT = 30
+WAIT_STEP = 0.01
+
+Entry = namedtuple('Entry', 'value delta expires')
+
+
+def lock_key(key):
+    return f'{key}:lock'
+
+
+def is_fresh(entry, now, beta=BETA):
+    if entry.expires is None:
+        return True
+    early = entry.delta * beta * math.log(1 - random.random())
+    return now - early < entry.expires
+
+
+def wait_for(cache, key):
+    """Ждёт значение, которое вычисляет владелец блокировки. Возвращает
+    пару (запись, взята ли блокировка): если владелец упал или его
+    блокировка истекла, пересчёт достаётся тому, кто первым её возьмёт.
+    """
+    deadline = time.monotonic() + LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_STEP)
+        entry = cache.get(key)
+        if isinstance(entry, Entry):
+            return entry, False
+        if cache.add(lock_key(key), True, LOCK_TIMEOUT):
+            return None, True
+    return None, False
+
+
+def store(cache, key, value, delta, timeout):
+    if timeout is DEFAULT_TIMEOUT:
+        timeout = cache.default_timeout
+    if timeout is None:
+        cache.set(key, Entry(value, delta, None), None)
+        return
+    expires = time.time() + timeout
+    cache.set(key, Entry(value, delta, expires), timeout + STALE_GRACE)
+
+
+def get_or_compute(key, compute, timeout=DEFAULT_TIMEOUT, cache=None,
+                   beta=BETA):
+    """Значение из кэша или результат `compute()`, вычисленный одним
+    процессом на ключ."""
+    cache = cache or default_cache
+    entry = cache.get(key)
+    if not isinstance(entry, Entry):
+        entry = None
+    elif is_fresh(entry, time.time(), beta):
+        return entry.value
+    locked = cache.add(lock_key(key), True, LOCK_TIMEOUT)
+    if not locked:
+        if entry is not None:
+            return entry.value
+        entry, locked = wait_for(cache, key)
+        if entry is not None:
+            return entry.value
+    try:
+        started = time.monotonic()
+        value = compute()
+        store(cache, key, value, time.monotonic() - started, timeout)
+    finally:
+        if locked:
+            cache.delete(lock_key(key))
+    return value
@@ -0,0 +1,88 @@
+"""Хранилище файлов с именами по хэшу содержимого.
+
+Файл сохраняется как `<каталог upload_to>/ab/cd/<sha256><расширение>`,
+поэтому одинаковые загрузки занимают место один раз, а в одном каталоге
+лежит не больше нескольких тысяч файлов. Хранилище не удаляет файлы
+само: на один файл могут ссылаться несколько записей, и удалять его
+должен тот, кто считает ссылки, через `discard`.
+
+Загрузка, заставшая файл на месте, обновляет его mtime, а `discard`
+сначала переименовывает файл и только потом проверяет ссылки и mtime.
+Поэтому загрузка либо успевает отметить файл до переименования и
+`discard` его оставит, либо не находит файл и записывает его заново.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import time
+import uuid
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+BLOB_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}(\.\w+)?$')
+
+
+class BlobExists(Exception):
+    pass
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    def blob_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        hashed = digest.hexdigest()
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        return posixpath.join(
+            directory, hashed[:2], hashed[2:4], hashed + extension)
+
+    @staticmethod
+    def is_blob_name(name):
+        return bool(BLOB_NAME.search(name))
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        return self.save_blob(self.blob_name(name, content), content)
+
+    def save_blob(self, name, content):
+        """Сохраняет содержимое под уже посчитанным именем, если файла
+        с таким именем ещё нет, иначе отмечает файл как нужный."""
+        try:
+            os.utime(self.path(name))
+            return name
+        except FileNotFoundError:
+            pass
+        try:
+            return self._save(name, content)
+        except BlobExists:
+            return name
+
+    def discard(self, name, in_use, grace):
+        """Удаляет файл, если `in_use()` ложно и файл не сохраняли и не
+        отмечали последние `grace` секунд. Возвращает True, если файла
+        больше нет."""
+        path = self.path(name)
+        trash = f'{path}.{uuid.uuid4().hex}.trash'
+        try:
+            os.rename(path, trash)
+        except FileNotFoundError:
+            return True
+        if time.time() - os.stat(trash).st_mtime < grace or in_use():
+            os.replace(trash, path)
+            return False
+        os.remove(trash)
+        return not os.path.exists(path)
+
+    def get_available_name(self, name, max_length=None):
+        """`_save` зовёт этот метод, только если файл с тем же
+        содержимым успели записать параллельно."""
+        raise BlobExists(name)
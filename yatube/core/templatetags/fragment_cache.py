@@ -0,0 +1,67 @@
+"""Тег `{% cache %}` с синтаксисом встроенного, но с защитой от штормов
+пересчёта: фрагмент пересчитывает один запрос, остальные получают
+прежнюю версию или ждут его результата."""
+from django import template
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.templatetags import cache as builtin
+from django.template import TemplateSyntaxError, VariableDoesNotExist
+
+from core.single_flight import get_or_compute
+
+register = template.Library()
+
+
+class SingleFlightCacheNode(builtin.CacheNode):
+    def resolve(self, var, context):
+        try:
+            return var.resolve(context)
+        except VariableDoesNotExist:
+            raise TemplateSyntaxError(
+                '"cache" tag got an unknown variable: %r' % var.var)
+
+    def get_timeout(self, context):
+        timeout = self.resolve(self.expire_time_var, context)
+        if timeout is None:
+            return None
+        try:
+            return int(timeout)
+        except (ValueError, TypeError):
+            raise TemplateSyntaxError(
+                '"cache" tag got a non-integer timeout value: %r' % timeout)
+
+    def get_cache(self, context):
+        if self.cache_name:
+            name = self.resolve(self.cache_name, context)
+            try:
+                return caches[name]
+            except InvalidCacheBackendError:
+                raise TemplateSyntaxError(
+                    'Invalid cache name specified for cache tag: %r' % name)
+        try:
+            return caches['template_fragments']
+        except InvalidCacheBackendError:
+            return caches['default']
+
+    def render(self, context):
+        timeout = self.get_timeout(context)
+        fragment_cache = self.get_cache(context)
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        return get_or_compute(
+            make_template_fragment_key(self.fragment_name, vary_on),
+            lambda: self.nodelist.render(context),
+            timeout,
+            fragment_cache,
+        )
+
+
+@register.tag('cache')
+def do_cache(parser, token):
+    node = builtin.do_cache(parser, token)
+    return SingleFlightCacheNode(
+        node.nodelist,
+        node.expire_time_var,
+        node.fragment_name,
+        node.vary_on,
+        node.cache_name,
+    )
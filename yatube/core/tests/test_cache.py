@@ -0,0 +1,140 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+
+from core.cache import MmapCache, Table
+
+INCREMENTS = 200
+WORKERS = 4
+
+
+def make_cache(path, **options):
+    return MmapCache(path, {'OPTIONS': options})
+
+
+def increment(path, count=INCREMENTS):
+    cache = make_cache(path)
+    for _ in range(count):
+        cache.incr('counter')
+
+
+class MmapCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'cache')
+        self.cache = make_cache(self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_tests_use_own_files(self):
+        """Тесты не трогают файлы кэша работающего сайта"""
+        for path in (
+            settings.CACHES['shared']['LOCATION'],
+            settings.CACHES['stale']['LOCATION'],
+            settings.CACHES['default']['OPTIONS']['BUS'],
+        ):
+            self.assertFalse(path.startswith(settings.CACHE_DIR))
+
+    def test_basic_operations(self):
+        """set, get, add, delete, incr и touch работают как в Django"""
+        cache = self.cache
+        self.assertIsNone(cache.get('missing'))
+        self.assertEqual(cache.get('missing', 'default'), 'default')
+        cache.set('key', {'value': [1, 2]})
+        self.assertEqual(cache.get('key'), {'value': [1, 2]})
+        self.assertFalse(cache.add('key', 'other'))
+        self.assertTrue(cache.add('new', 'value'))
+        self.assertTrue(cache.has_key('new'))
+        cache.delete('new')
+        self.assertFalse(cache.has_key('new'))
+        cache.set('number', 1)
+        self.assertEqual(cache.incr('number', 5), 6)
+        self.assertEqual(cache.decr('number'), 5)
+        with self.assertRaises(ValueError):
+            cache.incr('missing')
+        self.assertTrue(cache.touch('number', None))
+        self.assertFalse(cache.touch('missing'))
+        cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+
+    def test_expiry_and_clear(self):
+        """Записи истекают по TTL и исчезают после clear"""
+        cache = self.cache
+        cache.set('short', 'value', 0.05)
+        cache.set('zero', 'value', 0)
+        cache.set('forever', 'value', None)
+        self.assertIsNone(cache.get('zero'))
+        time.sleep(0.1)
+        self.assertIsNone(cache.get('short'))
+        self.assertEqual(cache.get('forever'), 'value')
+        cache.clear()
+        self.assertIsNone(cache.get('forever'))
+        cache.set('forever', 'again')
+        self.assertEqual(cache.get('forever'), 'again')
+
+    def test_other_geometry_uses_own_file(self):
+        """Кэш с другими размерами таблицы открывает свой файл и не
+        портит файл, отображённый в память другим кэшем"""
+        self.cache.set('key', 'value')
+        other = make_cache(self.path, SLOTS=64, SLOT_SIZE=1024)
+        self.assertIsNone(other.get('key'))
+        other.set('key', 'other')
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertNotEqual(self.cache._table.path, other._table.path)
+        with open(other._table.path, 'r+b') as table_file:
+            table_file.write(b'BROKEN!!')
+        with self.assertRaises(ImproperlyConfigured):
+            Table(self.path, 64, 1024, 8)
+        self.assertEqual(
+            os.path.getsize(other._table.path), other._table.size)
+
+    def test_large_values(self):
+        """Большие значения сжимаются, не помещающиеся не кэшируются"""
+        cache = make_cache(
+            os.path.join(self.directory.name, 'small'), SLOT_SIZE=1024)
+        cache.set('text', 'a' * 10000)
+        self.assertEqual(cache.get('text'), 'a' * 10000)
+        cache.set('random', os.urandom(10000))
+        self.assertIsNone(cache.get('random'))
+        cache.set('text', os.urandom(10000))
+        self.assertIsNone(cache.get('text'))
+
+    def test_lru_eviction(self):
+        """В полной корзине вытесняется давно не читанная запись"""
+        cache = make_cache(
+            os.path.join(self.directory.name, 'lru'), SLOTS=4, WAYS=4)
+        for number in range(4):
+            cache.set(number, number)
+        cache.get(0)
+        cache.set('new', 'value')
+        self.assertEqual(cache.get(0), 0)
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(cache.get('new'), 'value')
+
+    def test_shared_between_processes(self):
+        """Процессы видят записи друг друга, incr атомарен"""
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=increment, args=(self.path,))
+            for _ in range(WORKERS)
+        ]
+        for process in processes:
+            process.start()
+        threads = [
+            threading.Thread(target=increment, args=(self.path,))
+            for _ in range(WORKERS)
+        ]
+        for thread in threads:
+            thread.start()
+        for worker in processes + threads:
+            worker.join()
+        self.assertEqual(
+            self.cache.get('counter'), INCREMENTS * WORKERS * 2)
@@ -0,0 +1,118 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from core import jobs
+from core.models import Job
+from posts.models import Post, User
+
+CALLS = []
+
+
+@jobs.job(priority=1)
+def record(value):
+    CALLS.append(value)
+
+
+@jobs.job(queue='other', max_attempts=2)
+def broken():
+    raise ValueError('сломано')
+
+
+class JobQueueTests(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_priority_and_schedule(self):
+        """Задачи выполняются по приоритету, отложенные - в свой срок"""
+        record.enqueue(('low',), priority=0)
+        record.delay('high')
+        later = record.enqueue(('later',), countdown=60)
+        self.assertEqual(jobs.work(burst=True), 2)
+        self.assertEqual(CALLS, ['high', 'low'])
+        Job.objects.filter(pk=later.pk).update(run_at=timezone.now())
+        jobs.work(burst=True)
+        self.assertEqual(CALLS, ['high', 'low', 'later'])
+        self.assertEqual(
+            set(Job.objects.values_list('status', flat=True)), {Job.DONE})
+
+    def test_idempotency_key(self):
+        """Пока задача в очереди, вторая с тем же ключом не создаётся"""
+        first = record.enqueue(('a',), key='same')
+        self.assertEqual(record.enqueue(('b',), key='same'), first)
+        jobs.claim()
+        self.assertNotEqual(record.enqueue(('c',), key='same'), first)
+        self.assertEqual(Job.objects.count(), 2)
+
+    def test_same_key_moves_job_earlier(self):
+        """Задача с тем же ключом переносит отложенную на более ранний
+        срок, но не откладывает её"""
+        later = record.enqueue(('a',), countdown=1200, key='same')
+        record.enqueue(('b',), countdown=3600, key='same')
+        self.assertEqual(jobs.work(burst=True), 0)
+        record.enqueue(('c',), key='same')
+        self.assertEqual(jobs.work(burst=True), 1)
+        self.assertEqual(CALLS, ['a'])
+        self.assertEqual(Job.objects.get().pk, later.pk)
+
+    def test_failed_job_retried_then_failed(self):
+        """Упавшая задача повторяется позже, затем остаётся упавшей"""
+        job = broken.delay()
+        jobs.work(['other'], burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIn('ValueError: сломано', job.last_error)
+        Job.objects.update(run_at=timezone.now())
+        jobs.work(['other'], burst=True)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_expired_job_reclaimed(self):
+        """Задачу, которую исполнитель не выполнил вовремя, забирает
+        другой, а первый уже не может её завершить"""
+        record.delay('slow')
+        stalled = jobs.claim()
+        self.assertIsNone(jobs.claim())
+        Job.objects.update(
+            locked_until=timezone.now() - timedelta(seconds=1))
+        reclaimed = jobs.claim()
+        self.assertEqual(reclaimed.pk, stalled.pk)
+        self.assertEqual(reclaimed.attempts, 2)
+        self.assertEqual(jobs.finish(stalled, status=Job.DONE), 0)
+        jobs.execute(reclaimed)
+        self.assertEqual(CALLS, ['slow'])
+
+    def test_queues_and_stats(self):
+        """Исполнитель берёт только свои очереди, статистика считается
+        по очередям"""
+        record.delay(1)
+        broken.delay()
+        out = StringIO()
+        call_command(
+            'runworker', '--burst', '--queues=default', stdout=out)
+        self.assertIn('Выполнено задач: 1', out.getvalue())
+        stats = jobs.stats()
+        self.assertEqual(stats['default']['done'], 1)
+        self.assertEqual(stats['other']['queued'], 1)
+        self.assertIsNotNone(stats['default']['run_p95'])
+        call_command('runworker', '--stats', stdout=out)
+        self.assertIn('other', out.getvalue())
+
+    def test_signals_enqueue_jobs(self):
+        """Новая картинка поста ставит задачу миниатюр в той же
+        транзакции"""
+        post = Post.objects.create(
+            text='Текст',
+            author=User.objects.create_user(username='author'),
+            image=SimpleUploadedFile('job.gif', b'GIF89a', 'image/gif'),
+        )
+        job = Job.objects.get(task='posts.thumbnails.generate')
+        self.assertEqual(job.queue, 'thumbnails')
+        self.assertEqual(job.arguments, (
+            '{"args": [%d, "%s"], "kwargs": {}}' % (post.pk, post.image.name)
+        ))
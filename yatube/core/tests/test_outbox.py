@@ -0,0 +1,112 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from core import outbox
+from core.models import Job, OutboxMessage
+from posts.models import Post, Profile
+
+User = get_user_model()
+
+
+@override_settings(
+    EMAIL_BACKEND='core.outbox.OutboxBackend',
+    OUTBOX_EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+    OUTBOX_MAX_ATTEMPTS=2,
+)
+class OutboxTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@yatube.ru',
+            password='пароль')
+        cls.commenter = User.objects.create_user(
+            username='commenter', email='commenter@yatube.ru')
+        cls.post = Post.objects.create(
+            heading='Заголовок', text='Текст', author=cls.author)
+        Profile.objects.filter(user=cls.author).update(
+            comment_emails=Profile.INSTANT)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.commenter)
+
+    def comment(self, client=None):
+        (client or self.client).post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            data={'text': 'Комментарий'},
+        )
+
+    def test_comment_mail_queued_for_post_author(self):
+        """Письмо о комментарии встаёт в очередь для автора поста
+        и уходит только при отправке очереди"""
+        self.comment()
+        self.assertEqual(mail.outbox, [])
+        message = OutboxMessage.objects.get()
+        self.assertEqual(message.recipients, self.author.email)
+        author_client = Client()
+        author_client.force_login(self.author)
+        self.comment(author_client)
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+        call_command('send_outbox', stdout=mock.Mock())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.author.email])
+        self.assertIn('commenter: Комментарий', mail.outbox[0].body)
+        self.assertFalse(OutboxMessage.objects.exists())
+
+    def test_password_reset_mail_queued(self):
+        """Письмо для сброса пароля идёт через ту же очередь"""
+        Client().post(
+            reverse('users:password_reset_form'),
+            data={'email': self.author.email},
+        )
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(outbox.drain(), (1, 0))
+        self.assertEqual(mail.outbox[0].to, [self.author.email])
+
+    def test_new_mail_not_delayed_by_retry_backoff(self):
+        """Новое письмо отправляется сразу, даже если задача отправки
+        отложена после неудачи"""
+        retry_at = timezone.now() + timedelta(minutes=20)
+        outbox.send_queued.enqueue(run_at=retry_at, key='outbox')
+        self.comment()
+        self.assertLessEqual(
+            Job.objects.get(key='outbox').run_at, timezone.now())
+
+    def test_failed_mail_retried_then_dead(self):
+        """Неудачная отправка повторяется позже, после последней попытки
+        письмо остаётся в таблице помеченным"""
+        self.comment()
+        with mock.patch(
+                'django.core.mail.backends.locmem.EmailBackend.send_messages',
+                side_effect=ConnectionError('refused')):
+            self.assertEqual(outbox.drain(), (0, 1))
+            self.assertEqual(outbox.drain(), (0, 0))
+            message = OutboxMessage.objects.get()
+            self.assertEqual(message.attempts, 1)
+            self.assertGreater(message.next_attempt, timezone.now())
+            OutboxMessage.objects.update(next_attempt=timezone.now())
+            self.assertEqual(outbox.drain(), (0, 1))
+        message.refresh_from_db()
+        self.assertTrue(message.dead)
+        self.assertEqual(message.last_error, 'ConnectionError: refused')
+        OutboxMessage.objects.update(next_attempt=timezone.now())
+        self.assertEqual(outbox.drain(), (0, 0))
+        self.assertEqual(mail.outbox, [])
+
+    def test_batch_sent_over_one_connection(self):
+        """Пачка писем отправляется через одно соединение"""
+        for _ in range(3):
+            self.comment()
+        with mock.patch(
+                'django.core.mail.backends.locmem.EmailBackend.open',
+                autospec=True) as open_connection:
+            self.assertEqual(outbox.drain(), (3, 0))
+        self.assertEqual(open_connection.call_count, 1)
+        self.assertEqual(len(mail.outbox), 3)
@@ -0,0 +1,214 @@
+import shutil
+import tempfile
+from http import HTTPStatus
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError
+from django.test import Client, TestCase, TransactionTestCase
+from django.test import override_settings
+from django.urls import reverse
+
+from core.models import OutboxMessage
+from core.resilience import Deadline, retry_write, stale_stats
+from posts import forms
+from posts.caching import bump_version
+from posts.models import Comment, Notification, Post, Profile
+from posts.tests.variables import TEST_IMAGE
+
+User = get_user_model()
+
+
+@override_settings(STALE_PAGE_REFRESH=0)
+class ServeStaleTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Текст поста', author=cls.author)
+
+    def setUp(self):
+        caches['default'].clear()
+        caches['stale'].clear()
+        self.guest_client = Client()
+        self.pages = (
+            reverse('posts:index'),
+            reverse('posts:profile', args=(self.author.username,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+        )
+
+    def test_stale_page_on_database_error(self):
+        """При ошибке базы отдаётся последняя удачная версия страницы"""
+        for page in self.pages:
+            self.guest_client.get(page)
+            key = f'stale_page:guest:{page}'
+            self.assertIsNotNone(caches['stale'].get(key))
+            self.assertIsNone(caches['shared'].get(key))
+        with mock.patch(
+            'posts.views.get_object_or_404',
+            side_effect=OperationalError('database is locked'),
+        ), mock.patch(
+            'posts.views.get_paginator',
+            side_effect=OperationalError('database is locked'),
+        ):
+            for page in self.pages:
+                with self.subTest(page=page):
+                    response = self.guest_client.get(page)
+                    self.assertEqual(response.status_code, HTTPStatus.OK)
+                    self.assertContains(response, self.post.text)
+                    self.assertIn('Warning', response)
+                    self.assertIn('Age', response)
+        self.assertEqual(stale_stats()['error'], len(self.pages))
+
+    @override_settings(STALE_READ_DEADLINE=0)
+    @mock.patch.object(Deadline, 'steps', 1)
+    def test_stale_page_on_deadline(self):
+        """Медленный запрос прерывается и заменяется старой страницей"""
+        with override_settings(STALE_READ_DEADLINE=60):
+            self.guest_client.get(self.pages[0])
+        bump_version('posts', 'index')
+        response = self.guest_client.get(self.pages[0])
+        self.assertContains(response, self.post.text)
+        self.assertEqual(stale_stats()['deadline'], 1)
+
+    def test_error_without_stale_page(self):
+        """Без сохранённой версии ошибка не скрывается"""
+        with mock.patch(
+            'posts.views.get_paginator',
+            side_effect=OperationalError('database is locked'),
+        ):
+            with self.assertRaises(OperationalError):
+                self.guest_client.get(self.pages[0])
+
+
+@override_settings(DB_RETRY_BACKOFF=0)
+class RetryWriteTests(TransactionTestCase):
+    def test_retries_locked_database(self):
+        """Запись повторяется, пока база заблокирована"""
+        calls = []
+
+        @retry_write
+        def view(request):
+            calls.append(request)
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'ok'
+
+        self.assertEqual(view(None), 'ok')
+        self.assertEqual(len(calls), 3)
+
+    def test_other_errors_not_retried(self):
+        """Прочие ошибки базы не повторяются"""
+        calls = []
+
+        @retry_write
+        def view(request):
+            calls.append(request)
+            raise OperationalError('no such table')
+
+        with self.assertRaises(OperationalError):
+            view(None)
+        self.assertEqual(len(calls), 1)
+
+    @override_settings(DB_WRITE_RETRIES=2)
+    def test_gives_up(self):
+        """После DB_WRITE_RETRIES повторов ошибка пробрасывается"""
+        calls = []
+
+        @retry_write
+        def view(request):
+            calls.append(request)
+            raise OperationalError('database is locked')
+
+        with self.assertRaises(OperationalError):
+            view(None)
+        self.assertEqual(len(calls), 3)
+
+
+def locked_once(model):
+    """Подменяет `model.save`: первая попытка записывает строку и падает
+    с блокировкой базы, как если бы она случилась на следующем запросе
+    транзакции."""
+    save = model.save
+    calls = []
+
+    def locked(instance, *args, **kwargs):
+        calls.append(instance)
+        save(instance, *args, **kwargs)
+        if len(calls) == 1:
+            raise OperationalError('database is locked')
+
+    return mock.patch.object(model, 'save', locked), calls
+
+
+@override_settings(
+    DB_RETRY_BACKOFF=0,
+    EMAIL_BACKEND='core.outbox.OutboxBackend',
+)
+class RetriedViewTests(TransactionTestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.author = User.objects.create_user(username='author')
+        self.client = Client()
+        self.client.force_login(self.author)
+
+    def test_upload_not_repeated(self):
+        """При повторе записи поста картинка не разбирается заново"""
+        patch, calls = locked_once(Post)
+        with patch, mock.patch.object(
+                forms, 'ingest', wraps=forms.ingest) as ingest:
+            self.client.post(reverse('posts:post_create'), data={
+                'heading': 'Заголовок',
+                'text': 'Текст поста',
+                'image': SimpleUploadedFile(
+                    'small.gif', TEST_IMAGE, content_type='image/gif'),
+            })
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(ingest.call_count, 1)
+        post = Post.objects.get()
+        self.assertTrue(post.image.storage.exists(post.image.name))
+        self.assertEqual(
+            Profile.objects.get(user=self.author).posts_count, 1)
+
+    def comment(self):
+        reader = User.objects.create_user(
+            username='reader', email='reader@yatube.ru')
+        Profile.objects.filter(user=reader).update(
+            comment_emails=Profile.INSTANT)
+        post = Post.objects.create(text='Текст поста', author=reader)
+        self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            data={'text': 'Комментарий'},
+        )
+
+    def assert_comment_stored(self, stored):
+        for model in (Comment, Notification, OutboxMessage):
+            with self.subTest(model=model.__name__):
+                self.assertEqual(model.objects.count(), int(stored))
+
+    def test_comment_and_notification_retried_together(self):
+        """Блокировка при записи уведомления повторяет её вместе
+        с комментарием"""
+        patch, calls = locked_once(Notification)
+        with patch:
+            self.comment()
+        self.assertEqual(len(calls), 2)
+        self.assert_comment_stored(True)
+        self.assertEqual(Post.objects.get().comments_count, 1)
+
+    def test_comment_rolled_back_with_notification(self):
+        """Если уведомление записать не удалось, комментарий тоже
+        не сохраняется"""
+        with mock.patch(
+                'posts.notifications.notify',
+                side_effect=OperationalError('no such table')):
+            with self.assertRaises(OperationalError):
+                self.comment()
+        self.assert_comment_stored(False)
+        self.assertEqual(Post.objects.get().comments_count, 0)
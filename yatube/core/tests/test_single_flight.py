@@ -0,0 +1,115 @@
+import threading
+import time
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.template import Context, Template
+from django.test import SimpleTestCase
+
+from core import single_flight
+from core.single_flight import Entry, get_or_compute
+
+KEY = 'single_flight_test'
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self, value='value', delay=0):
+        def compute():
+            self.calls += 1
+            time.sleep(delay)
+            return value
+        return compute
+
+    def test_value_is_cached(self):
+        """Значение вычисляется один раз и берётся из кэша"""
+        self.assertEqual(get_or_compute(KEY, self.compute(), 60), 'value')
+        self.assertEqual(get_or_compute(KEY, self.compute('new'), 60), 'value')
+        self.assertEqual(self.calls, 1)
+
+    def test_concurrent_misses_compute_once(self):
+        """Одновременные промахи ждут одного вычисления"""
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                get_or_compute(KEY, self.compute(delay=0.2), 60)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['value'] * 8)
+        self.assertEqual(self.calls, 1)
+
+    def test_slow_compute_not_repeated_by_waiters(self):
+        """Ожидающие не пересчитывают значение сами, даже если
+        вычисление идёт дольше секунды"""
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                get_or_compute(KEY, self.compute(delay=1.2), 60)))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['value'] * 4)
+        self.assertEqual(self.calls, 1)
+
+    def test_waiter_takes_over_failed_compute(self):
+        """Если владелец блокировки упал, пересчитывает один ожидающий"""
+        cache.add(single_flight.lock_key(KEY), True)
+        threading.Timer(
+            0.1, cache.delete, [single_flight.lock_key(KEY)]).start()
+        self.assertEqual(get_or_compute(KEY, self.compute(), 60), 'value')
+        self.assertEqual(self.calls, 1)
+        self.assertFalse(cache.has_key(single_flight.lock_key(KEY)))
+
+    def test_stale_value_served_during_recompute(self):
+        """Пока ключ пересчитывается, остальные получают старое значение"""
+        cache.set(KEY, Entry('stale', 0.1, time.time() - 1), 60)
+        cache.add(single_flight.lock_key(KEY), True)
+        self.assertEqual(get_or_compute(KEY, self.compute(), 60), 'stale')
+        self.assertEqual(self.calls, 0)
+        cache.delete(single_flight.lock_key(KEY))
+        self.assertEqual(get_or_compute(KEY, self.compute(), 60), 'value')
+        self.assertFalse(cache.has_key(single_flight.lock_key(KEY)))
+
+    def test_early_recompute(self):
+        """Дорогое значение пересчитывается до истечения срока"""
+        cache.set(KEY, Entry('old', 1000, time.time() + 1), 60)
+        self.assertEqual(get_or_compute(KEY, self.compute(), 60), 'value')
+        cache.set(KEY, Entry('old', 1000, time.time() + 1), 60)
+        self.assertEqual(
+            get_or_compute(KEY, self.compute(), 60, beta=0), 'old')
+
+    def test_lock_released_on_error(self):
+        """Ошибка вычисления не оставляет блокировку"""
+        def fail():
+            raise RuntimeError
+        with self.assertRaises(RuntimeError):
+            get_or_compute(KEY, fail, 60)
+        self.assertFalse(cache.has_key(single_flight.lock_key(KEY)))
+
+    def test_cache_tag(self):
+        """Тег cache совместим со встроенным и кэширует фрагменты"""
+        template = Template(
+            '{% load fragment_cache %}'
+            '{% cache 60 fragment part %}{{ value }}{% endcache %}'
+        )
+        for part, value, expected in (
+            (1, 'first', 'first'),
+            (1, 'second', 'first'),
+            (2, 'second', 'second'),
+        ):
+            self.assertEqual(
+                template.render(Context({'part': part, 'value': value})),
+                expected,
+            )
+        self.assertIsInstance(
+            cache.get(make_template_fragment_key('fragment', [1])), Entry)
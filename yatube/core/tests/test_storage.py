@@ -0,0 +1,61 @@
+import os
+import tempfile
+import time
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+
+from core.storage import ContentAddressedStorage
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+    def setUp(self):
+        self.storage = ContentAddressedStorage(location=tempfile.mkdtemp())
+
+    def test_same_content_saved_once(self):
+        """Одинаковое содержимое сохраняется один раз под именем
+        из хэша в двух уровнях подкаталогов"""
+        first = self.storage.save('posts/a.GIF', ContentFile(b'content'))
+        second = self.storage.save('posts/b.gif', ContentFile(b'content'))
+        self.assertEqual(first, second)
+        self.assertRegex(
+            first,
+            r'^posts/([0-9a-f]{2})/([0-9a-f]{2})/\1\2[0-9a-f]{60}\.gif$')
+        self.assertTrue(self.storage.is_blob_name(first))
+        self.assertFalse(self.storage.is_blob_name('posts/a.gif'))
+        directory = os.path.dirname(self.storage.path(first))
+        self.assertEqual(os.listdir(directory), [os.path.basename(first)])
+
+    def test_different_content_different_names(self):
+        """Разное содержимое получает разные имена"""
+        self.assertNotEqual(
+            self.storage.save('posts/a.gif', ContentFile(b'one')),
+            self.storage.save('posts/a.gif', ContentFile(b'two')),
+        )
+
+    def test_discard_keeps_fresh_and_used_files(self):
+        """Файл удаляется, только если он не нужен и его давно
+        не загружали"""
+        name = self.storage.save('posts/a.gif', ContentFile(b'content'))
+        self.assertFalse(self.storage.discard(name, lambda: False, 60))
+        self.assertFalse(self.storage.discard(name, lambda: True, 0))
+        self.assertTrue(self.storage.discard(name, lambda: False, 0))
+        self.assertFalse(self.storage.exists(name))
+        self.assertTrue(self.storage.discard(name, lambda: False, 0))
+
+    def test_upload_during_discard_survives(self):
+        """Загрузка того же содержимого во время удаления не теряется"""
+        name = self.storage.save('posts/a.gif', ContentFile(b'content'))
+        old = time.time() - 60
+        os.utime(self.storage.path(name), (old, old))
+
+        def upload_meanwhile():
+            self.storage.save('posts/b.gif', ContentFile(b'content'))
+            return False
+
+        self.assertFalse(self.storage.discard(name, upload_meanwhile, 30))
+        with self.storage.open(name) as blob:
+            self.assertEqual(blob.read(), b'content')
+        self.assertEqual(
+            os.listdir(os.path.dirname(self.storage.path(name))),
+            [os.path.basename(name)])
@@ -0,0 +1,115 @@
+import multiprocessing
+import os
+import tempfile
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core import tiered
+
+User = get_user_model()
+
+DIRECTORY = tempfile.mkdtemp()
+CACHES = {
+    'default': {
+        'BACKEND': 'core.tiered.TieredCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'BUS': os.path.join(DIRECTORY, 'bus'),
+            'L1_SIZE': 3,
+            'POLL_INTERVAL': 0,
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache.MmapCache',
+        'LOCATION': os.path.join(DIRECTORY, 'cache'),
+    },
+}
+
+
+def write_from_child(key, value):
+    caches['default'].set(key, value)
+
+
+@override_settings(CACHES=CACHES)
+class TieredCacheTests(TestCase):
+    def setUp(self):
+        self.cache = caches['default']
+        self.cache.clear()
+        self.tier = self.cache._tier
+        for counter in self.tier.stats.values():
+            counter.clear()
+
+    def test_reads_served_from_l1(self):
+        """Повторное чтение не обращается к L2"""
+        caches['shared'].set(':1:key', 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+        stats = self.cache.stats()
+        self.assertEqual(stats['l1']['hits'], 1)
+        self.assertEqual(stats['l2']['hits'], 1)
+        self.cache.set('mutable', {'list': []})
+        self.cache.get('mutable')['list'].append(1)
+        self.assertEqual(self.cache.get('mutable'), {'list': []})
+
+    def test_l1_eviction(self):
+        """L1 хранит не больше L1_SIZE записей"""
+        for number in range(5):
+            self.cache.set(number, number)
+        self.assertEqual(self.cache.stats()['l1']['evictions'], 2)
+        self.assertEqual(self.cache.get(0), 0)
+        self.assertEqual(self.cache.stats()['l2']['hits'], 1)
+
+    def test_invalidation_from_other_process(self):
+        """Запись в другом процессе сбрасывает L1 этого процесса"""
+        self.cache.set('key', 'old')
+        self.assertEqual(self.cache.get('key'), 'old')
+        process = multiprocessing.get_context('fork').Process(
+            target=write_from_child, args=('key', 'new'))
+        process.start()
+        process.join()
+        self.assertEqual(self.cache.get('key'), 'new')
+        self.assertGreater(self.cache.stats()['bus']['received'], 0)
+
+    def test_stale_fill_is_dropped(self):
+        """Значение, прочитанное из L2 до инвалидации, не попадает в L1"""
+        since = self.tier.seq
+        with self.tier.lock:
+            self.tier.invalidate([':1:key'])
+        self.tier.put(':1:key', 'stale', since=since)
+        self.assertNotIn(':1:key', self.tier.entries)
+        self.tier.put(':1:other', 'fresh', since=since)
+        self.assertIn(':1:other', self.tier.entries)
+
+    def test_lost_messages_reset_l1(self):
+        """Если журнал шины обрезан, L1 сбрасывается целиком"""
+        self.cache.set('key', 'value')
+        bus = self.tier.bus
+        bus.last_id -= tiered.BUS_KEEP
+        bus.data_version = None
+        connection = bus.connection
+        connection.execute(
+            'INSERT INTO changes (origin, key) VALUES (0, ?)', ('other',))
+        self.tier.poll(force=True)
+        self.assertEqual(self.tier.entries, {})
+        self.assertEqual(self.cache.stats()['bus']['resets'], 1)
+
+    def test_l1_timeout(self):
+        """Запись живёт в L1 не дольше L1_TIMEOUT"""
+        self.tier.put(':1:key', 'value', timeout=0.01)
+        time.sleep(0.02)
+        self.assertIs(self.tier.get(':1:key'), tiered.MISSING)
+
+    def test_stats_view(self):
+        """Статистика кэшей доступна только персоналу"""
+        url = reverse('cache_stats')
+        client = Client()
+        self.assertEqual(client.get(url).status_code, 302)
+        client.force_login(
+            User.objects.create_user(username='staff', is_staff=True))
+        stats = client.get(url).json()
+        self.assertEqual(stats['pid'], os.getpid())
+        self.assertIn('l1', stats['caches']['default'])
@@ -0,0 +1,326 @@
+"""Двухуровневый кэш: LRU в памяти процесса (L1) перед общим кэшем (L2).
+
+Каждая запись через этот бэкенд публикует изменённый ключ в шину
+инвалидации - таблицу в SQLite-файле в режиме WAL. Процессы опрашивают
+шину не чаще раза в POLL_INTERVAL секунд (`PRAGMA data_version` почти
+бесплатна, пока никто ничего не писал) и выбрасывают из L1 изменённые
+ключи. L1_TIMEOUT ограничивает жизнь записи в L1 на случай, если L2
+изменили в обход этого бэкенда.
+"""
+import collections
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+ALL_KEYS = '*'
+IMMUTABLE = (str, bytes, int, float, bool, type(None))
+MISSING = object()
+BUS_KEEP = 10000
+BUS_TRIM_EVERY = 1000
+RECENT_SIZE = 1024
+
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+class InvalidationBus:
+    """Журнал изменённых ключей, общий для процессов хоста."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.pid = None
+        self.last_id = None
+
+    def connect(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        connection = sqlite3.connect(
+            self.path, isolation_level=None, check_same_thread=False)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=OFF')
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS changes ('
+            'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+            'origin INTEGER NOT NULL, key TEXT NOT NULL)'
+        )
+        self.connection = connection
+        self.pid = os.getpid()
+        if self.last_id is None:
+            self.last_id = connection.execute(
+                'SELECT coalesce(max(id), 0) FROM changes').fetchone()[0]
+        self.data_version = None
+
+    def ensure_connected(self):
+        if self.pid != os.getpid():
+            self.connect()
+
+    def publish(self, keys):
+        with self.lock:
+            self.ensure_connected()
+            cursor = self.connection.executemany(
+                'INSERT INTO changes (origin, key) VALUES (?, ?)',
+                [(self.pid, key) for key in keys],
+            )
+            last_id = cursor.lastrowid
+            if last_id and last_id % BUS_TRIM_EVERY < len(keys):
+                self.connection.execute(
+                    'DELETE FROM changes WHERE id <= ?',
+                    (last_id - BUS_KEEP,),
+                )
+
+    def poll(self):
+        """Ключи, изменённые другими процессами, или None, если часть
+        журнала уже удалена и надо сбросить весь L1."""
+        with self.lock:
+            self.ensure_connected()
+            data_version = self.connection.execute(
+                'PRAGMA data_version').fetchone()[0]
+            if data_version == self.data_version:
+                return []
+            self.data_version = data_version
+            rows = self.connection.execute(
+                'SELECT id, origin, key FROM changes WHERE id > ? '
+                'ORDER BY id',
+                (self.last_id,),
+            ).fetchall()
+            if not rows:
+                return []
+            lost = rows[0][0] > self.last_id + 1
+            self.last_id = rows[-1][0]
+        if lost:
+            return None
+        return [key for _, origin, key in rows if origin != self.pid]
+
+
+class Tier:
+    """L1 процесса: общий для всех потоков экземпляр на LOCATION."""
+
+    def __init__(self, bus, size, timeout, poll_interval):
+        self.bus = bus
+        self.size = size
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.entries = collections.OrderedDict()
+        self.recent = collections.deque(maxlen=RECENT_SIZE)
+        self.seq = 0
+        self.polled = 0.0
+        self.stats = {
+            'l1': collections.Counter(),
+            'l2': collections.Counter(),
+            'bus': collections.Counter(),
+        }
+
+    def invalidate(self, keys):
+        """Вызывается под `self.lock`."""
+        for key in keys:
+            self.seq += 1
+            self.recent.append((self.seq, key))
+            if key == ALL_KEYS:
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
+
+    def poll(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.polled < self.poll_interval:
+            return
+        self.polled = now
+        keys = self.bus.poll()
+        with self.lock:
+            if keys is None:
+                self.stats['bus']['resets'] += 1
+                keys = [ALL_KEYS]
+            self.stats['bus']['received'] += len(keys)
+            self.invalidate(keys)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                self.stats['l1']['misses'] += 1
+                return MISSING
+            self.entries.move_to_end(key)
+            self.stats['l1']['hits'] += 1
+        expires, value, pickled = entry
+        return pickle.loads(value) if pickled else value
+
+    def put(self, key, value, timeout=None, since=None):
+        """Кладёт значение в L1. `since` - номер изменения до чтения из
+        L2: если ключ с тех пор менялся, значение уже устарело."""
+        if timeout is None or timeout > self.timeout:
+            timeout = self.timeout
+        pickled = not isinstance(value, IMMUTABLE)
+        if pickled:
+            value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            if since is not None and self.changed_since(key, since):
+                return
+            self.entries[key] = (time.monotonic() + timeout, value, pickled)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+                self.stats['l1']['evictions'] += 1
+
+    def changed_since(self, key, since):
+        if since == self.seq:
+            return False
+        if not self.recent or self.recent[0][0] > since + 1:
+            return True
+        return any(
+            seq > since and changed in (key, ALL_KEYS)
+            for seq, changed in self.recent
+        )
+
+
+def get_tier(location, options):
+    params = (
+        location,
+        options['BUS'],
+        int(options.get('L1_SIZE', 1000)),
+        float(options.get('L1_TIMEOUT', 5)),
+        float(options.get('POLL_INTERVAL', 0.002)),
+    )
+    with _tiers_lock:
+        if params not in _tiers:
+            _tiers[params] = Tier(InvalidationBus(params[1]), *params[2:])
+        return _tiers[params]
+
+
+class TieredCache(BaseCache):
+    """Бэкенд Django для `CACHES`.
+
+    LOCATION - алиас кэша L2 в CACHES. OPTIONS: BUS (обязательный путь
+    к файлу шины, общий для всех процессов с этим L2), L1_SIZE (записей
+    в L1), L1_TIMEOUT (секунд жизни записи в L1) и POLL_INTERVAL (секунд
+    между опросами шины).
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._l2 = caches[location]
+        self._tier = get_tier(location, params.get('OPTIONS', {}))
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _timeout(self, timeout):
+        expires = self.get_backend_timeout(timeout)
+        return None if expires is None else expires - time.time()
+
+    def _changed(self, *keys):
+        tier = self._tier
+        with tier.lock:
+            tier.invalidate(keys)
+        tier.bus.publish(keys)
+        tier.stats['bus']['published'] += len(keys)
+
+    def get(self, key, default=None, version=None):
+        tier, full_key = self._tier, self._key(key, version)
+        tier.poll()
+        value = tier.get(full_key)
+        if value is not MISSING:
+            return value
+        since = tier.seq
+        value = self._l2.get(full_key, MISSING)
+        if value is MISSING:
+            tier.stats['l2']['misses'] += 1
+            return default
+        tier.stats['l2']['hits'] += 1
+        tier.poll(force=True)
+        tier.put(full_key, value, since=since)
+        return value
+
+    def get_many(self, keys, version=None):
+        tier = self._tier
+        tier.poll()
+        found, missing = {}, {}
+        for key in keys:
+            full_key = self._key(key, version)
+            value = tier.get(full_key)
+            if value is MISSING:
+                missing[full_key] = key
+            else:
+                found[key] = value
+        if not missing:
+            return found
+        since = tier.seq
+        fetched = self._l2.get_many(list(missing))
+        tier.stats['l2']['hits'] += len(fetched)
+        tier.stats['l2']['misses'] += len(missing) - len(fetched)
+        tier.poll(force=True)
+        for full_key, value in fetched.items():
+            tier.put(full_key, value, since=since)
+            found[missing[full_key]] = value
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        full_key = self._key(key, version)
+        self._l2.set(full_key, value, timeout)
+        self._changed(full_key)
+        self._tier.put(full_key, value, self._timeout(timeout))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        data = {self._key(key, version): value for key, value in data.items()}
+        failed = self._l2.set_many(data, timeout)
+        self._changed(*data)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        full_key = self._key(key, version)
+        added = self._l2.add(full_key, value, timeout)
+        if added:
+            self._changed(full_key)
+        return added
+
+    def incr(self, key, delta=1, version=None):
+        full_key = self._key(key, version)
+        try:
+            value = self._l2.incr(full_key, delta)
+        finally:
+            self._changed(full_key)
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        full_key = self._key(key, version)
+        touched = self._l2.touch(full_key, timeout)
+        self._changed(full_key)
+        return touched
+
+    def has_key(self, key, version=None):
+        return self.get(key, MISSING, version) is not MISSING
+
+    def delete(self, key, version=None):
+        full_key = self._key(key, version)
+        self._l2.delete(full_key)
+        self._changed(full_key)
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        self._l2.delete_many(keys)
+        self._changed(*keys)
+
+    def clear(self):
+        self._l2.clear()
+        self._changed(ALL_KEYS)
+
+    def stats(self):
+        """Счётчики попаданий, промахов и вытеснений по уровням."""
+        tier = self._tier
+        stats = {
+            'l1': {'hits': 0, 'misses': 0, 'evictions': 0},
+            'l2': {'hits': 0, 'misses': 0},
+            'bus': {'published': 0, 'received': 0, 'resets': 0},
+        }
+        for name, counter in tier.stats.items():
+            stats[name].update(counter)
+        stats['l1']['size'] = len(tier.entries)
+        stats['l2'].update(getattr(self._l2, 'stats', dict)())
+        return stats
@@ -1,5 +1,13 @@
+import os
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.cache import caches
+from django.http import JsonResponse
 from django.shortcuts import render
 
+from .resilience import stale_stats
+
 from http import HTTPStatus
 
 
@@ -11,3 +19,16 @@ def page_not_found(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+@staff_member_required
+def cache_stats(request):
+    """Статистика кэшей процесса, обслужившего запрос."""
+    return JsonResponse({
+        'pid': os.getpid(),
+        'caches': {
+            alias: getattr(caches[alias], 'stats', dict)()
+            for alias in settings.CACHES
+        },
+        'stale_pages': stale_stats(),
+    })
@@ -0,0 +1,12 @@
+"""Точка входа процесса исполнителя задач, запущенного через spawn.
+
+Модуль не импортирует модели: дочерний процесс загружает его до
+`django.setup()`.
+"""
+import django
+
+
+def run(queues, burst, interval, stop):
+    django.setup()
+    from core import jobs
+    jobs.work(queues, burst, interval, stop)
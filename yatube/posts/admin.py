@@ -1,9 +1,22 @@
 from django.contrib import admin
+from django.db.models.expressions import RawSQL
+
+from . import search
 from .models import Post, Group, Follow, Comment
+from .paginators import CappedCountPaginator
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Список без COUNT(*) и иерархия дат без DISTINCT по всей
+    таблице."""
+
+    paginator = CappedCountPaginator
+    show_full_result_count = False
+    change_list_template = 'admin/posts/large_table_change_list.html'
 
 
 @admin.register(Post)
-class PostAdmin(admin.ModelAdmin):
+class PostAdmin(LargeTableAdmin):
     list_display = (
         'pk',
         'text',
@@ -11,11 +24,20 @@ class PostAdmin(admin.ModelAdmin):
         'author',
         'group',
     )
-    list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    autocomplete_fields = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
+    date_hierarchy = 'pub_date'
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по полнотекстовому индексу вместо LIKE по тексту."""
+        if not search_term:
+            return queryset, False
+        return queryset.filter(
+            pk__in=RawSQL(*search.matching_ids(search_term))), False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -30,35 +52,31 @@ class GroupAdmin(admin.ModelAdmin):
 
 
 @admin.register(Comment)
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdmin):
     list_display = (
         'post',
         'author',
         'text',
         'created',
     )
-    list_filter = (
-        'text',
-        'created',
-    )
+    list_select_related = ('post', 'author')
+    autocomplete_fields = ('post', 'author')
+    date_hierarchy = 'created'
     search_fields = (
-        'post',
-        'author',
-        'text'
+        '=author__username',
+        'text',
     )
 
 
 @admin.register(Follow)
-class FollowAdmin(admin.ModelAdmin):
+class FollowAdmin(LargeTableAdmin):
     list_display = (
         'user',
         'author'
     )
-    list_filter = (
-        'user',
-        'author'
-    )
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
     search_fields = (
-        'user',
-        'author'
+        '=user__username',
+        '=author__username',
     )
@@ -1,5 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate, pre_migrate
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import search, signals  # noqa: F401
+        pre_migrate.connect(
+            search.uninstall, sender=self,
+            dispatch_uid='posts.search.uninstall')
+        post_migrate.connect(
+            search.install, sender=self, dispatch_uid='posts.search.install')
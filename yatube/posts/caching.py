@@ -0,0 +1,53 @@
+import time
+
+from django.core.cache import cache
+
+
+def version_key(scope):
+    return f'version:{scope}'
+
+
+def modified_key(scope):
+    return f'modified:{scope}'
+
+
+def get_version(scope):
+    """Текущая версия области кэша.
+
+    Начальное значение берётся из времени, поэтому после вытеснения ключа
+    версия не повторяет уже использованную.
+    """
+    key = version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000000), None)
+        version = cache.get(key)
+    return version
+
+
+def get_modified(scope):
+    """Время последнего изменения области как Unix timestamp.
+
+    Если отметка вытеснена, изменением считается текущий момент.
+    """
+    key = modified_key(scope)
+    modified = cache.get(key)
+    if modified is None:
+        cache.add(key, int(time.time()), None)
+        modified = cache.get(key)
+    return modified
+
+
+def bump_version(*scopes):
+    cache.set_many(
+        {modified_key(scope): int(time.time()) for scope in scopes}, None)
+    for scope in scopes:
+        try:
+            cache.incr(version_key(scope))
+        except ValueError:
+            pass
+
+
+def fragment_key(scope, *parts):
+    """Ключ фрагмента шаблона, который меняется вместе с версией области."""
+    return ':'.join(str(part) for part in (scope, get_version(scope)) + parts)
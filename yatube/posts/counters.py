@@ -0,0 +1,65 @@
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Profile
+
+COUNTERS = (
+    ('Profile', 'posts_count', 'Post', 'author', 'user'),
+    ('Profile', 'followers_count', 'Follow', 'author', 'user'),
+    ('Profile', 'following_count', 'Follow', 'user', 'user'),
+    ('Post', 'comments_count', 'Comment', 'post', 'pk'),
+)
+
+
+def change(queryset, field, delta):
+    """Атомарно меняет счётчик на delta, не опуская его ниже нуля."""
+    if delta < 0:
+        queryset = queryset.filter(**{f'{field}__gte': -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def recount(apps=global_apps):
+    """Создаёт недостающие профили и пересчитывает разошедшиеся счётчики.
+
+    Возвращает число исправленных строк для каждого счётчика.
+    """
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Profile = apps.get_model('posts', 'Profile')
+    Profile.objects.bulk_create(
+        (Profile(user_id=pk) for pk in User.objects.filter(
+            profile=None).values_list('pk', flat=True)),
+        ignore_conflicts=True,
+    )
+    fixed = {}
+    for model_name, field, source_name, source_field, outer in COUNTERS:
+        model = apps.get_model('posts', model_name)
+        source = apps.get_model('posts', source_name)
+        actual = Coalesce(Subquery(
+            source.objects.filter(
+                **{source_field: OuterRef(outer)}
+            ).order_by().values(source_field).annotate(
+                total=Count('pk')).values('total'),
+            output_field=IntegerField(),
+        ), 0)
+        drifted = model.objects.annotate(actual=actual).exclude(
+            **{field: F('actual')}).values('pk')
+        fixed[field] = model.objects.filter(
+            pk__in=drifted).update(**{field: actual})
+    return fixed
+
+
+def profile_of(user):
+    """Профиль пользователя. Пользователям, созданным в обход сигнала
+    post_save (bulk_create, loaddata), создаёт его с посчитанными
+    счётчиками."""
+    try:
+        return user.profile
+    except Profile.DoesNotExist:
+        user.profile, _ = Profile.objects.get_or_create(user=user, defaults={
+            'posts_count': user.posts.count(),
+            'followers_count': user.following.count(),
+            'following_count': user.follower.count(),
+        })
+        return user.profile
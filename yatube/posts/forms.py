@@ -1,6 +1,8 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
 
-from .models import Post, Comment
+from .ingest import ingest
+from .models import Comment, Post, Profile
 
 
 class PostForm(forms.ModelForm):
@@ -13,6 +15,12 @@ class PostForm(forms.ModelForm):
             "image"
         )
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            return ingest(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -21,3 +29,12 @@ class CommentForm(forms.ModelForm):
         labels = {
             'text': 'Текст',
         }
+
+
+class NotificationSettingsForm(forms.ModelForm):
+    class Meta:
+        model = Profile
+        fields = ('comment_emails',)
+        widgets = {
+            'comment_emails': forms.RadioSelect,
+        }
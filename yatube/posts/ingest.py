@@ -0,0 +1,113 @@
+"""Приём картинок постов с ограничением памяти.
+
+Загрузки пишутся на диск обработчиком TemporaryFileUploadHandler,
+Pillow читает их по пути к файлу. До декодирования по заголовку
+проверяются размер файла и число пикселей, затем оценивается память
+под декодированную картинку. JPEG декодируется сразу в уменьшенном
+масштабе (draft mode), остальные форматы должны уложиться в
+POST_IMAGE_MEMORY_LIMIT целиком. Результат повёрнут по EXIF, уменьшен
+до POST_IMAGE_MAX_SIDE и сохранён без метаданных, кроме ICC-профиля.
+"""
+import os
+
+from django import forms
+from django.conf import settings
+from PIL import Image, ImageOps
+
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif'}
+SAVE_OPTIONS = {
+    'JPEG': {'quality': 90, 'optimize': True},
+    'WEBP': {'quality': 90},
+}
+# Pillow хранит пиксель многоканальной картинки в 4 байтах, а поворот
+# по EXIF делает копию.
+BYTES_PER_PIXEL = 4
+COPIES = 2
+
+MEGABYTE = 1024 * 1024
+
+
+def open_image(upload):
+    if hasattr(upload, 'temporary_file_path'):
+        return Image.open(upload.temporary_file_path())
+    upload.seek(0)
+    return Image.open(upload)
+
+
+def target_size(width, height):
+    scale = min(1, settings.POST_IMAGE_MAX_SIDE / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def check_header(image):
+    width, height = image.size
+    pixels = width * height * getattr(image, 'n_frames', 1)
+    if pixels > settings.POST_IMAGE_MAX_PIXELS:
+        raise forms.ValidationError(
+            'Картинка слишком большая: не больше %(limit)d мегапикселей.',
+            code='too_many_pixels',
+            params={'limit': settings.POST_IMAGE_MAX_PIXELS // 10 ** 6},
+        )
+
+
+def check_memory(image):
+    width, height = image.size
+    if width * height * BYTES_PER_PIXEL * COPIES > (
+            settings.POST_IMAGE_MEMORY_LIMIT):
+        raise forms.ValidationError(
+            'Картинку такого размера не получится обработать. '
+            'Уменьшите её или сохраните в JPEG.',
+            code='too_much_memory',
+        )
+
+
+def save(image, upload, image_format):
+    """Перезаписывает загруженный файл: его временный файл Django
+    удалит сам в конце запроса."""
+    if image_format not in EXTENSIONS:
+        image_format = 'PNG'
+        image = image.convert('RGBA')
+    upload.file.seek(0)
+    upload.file.truncate()
+    image.save(
+        upload.file,
+        image_format,
+        icc_profile=image.info.get('icc_profile'),
+        **SAVE_OPTIONS.get(image_format, {}),
+    )
+    upload.size = upload.file.tell()
+    upload.file.seek(0)
+    base = os.path.splitext(os.path.basename(upload.name))[0]
+    upload.name = f'{base}.{EXTENSIONS[image_format]}'
+    upload.content_type = Image.MIME[image_format]
+    return upload
+
+
+def ingest(upload):
+    """Проверяет и нормализует загруженную картинку на месте.
+
+    Анимированные картинки только проверяются и сохраняются как есть.
+    """
+    if upload.size > settings.POST_IMAGE_MAX_BYTES:
+        raise forms.ValidationError(
+            'Файл слишком большой: не больше %(limit)d МБ.',
+            code='too_large',
+            params={'limit': settings.POST_IMAGE_MAX_BYTES // MEGABYTE},
+        )
+    try:
+        image = open_image(upload)
+    except (OSError, Image.DecompressionBombError):
+        raise forms.ValidationError(
+            'Загрузите правильное изображение.', code='invalid_image')
+    with image:
+        check_header(image)
+        if getattr(image, 'is_animated', False):
+            upload.seek(0)
+            return upload
+        image_format = image.format
+        size = target_size(*image.size)
+        image.draft(image.mode, size)
+        check_memory(image)
+        image = ImageOps.exif_transpose(image)
+    image.thumbnail(target_size(*image.size))
+    return save(image, upload, image_format)
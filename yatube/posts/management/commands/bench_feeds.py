@@ -0,0 +1,151 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.test import override_settings
+
+from yatube.settings import NUM_OF_POSTS
+
+from posts import timeline
+from posts.counters import recount
+from posts.models import Follow, Post, Timeline
+
+User = get_user_model()
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    func(*args)
+    return (time.perf_counter() - started) * 1000
+
+
+def summary(samples):
+    samples = sorted(samples)
+    return (
+        f'медиана {statistics.median(samples):8.3f} мс, '
+        f'p95 {samples[int(len(samples) * 0.95) - 1]:8.3f} мс, '
+        f'всего {sum(samples):10.1f} мс'
+    )
+
+
+def pull_read(user_id):
+    list(Post.objects.filter(
+        author__following__user=user_id
+    ).select_related('author', 'group').order_by(
+        '-pub_date', '-pk')[:NUM_OF_POSTS])
+
+
+def push_read(user_id):
+    list(Post.objects.filter(
+        timelines__user=user_id
+    ).annotate(
+        feed_date=F('timelines__pub_date'),
+        feed_post=F('timelines__post'),
+    ).select_related('author', 'group').order_by(
+        '-feed_date', '-feed_post')[:NUM_OF_POSTS])
+
+
+def hybrid_read(user_id):
+    list(timeline.feed(user_id).select_related('author', 'group').order_by(
+        '-feed_date', '-feed_post')[:NUM_OF_POSTS])
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает ленты подписок pull, push и hybrid на синтетическом '
+        'графе подписок со степенным распределением. Все данные '
+        'создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000)
+        parser.add_argument('--follows', type=int, default=30,
+                            help='Среднее число подписок пользователя')
+        parser.add_argument('--alpha', type=float, default=1.2,
+                            help='Показатель степенного распределения')
+        parser.add_argument('--posts', type=int, default=500)
+        parser.add_argument('--reads', type=int, default=300)
+        parser.add_argument('--follower-limit', type=int, default=200,
+                            help='Порог подписчиков для режима hybrid')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        with transaction.atomic():
+            self.run(options)
+            transaction.set_rollback(True)
+        cache.delete(timeline.PULL_AUTHORS_KEY)
+
+    def build_graph(self, options):
+        users = User.objects.bulk_create(
+            User(username=f'bench_feeds_{number}')
+            for number in range(options['users'])
+        )
+        user_ids = [user.pk for user in User.objects.filter(
+            username__startswith='bench_feeds_').order_by('pk')]
+        weights = [1 / rank ** options['alpha']
+                   for rank in range(1, len(users) + 1)]
+        pairs = set()
+        for user_id in user_ids:
+            count = min(
+                int(random.paretovariate(1.5) * options['follows'] / 3),
+                len(user_ids) - 1,
+            )
+            for author_id in random.choices(user_ids, weights, k=count):
+                if author_id != user_id:
+                    pairs.add((user_id, author_id))
+        Follow.objects.bulk_create(
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id, author_id in pairs
+        )
+        author_ids = random.choices(user_ids, weights, k=options['posts'])
+        Post.objects.bulk_create(
+            Post(heading='bench', text='bench', author_id=author_id)
+            for author_id in author_ids
+        )
+        recount()
+        posts = list(Post.objects.filter(
+            author_id__in=user_ids).order_by('pk'))
+        self.stdout.write(
+            f'Пользователей: {len(user_ids)}, подписок: {len(pairs)}, '
+            f'постов: {len(posts)}, подписчиков у самого популярного: '
+            f'{Follow.objects.filter(author=user_ids[0]).count()}'
+        )
+        return user_ids, weights, posts
+
+    def report(self, name, writes, readers):
+        rows = Timeline.objects.count()
+        reads = [timed(self.read, reader) for reader in readers]
+        self.stdout.write(f'{name}:')
+        self.stdout.write(f'  раздача: {summary(writes)}')
+        self.stdout.write(f'  чтение: {summary(reads)}')
+        self.stdout.write(f'  строк в Timeline: {rows}')
+
+    def run(self, options):
+        user_ids, weights, posts = self.build_graph(options)
+        readers = random.choices(user_ids, weights, k=options['reads'])
+
+        self.read = pull_read
+        self.report('pull', [0.0], readers)
+
+        self.read = push_read
+        with override_settings(
+                TIMELINE_FANOUT_FOLLOWER_LIMIT=len(user_ids)):
+            writes = [timed(timeline.fan_out, post) for post in posts]
+        self.report('push', writes, readers)
+
+        Timeline.objects.all().delete()
+        cache.delete(timeline.PULL_AUTHORS_KEY)
+        self.read = hybrid_read
+        with override_settings(
+                TIMELINE_FANOUT_FOLLOWER_LIMIT=options['follower_limit'],
+                TIMELINE_FANOUT_INLINE_LIMIT=len(user_ids)):
+            writes = [timed(timeline.publish, post) for post in posts]
+            self.report('hybrid', writes, readers)
+        cache.delete_many(
+            [timeline.recent_key(user_id) for user_id in user_ids])
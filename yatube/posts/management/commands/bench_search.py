@@ -0,0 +1,123 @@
+import itertools
+import random
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+from posts.models import Post
+
+User = get_user_model()
+
+SYLLABLES = (
+    'ка', 'ло', 'ми', 'ре', 'ту', 'ны', 'ва', 'се', 'до', 'пи',
+    'ро', 'ку', 'ле', 'ма', 'но', 'ти', 'за', 'го', 'бе', 'ши',
+)
+BATCH_SIZE = 5000
+
+
+def vocabulary(size):
+    words = (
+        ''.join(parts)
+        for length in (2, 3, 4)
+        for parts in itertools.product(SYLLABLES, repeat=length)
+    )
+    return list(itertools.islice(words, size))
+
+
+def summary(samples):
+    samples = sorted(samples)
+    return (
+        f'медиана {statistics.median(samples):9.2f} мс, '
+        f'p95 {samples[int(len(samples) * 0.95) - 1]:9.2f} мс'
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет время поиска по постам через FTS5 и через LIKE. '
+        'Недостающие посты создаются от пользователя bench_search и '
+        'остаются в базе до запуска с --cleanup, поэтому запускайте '
+        'команду на отдельной базе.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=1_000_000)
+        parser.add_argument('--words', type=int, default=20_000)
+        parser.add_argument('--reads', type=int, default=20)
+        parser.add_argument('--like-reads', type=int, default=3)
+        parser.add_argument('--cleanup', action='store_true')
+
+    def handle(self, *args, **options):
+        author, _ = User.objects.get_or_create(username='bench_search')
+        if options['cleanup']:
+            author.delete()
+            return
+        words = vocabulary(options['words'])
+        self.fill(author, words, options['posts'])
+        queries = {
+            'частое слово': words[0],
+            'среднее слово': words[len(words) // 100],
+            'редкое слово': words[-1],
+            'два слова': f'{words[1]} {words[len(words) // 10]}',
+            'префикс': words[0][:2],
+        }
+        for label, query in queries.items():
+            self.measure(label, query, options)
+
+    def fill(self, author, words, count):
+        existing = Post.objects.filter(author=author).count()
+        rng = random.Random(existing)
+        weights = list(itertools.accumulate(
+            1 / rank for rank in range(1, len(words) + 1)))
+        started = time.perf_counter()
+        for start in range(existing, count, BATCH_SIZE):
+            size = min(BATCH_SIZE, count - start)
+            with transaction.atomic():
+                Post.objects.bulk_create(
+                    Post(
+                        heading=' '.join(
+                            rng.choices(words, cum_weights=weights, k=4)),
+                        text=' '.join(
+                            rng.choices(words, cum_weights=weights, k=60)),
+                        author=author,
+                    )
+                    for _ in range(size)
+                )
+            self.stdout.write(f'Создано постов: {start + size}', ending='\r')
+        if count > existing:
+            self.stdout.write(
+                f'\nПосты с индексацией созданы за '
+                f'{time.perf_counter() - started:.1f} с')
+
+    def timed(self, function, reads):
+        samples = []
+        for _ in range(reads):
+            started = time.perf_counter()
+            result = function()
+            samples.append((time.perf_counter() - started) * 1000)
+        return samples, result
+
+    def measure(self, label, query, options):
+        first, (_, cursor) = self.timed(
+            lambda: search.search(query), options['reads'])
+        deep = []
+        for _ in range(5):
+            if cursor is None:
+                break
+            samples, (_, cursor) = self.timed(
+                lambda: search.search(query, cursor), 1)
+            deep += samples
+        like, _ = self.timed(
+            lambda: list(Post.objects.filter(
+                text__icontains=query.split()[0]).order_by('-pk')[:10]),
+            options['like_reads'],
+        )
+        self.stdout.write(f'{label} ({query!r}):')
+        self.stdout.write(f'  FTS5, первая страница  {summary(first)}')
+        if deep:
+            self.stdout.write(f'  FTS5, страницы 2-6     {summary(deep)}')
+        self.stdout.write(f'  LIKE, первая страница  {summary(like)}')
@@ -0,0 +1,117 @@
+import statistics
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client
+from django.urls import reverse
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+
+from posts import thumbnails
+from posts.caching import bump_version
+from posts.models import Post
+from posts.templatetags.post_cards import card_key
+
+User = get_user_model()
+
+
+def preload_one_by_one(images, size):
+    """Как `{% thumbnail %}`: отдельное чтение хранилища на картинку."""
+    geometry, options = settings.POST_THUMBNAILS[size]
+    return {
+        image.name: default.kvstore.get(
+            thumbnails.resolve(ImageFile(image), geometry, options)[0])
+        for image in images if image
+    }
+
+
+def summary(samples):
+    samples = sorted(samples)
+    return (
+        f'медиана {statistics.median(samples):8.3f} мс, '
+        f'p95 {samples[int(len(samples) * 0.95) - 1]:8.3f} мс'
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет время отрисовки главной страницы с миниатюрами при '
+        'чтении хранилища sorl по одной картинке и пачкой. Все данные '
+        'создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-sizes', type=int, nargs='+',
+                            default=[10, 50, 100])
+        parser.add_argument('--reads', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            posts = self.create_posts(max(options['page_sizes']))
+            try:
+                self.run(posts, options)
+            finally:
+                cache.delete_many(self.kvstore_keys)
+                transaction.set_rollback(True)
+
+    def create_posts(self, count):
+        author = User.objects.create(username='bench_thumbnails')
+        Post.objects.bulk_create(
+            Post(
+                heading='bench',
+                text='bench',
+                author=author,
+                image=f'posts/bench_thumbnails_{number}.jpg',
+            )
+            for number in range(count)
+        )
+        posts = list(Post.objects.filter(
+            author=author).select_related('author', 'group'))
+        self.kvstore_keys = []
+        for post in posts:
+            source = ImageFile(post.image)
+            source.set_size([1920, 1080])
+            default.kvstore.set(source)
+            for geometry, options in settings.POST_THUMBNAILS.values():
+                thumbnail, _ = thumbnails.resolve(source, geometry, options)
+                thumbnail.set_size([960, 339])
+                default.kvstore.set(thumbnail, source)
+                self.kvstore_keys.append(add_prefix(thumbnail.key))
+        return posts
+
+    def render(self, posts, cold):
+        bump_version('index')
+        cache.delete_many([card_key(post) for post in posts])
+        if cold:
+            cache.delete_many(self.kvstore_keys)
+        started = time.perf_counter()
+        self.client.get(reverse('posts:index'))
+        return (time.perf_counter() - started) * 1000
+
+    def run(self, posts, options):
+        self.client = Client()
+        modes = (
+            ('по одной', preload_one_by_one),
+            ('пачкой', thumbnails.preload),
+        )
+        for page_size in options['page_sizes']:
+            self.stdout.write(f'Постов на странице: {page_size}')
+            for cold in (False, True):
+                state = 'пустой кэш' if cold else 'записи sorl в кэше'
+                for name, preload in modes:
+                    with mock.patch('posts.views.NUM_OF_POSTS', page_size), \
+                            mock.patch(
+                                'posts.templatetags.post_cards.preload',
+                                preload):
+                        samples = [
+                            self.render(posts, cold)
+                            for _ in range(options['reads'])
+                        ]
+                    self.stdout.write(
+                        f'  {state}, {name}: {summary(samples)}')
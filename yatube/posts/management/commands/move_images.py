@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from posts import thumbnails
+from posts.models import Post
+from posts.signals import invalidate_feeds_of
+
+
+class Command(BaseCommand):
+    help = (
+        'Переносит картинки постов, сохранённые до хранилища по хэшу '
+        'содержимого, в каталоги вида posts/ab/cd/<sha256>. Одинаковые '
+        'файлы сливаются в один, старые файлы и их миниатюры удаляются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать файлы для переноса')
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        names = Post.objects.exclude(image='').order_by(
+            'image').values_list('image', flat=True).distinct()
+        stats = {'moved': 0, 'merged': 0, 'missing': 0}
+        for name in names.iterator():
+            if storage.is_blob_name(name):
+                continue
+            if not storage.exists(name):
+                stats['missing'] += 1
+                self.stderr.write(f'Файл не найден: {name}')
+                continue
+            if options['dry_run']:
+                stats['moved'] += 1
+                continue
+            with storage.open(name) as content:
+                blob = storage.blob_name(name, content)
+                stats['merged' if storage.exists(blob) else 'moved'] += 1
+                storage.save_blob(blob, content)
+            self.repoint(name, blob)
+        verb = 'Будет перенесено' if options['dry_run'] else 'Перенесено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} файлов: {stats["moved"]}, '
+            f'совпали с уже перенесёнными: {stats["merged"]}, '
+            f'не найдено: {stats["missing"]}'
+        ))
+        if stats['moved'] + stats['merged'] and not options['dry_run']:
+            self.stdout.write(
+                'Миниатюры перенесённых картинок создаст '
+                '`manage.py regenerate_thumbnails`.')
+
+    def repoint(self, name, blob):
+        with transaction.atomic():
+            posts = Post.objects.filter(image=name)
+            invalidate_feeds_of(posts)
+            posts.update(image=blob, image_variants='', updated=timezone.now())
+        thumbnails.delete_unused(name)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import timeline
+from posts.models import Follow, Timeline
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает ленты подписок всех пользователей с нуля. Каждая '
+        'пачка лент удаляется и заполняется в одной транзакции, так что '
+        'остальные ленты всё это время доступны.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Сколько лент пересобирать в одной транзакции',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        user_ids = sorted(
+            set(Follow.objects.values_list('user', flat=True).distinct())
+            | set(Timeline.objects.values_list('user', flat=True).distinct())
+        )
+        for start in range(0, len(user_ids), batch_size):
+            with transaction.atomic():
+                timeline.rebuild(user_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересобрано лент: {len(user_ids)}, '
+            f'записей: {Timeline.objects.count()}'
+        ))
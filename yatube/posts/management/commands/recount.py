@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import recount
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов, подписок и комментариев'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fixed = recount()
+        for field, rows in fixed.items():
+            self.stdout.write(f'{field}: исправлено строк {rows}')
+        self.stdout.write(self.style.SUCCESS('Счётчики пересчитаны'))
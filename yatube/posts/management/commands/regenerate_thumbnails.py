@@ -0,0 +1,177 @@
+import collections
+import os
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+
+from posts import thumbnails
+from posts.models import Post
+
+PROGRESS_EVERY = 100
+
+
+def walk(path):
+    """Все файлы хранилища внутри `path`."""
+    if not default.storage.exists(path):
+        return
+    directories, files = default.storage.listdir(path)
+    for name in files:
+        yield f'{path}/{name}'
+    for directory in directories:
+        yield from walk(f'{path}/{directory}')
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт миниатюры из POST_THUMBNAILS для картинок всех постов '
+        'в пуле процессов. Прерванный запуск продолжается с места, '
+        'записанного в файле контрольной точки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int,
+                            default=os.cpu_count() or 1)
+        parser.add_argument(
+            '--max-in-flight', type=int,
+            help='Сколько картинок обрабатывается одновременно, '
+                 'по умолчанию вдвое больше числа процессов',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=os.path.join(
+                tempfile.gettempdir(), 'yatube.thumbnails.checkpoint'),
+        )
+        parser.add_argument('--restart', action='store_true',
+                            help='Начать заново, не глядя на контрольную '
+                                 'точку')
+        parser.add_argument('--force', action='store_true',
+                            help='Пересоздать и существующие миниатюры')
+        parser.add_argument('--prune', action='store_true',
+                            help='Удалить миниатюры, которые не нужны '
+                                 'ни одному посту')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только показать, что будет сделано')
+
+    def handle(self, *args, **options):
+        self.options = options
+        if options['restart'] and not options['dry_run']:
+            self.remove_checkpoint()
+        last_pk = 0 if options['restart'] else self.read_checkpoint()
+        images = Post.objects.filter(pk__gt=last_pk).exclude(
+            image='').order_by('pk').values_list('pk', 'image')
+        if options['dry_run']:
+            self.plan(images)
+        else:
+            self.regenerate(images.iterator())
+        if options['prune']:
+            self.prune()
+
+    def read_checkpoint(self):
+        try:
+            with open(self.options['checkpoint']) as checkpoint:
+                return int(checkpoint.read())
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def write_checkpoint(self, pk):
+        path = self.options['checkpoint']
+        with open(f'{path}.tmp', 'w') as checkpoint:
+            checkpoint.write(str(pk))
+        os.replace(f'{path}.tmp', path)
+
+    def remove_checkpoint(self):
+        if os.path.exists(self.options['checkpoint']):
+            os.remove(self.options['checkpoint'])
+
+    def plan(self, images):
+        total = missing = 0
+        for _, name in images.iterator():
+            total += 1
+            missing += self.options['force'] or any(
+                not default.storage.exists(thumbnail)
+                for thumbnail in thumbnails.thumbnail_names(name)
+            )
+        self.stdout.write(
+            f'Картинок: {total}, будет создано миниатюр для: {missing}')
+
+    def regenerate(self, images):
+        workers = self.options['workers']
+        limit = self.options['max_in_flight'] or workers * 2
+        self.in_flight = {}
+        self.pending = collections.deque()
+        self.finished = set()
+        self.stats = collections.Counter()
+        self.started = time.monotonic()
+        with thumbnails.make_pool(workers) as pool:
+            for pk, name in images:
+                if len(self.in_flight) >= limit:
+                    self.collect()
+                future = pool.submit(
+                    thumbnails.render, name, self.options['force'])
+                self.in_flight[future] = pk
+                self.pending.append(pk)
+            while self.in_flight:
+                self.collect()
+        self.remove_checkpoint()
+        self.stdout.write(self.style.SUCCESS(self.progress()))
+
+    def collect(self):
+        done, _ = wait(self.in_flight, return_when=FIRST_COMPLETED)
+        for future in done:
+            pk = self.in_flight.pop(future)
+            try:
+                result = future.result()
+                thumbnails.register(pk, *result)
+            except Exception as error:
+                self.stats['failed'] += 1
+                self.stderr.write(f'Пост {pk}: {error}')
+            else:
+                self.stats['created' if result[2] else 'skipped'] += 1
+            self.finished.add(pk)
+            if sum(self.stats.values()) % PROGRESS_EVERY == 0:
+                self.stdout.write(self.progress())
+        self.advance_checkpoint()
+
+    def advance_checkpoint(self):
+        """Контрольная точка - наибольший id, до которого обработаны
+        все посты: пул завершает картинки не по порядку."""
+        last_pk = None
+        while self.pending and self.pending[0] in self.finished:
+            last_pk = self.pending.popleft()
+            self.finished.discard(last_pk)
+        if last_pk is not None:
+            self.write_checkpoint(last_pk)
+
+    def progress(self):
+        processed = sum(self.stats.values())
+        elapsed = time.monotonic() - self.started
+        return (
+            f'Обработано картинок: {processed} '
+            f'(созданы: {self.stats["created"]}, '
+            f'уже были: {self.stats["skipped"]}, '
+            f'ошибок: {self.stats["failed"]}) за {elapsed:.1f} с, '
+            f'{processed / elapsed if elapsed else 0:.1f} картинок/с'
+        )
+
+    def prune(self):
+        needed = set()
+        for name in Post.objects.exclude(image='').values_list(
+                'image', flat=True).iterator():
+            needed |= thumbnails.thumbnail_names(name)
+        orphans = [
+            name
+            for name in walk(sorl_settings.THUMBNAIL_PREFIX.rstrip('/'))
+            if name not in needed
+        ]
+        if self.options['dry_run']:
+            self.stdout.write(f'Будет удалено миниатюр: {len(orphans)}')
+            return
+        for name in orphans:
+            default.storage.delete(name)
+        default.kvstore.cleanup()
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено миниатюр: {len(orphans)}'))
@@ -0,0 +1,60 @@
+# Generated by Django 2.2.16 on 2026-10-18 19:41
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    users = apps.get_model(settings.AUTH_USER_MODEL)._meta.db_table
+    schema_editor.execute(f"""
+        INSERT INTO posts_profile(
+            user_id, posts_count, followers_count, following_count)
+        SELECT id, 0, 0, 0 FROM {users}
+        WHERE id NOT IN (SELECT user_id FROM posts_profile)
+    """)
+    schema_editor.execute("""
+        UPDATE posts_profile SET
+            posts_count = (SELECT COUNT(*) FROM posts_post
+                           WHERE author_id = posts_profile.user_id),
+            followers_count = (SELECT COUNT(*) FROM posts_follow
+                               WHERE author_id = posts_profile.user_id),
+            following_count = (SELECT COUNT(*) FROM posts_follow
+                               WHERE user_id = posts_profile.user_id)
+    """)
+    schema_editor.execute("""
+        UPDATE posts_post SET comments_count = (
+            SELECT COUNT(*) FROM posts_comment
+            WHERE post_id = posts_post.id)
+    """)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0013_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Комментариев'),
+        ),
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('posts_count', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('followers_count', models.PositiveIntegerField(db_index=True, default=0, verbose_name='Подписчиков')),
+                ('following_count', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='profile', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Профиль',
+                'verbose_name_plural': 'Профили',
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 2.2.16 on 2026-10-18 20:29
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0017_post_image_content_addressed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='comment_emails',
+            field=models.CharField(choices=[('instant', 'Письмо на каждый комментарий'), ('digest', 'Одно письмо со всеми новыми комментариями')], default='digest', max_length=10, verbose_name='Письма о комментариях'),
+        ),
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('read', models.BooleanField(default=False, verbose_name='Прочитано')),
+                ('emailed', models.DateTimeField(blank=True, null=True, verbose_name='Отправлено письмом')),
+                ('comment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to='posts.Comment')),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Уведомление',
+                'verbose_name_plural': 'Уведомления',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', '-created'], name='notification_inbox_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['emailed', 'read'], name='notification_pending_idx'),
+        ),
+    ]
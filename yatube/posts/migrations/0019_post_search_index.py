@@ -0,0 +1,49 @@
+from django.db import migrations
+
+TABLE = 'posts_post_fts'
+
+
+def create_index(apps, schema_editor):
+    """Создаёт и заполняет таблицу поиска. Триггеры к ней добавляет
+    `posts.search.install` после миграций."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(f"""
+        CREATE VIRTUAL TABLE {TABLE} USING fts5(
+            heading, text, author_name, group_title,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3 4'
+        )
+    """)
+    schema_editor.execute(
+        f"INSERT INTO {TABLE}({TABLE}, rank) "
+        f"VALUES ('rank', 'bm25(8.0, 1.0, 2.0, 2.0)')")
+    schema_editor.execute(f"""
+        INSERT INTO {TABLE}(rowid, heading, text, author_name, group_title)
+        SELECT post.id, post.heading, post.text,
+            author.username || ' ' || author.first_name || ' ' ||
+            author.last_name,
+            grp.title
+        FROM posts_post post
+        JOIN auth_user author ON author.id = post.author_id
+        LEFT JOIN posts_group grp ON grp.id = post.group_id
+    """)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for suffix in ('insert', 'update', 'delete', 'author', 'group'):
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {TABLE}_{suffix}')
+    schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_notifications'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
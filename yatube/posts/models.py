@@ -1,9 +1,48 @@
+import json
+
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from core.storage import ContentAddressedStorage
+
 User = get_user_model()
 
 
+class Profile(models.Model):
+    INSTANT = 'instant'
+    DIGEST = 'digest'
+    DELIVERIES = (
+        (INSTANT, 'Письмо на каждый комментарий'),
+        (DIGEST, 'Одно письмо со всеми новыми комментариями'),
+    )
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='profile',
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Подписчиков',
+        default=0,
+        db_index=True,
+    )
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+    comment_emails = models.CharField(
+        'Письма о комментариях',
+        max_length=10,
+        choices=DELIVERIES,
+        default=DIGEST,
+    )
+
+    class Meta:
+        verbose_name = 'Профиль'
+        verbose_name_plural = 'Профили'
+
+    def __str__(self) -> str:
+        return self.user.username
+
+
 class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=200, unique=True)
@@ -17,6 +56,7 @@ class Post(models.Model):
     heading = models.CharField(max_length=200)
     text = models.TextField()
     pub_date = models.DateTimeField(auto_now_add=True)
+    updated = models.DateTimeField('Дата изменения', auto_now=True)
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -32,17 +72,51 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=ContentAddressedStorage(),
         blank=True
     )
+    image_variants = models.TextField(
+        'Варианты картинки',
+        blank=True,
+        default='',
+        editable=False,
+        help_text='Имена, размеры и объём файлов для srcset в JSON',
+    )
+    comments_count = models.PositiveIntegerField(
+        'Комментариев',
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         ordering = ['-pub_date']
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(fields=['pub_date'], name='post_pub_date_idx'),
+            models.Index(
+                fields=['author', 'pub_date'],
+                name='post_author_pub_date_idx',
+            ),
+            models.Index(
+                fields=['group', 'pub_date'],
+                name='post_group_pub_date_idx',
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
 
+    @property
+    def variants(self):
+        """Варианты текущей картинки по размерам из POST_THUMBNAILS."""
+        if not self.image_variants:
+            return {}
+        variants = json.loads(self.image_variants)
+        if variants['source'] != self.image.name:
+            return {}
+        return variants['sizes']
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -63,10 +137,46 @@ class Comment(models.Model):
         auto_now_add=True
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created'], name='comment_post_created_idx'),
+            models.Index(fields=['created'], name='comment_created_idx'),
+        ]
+
     def __str__(self):
         return self.text
 
 
+class Notification(models.Model):
+    """Комментарий к посту в ленте уведомлений его автора."""
+
+    recipient = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='notifications',
+    )
+    comment = models.ForeignKey(
+        Comment,
+        on_delete=models.CASCADE,
+        related_name='notifications',
+    )
+    created = models.DateTimeField(auto_now_add=True)
+    read = models.BooleanField('Прочитано', default=False)
+    emailed = models.DateTimeField('Отправлено письмом', blank=True, null=True)
+
+    class Meta:
+        verbose_name = 'Уведомление'
+        verbose_name_plural = 'Уведомления'
+        indexes = [
+            models.Index(
+                fields=['recipient', '-created'],
+                name='notification_inbox_idx'),
+            models.Index(
+                fields=['emailed', 'read'], name='notification_pending_idx'),
+        ]
+
+
 class Follow(models.Model):
     user = models.ForeignKey(
         User,
@@ -84,6 +194,42 @@ class Follow(models.Model):
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'author'], name='unique_follow'),
+        ]
 
     def __str__(self) -> str:
         return self.user.username
+
+
+class Timeline(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        help_text='Владелец ленты',
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timelines',
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'], name='unique_timeline_post'),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx',
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.user} - {self.post}'
@@ -0,0 +1,105 @@
+"""Уведомления авторов о комментариях.
+
+Каждый комментарий к чужому посту попадает в ленту уведомлений автора
+поста. Автор выбирает в профиле, как получать письма: сразу на каждый
+комментарий или одной сводкой. Сводку отправляет фоновая задача
+`send_digests` не позже чем через COMMENT_DIGEST_WINDOW секунд после
+первого неотправленного уведомления: всем получателям одним запросом
+к базе, по письму на получателя. Уведомления, прочитанные на сайте до
+сводки, в неё не попадают. Неотправленные уведомления уходят сводкой
+и после перехода получателя на мгновенную доставку.
+"""
+from itertools import groupby
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection, send_mail
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import Truncator
+
+from core.jobs import job
+from .counters import profile_of
+from .models import Notification, Profile
+
+FROM_EMAIL = 'YaTube@YaTube.ru'
+TEXT_LENGTH = 200
+
+
+def notify(comment):
+    """Уведомляет автора поста о комментарии. Ожидает, что профиль
+    автора поста загружен вместе с постом."""
+    recipient = comment.post.author
+    if recipient == comment.author:
+        return
+    instant = profile_of(recipient).comment_emails == Profile.INSTANT
+    Notification.objects.create(
+        recipient=recipient,
+        comment=comment,
+        emailed=timezone.now() if instant and recipient.email else None,
+    )
+    if not recipient.email:
+        return
+    if instant:
+        send_mail(
+            'Новый комментарий',
+            f'У вас новый комментарий к посту "{comment.post.heading}". '
+            f'{comment.author}: {comment.text}',
+            FROM_EMAIL,
+            [recipient.email],
+        )
+    else:
+        send_digests.enqueue(
+            countdown=settings.COMMENT_DIGEST_WINDOW, key='comment_digest')
+
+
+def pending():
+    return Notification.objects.filter(
+        emailed=None,
+        read=False,
+    ).exclude(recipient__email='')
+
+
+def digest(rows):
+    lines = ['Новые комментарии к вашим постам.']
+    for (_, heading), comments in groupby(rows, key=lambda row: row[3:5]):
+        lines.append(f'\n"{heading}"')
+        lines.extend(
+            f'{author}: {Truncator(text).chars(TEXT_LENGTH)}'
+            for _, _, _, _, _, author, text in comments
+        )
+    return '\n'.join(lines)
+
+
+@job(queue='mail')
+def send_digests():
+    """Отправляет каждому получателю одно письмо со всеми
+    неотправленными уведомлениями."""
+    rows = pending().order_by(
+        'recipient', 'comment__post', 'comment__created'
+    ).values_list(
+        'pk',
+        'recipient',
+        'recipient__email',
+        'comment__post',
+        'comment__post__heading',
+        'comment__author__username',
+        'comment__text',
+    )
+    last_pk = 0
+    messages = []
+    for (_, email), items in groupby(
+            rows.iterator(), key=lambda row: row[1:3]):
+        items = list(items)
+        last_pk = max(last_pk, *(row[0] for row in items))
+        messages.append(EmailMessage(
+            f'Новые комментарии: {len(items)}',
+            digest(items),
+            FROM_EMAIL,
+            [email],
+        ))
+    if not messages:
+        return 0
+    with transaction.atomic():
+        get_connection().send_messages(messages)
+        pending().filter(pk__lte=last_pk).update(emailed=timezone.now())
+    return len(messages)
@@ -0,0 +1,157 @@
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from core.single_flight import get_or_compute
+
+from .caching import get_version
+
+CURSOR_SEPARATOR = ','
+
+
+def encode_cursor(post, keys=('pub_date', 'pk')):
+    pub_date, pk = (getattr(post, key) for key in keys)
+    return f'{pub_date.isoformat()}{CURSOR_SEPARATOR}{pk}'
+
+
+def decode_cursor(value):
+    """Разбирает курсор вида `<pub_date>,<id>`, при ошибке возвращает None."""
+    try:
+        pub_date, pk = value.replace(' ', '+').rsplit(CURSOR_SEPARATOR, 1)
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (AttributeError, TypeError, ValueError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+class CursorPage(Page):
+    """Страница без номера: известны только соседние страницы."""
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        super().__init__(object_list, None, paginator)
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def next_cursor(self):
+        if self._has_next and self.object_list:
+            return encode_cursor(self.object_list[-1], self.paginator.keys)
+
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return encode_cursor(self.object_list[0], self.paginator.keys)
+
+
+class CursorPaginator(Paginator):
+    """Пагинация по ключу `(pub_date, id)` без COUNT(*) и OFFSET.
+
+    `?before=<курсор>` отдаёт записи старше курсора,
+    `?after=<курсор>` - новее курсора.
+    """
+
+    keys = ('pub_date', 'pk')
+
+    def __init__(self, object_list, per_page, keys=None):
+        super().__init__(object_list, per_page)
+        if keys is not None:
+            self.keys = keys
+
+    def _ordered(self, descending=True):
+        prefix = '-' if descending else ''
+        return self.object_list.order_by(*(prefix + key for key in self.keys))
+
+    def _seek(self, cursor, older=True, inclusive=False):
+        (date_key, pk_key), (pub_date, pk) = self.keys, cursor
+        lookup = 'lt' if older else 'gt'
+        pk_lookup = f'{lookup}e' if inclusive else lookup
+        return (
+            Q(**{f'{date_key}__{lookup}': pub_date})
+            | Q(**{date_key: pub_date, f'{pk_key}__{pk_lookup}': pk})
+        )
+
+    def get_page(self, before=None, after=None):
+        before, after = decode_cursor(before), decode_cursor(after)
+        if after is not None:
+            rows = list(
+                self._ordered(descending=False)
+                .filter(self._seek(after, older=False))[:self.per_page + 1]
+            )
+            has_previous = len(rows) > self.per_page
+            has_next = self.object_list.filter(
+                self._seek(after, inclusive=True)).exists()
+            return CursorPage(
+                rows[:self.per_page][::-1], self, has_next, has_previous)
+        queryset = self._ordered()
+        if before is not None:
+            queryset = queryset.filter(self._seek(before))
+        rows = list(queryset[:self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        has_previous = before is not None and self.object_list.filter(
+            self._seek(before, older=False, inclusive=True)).exists()
+        return CursorPage(rows[:self.per_page], self, has_next, has_previous)
+
+
+class CachedCountPaginator(Paginator):
+    """Пагинатор с кэшированным COUNT(*) и сокращённым списком страниц."""
+
+    ELLIPSIS = '…'
+
+    def __init__(self, object_list, per_page, signature=None):
+        super().__init__(object_list, per_page)
+        self.signature = signature
+
+    @cached_property
+    def count(self):
+        if self.signature is None:
+            return Paginator.count.func(self)
+        return get_or_compute(
+            f'paginator_count:{self.signature}:{get_version("posts")}',
+            lambda: Paginator.count.func(self),
+            None,
+        )
+
+    def get_elided_page_range(self, number=1, on_each_side=3, on_ends=1):
+        number = self.validate_number(number)
+        if self.num_pages <= (on_each_side + on_ends) * 2:
+            yield from self.page_range
+            return
+        if number > 1 + on_each_side + on_ends + 1:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < self.num_pages - on_each_side - on_ends - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(self.num_pages - on_ends + 1, self.num_pages + 1)
+        else:
+            yield from range(number + 1, self.num_pages + 1)
+
+
+class CappedCountPaginator(Paginator):
+    """Пагинатор админки для больших таблиц.
+
+    Считает строки не дальше `limit`, поэтому вместо COUNT(*) по всей
+    таблице читает не больше `limit` записей индекса. Страницы после
+    лимита недоступны: до старых записей добираются иерархией дат,
+    фильтрами и поиском.
+    """
+
+    limit = 10000
+
+    @cached_property
+    def count(self):
+        return self.object_list[:self.limit].count()
@@ -0,0 +1,215 @@
+"""Полнотекстовый поиск по постам в таблице FTS5 SQLite.
+
+Таблица `posts_post_fts` хранит заголовок, текст, имя автора и название
+группы каждого поста под его id. Таблицу создаёт миграция, а обновляют
+триггеры на таблицах постов, пользователей и групп, поэтому поиск видит
+и изменения через `QuerySet.update`. На время миграций триггеры
+удаляются и потом создаются заново: SQLite не пересоздаёт таблицу,
+на которую ссылается чужой триггер. Изменения постов внутри миграций
+поэтому в индекс не попадают, после таких миграций нужен
+`rebuild_search_index`. Поиск работает только на SQLite. Результаты
+упорядочены по BM25 (заголовок весит больше текста), страницы
+листаются курсором по рангу и id.
+
+Токенизатор unicode61 не знает морфологии: слова запроса ищутся как
+префиксы, так что "кош" найдёт и "кошка", и "кошек". Для префиксов
+длиной от двух до четырёх букв в таблице есть отдельные индексы:
+без них короткий префикс частого слова сливает списки документов
+сотен слов.
+"""
+import base64
+import json
+import re
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Group, Post
+
+TABLE = 'posts_post_fts'
+MAX_TERMS = 10
+SNIPPET_TOKENS = 24
+# Границы подсветки в сниппете: их нет в тексте постов, поэтому сниппет
+# можно экранировать целиком, а затем заменить их на <mark>.
+MARK_START, MARK_END = '\x02', '\x03'
+WORD = re.compile(r'\w+')
+TRIGGERS = ('insert', 'update', 'delete', 'author', 'group')
+
+User = get_user_model()
+
+
+def author_name(alias):
+    return (f"{alias}.username || ' ' || {alias}.first_name || ' ' || "
+            f"{alias}.last_name")
+
+
+def schema():
+    posts, users, groups = (
+        Post._meta.db_table, User._meta.db_table, Group._meta.db_table)
+    insert = f"""
+        INSERT INTO {TABLE}(rowid, heading, text, author_name, group_title)
+        SELECT new.id, new.heading, new.text,
+            (SELECT {author_name('author')} FROM {users} author
+             WHERE author.id = new.author_id),
+            (SELECT title FROM {groups} WHERE id = new.group_id);
+    """
+    return (
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_insert
+        AFTER INSERT ON {posts} BEGIN {insert} END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_update
+        AFTER UPDATE OF heading, text, author_id, group_id ON {posts} BEGIN
+            DELETE FROM {TABLE} WHERE rowid = old.id;
+            {insert}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_delete
+        AFTER DELETE ON {posts} BEGIN
+            DELETE FROM {TABLE} WHERE rowid = old.id;
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_author
+        AFTER UPDATE OF username, first_name, last_name ON {users} BEGIN
+            UPDATE {TABLE} SET author_name = {author_name('new')}
+            WHERE rowid IN (SELECT id FROM {posts} WHERE author_id = new.id);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {TABLE}_group
+        AFTER UPDATE OF title ON {groups} BEGIN
+            UPDATE {TABLE} SET group_title = new.title
+            WHERE rowid IN (SELECT id FROM {posts} WHERE group_id = new.id);
+        END
+        """,
+    )
+
+
+def install(using=DEFAULT_DB_ALIAS, **kwargs):
+    """Создаёт триггеры, если таблица поиска уже есть. Подключён
+    к сигналу post_migrate."""
+    database = connections[using]
+    if database.vendor != 'sqlite':
+        return
+    with database.cursor() as cursor:
+        if TABLE not in database.introspection.table_names(cursor):
+            return
+        for statement in schema():
+            cursor.execute(statement)
+
+
+def uninstall(using=DEFAULT_DB_ALIAS, **kwargs):
+    """Удаляет триггеры. Подключён к сигналу pre_migrate: триггеры
+    ссылаются на таблицы постов, пользователей и групп, и SQLite
+    не даёт миграциям пересоздать эти таблицы, пока триггеры есть."""
+    database = connections[using]
+    if database.vendor != 'sqlite':
+        return
+    with database.cursor() as cursor:
+        for suffix in TRIGGERS:
+            cursor.execute(f'DROP TRIGGER IF EXISTS {TABLE}_{suffix}')
+
+
+def rebuild(using=DEFAULT_DB_ALIAS):
+    """Заполняет таблицу поиска заново. Возвращает число постов."""
+    database = connections[using]
+    if database.vendor != 'sqlite':
+        return 0
+    install(using)
+    with database.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+        cursor.execute(f"""
+            INSERT INTO {TABLE}(rowid, heading, text, author_name, group_title)
+            SELECT post.id, post.heading, post.text,
+                {author_name('author')}, grp.title
+            FROM {Post._meta.db_table} post
+            JOIN {User._meta.db_table} author ON author.id = post.author_id
+            LEFT JOIN {Group._meta.db_table} grp ON grp.id = post.group_id
+        """)
+        count = cursor.rowcount
+        cursor.execute(f"INSERT INTO {TABLE}({TABLE}) VALUES ('optimize')")
+    return count
+
+
+def match_expression(query):
+    """Запрос FTS5 из слов строки: все слова как префиксы в кавычках,
+    поэтому синтаксис FTS5 в запросе пользователя не работает."""
+    terms = WORD.findall(query.lower())[:MAX_TERMS]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def encode_cursor(rank, post_id):
+    return base64.urlsafe_b64encode(
+        json.dumps([rank, post_id]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        rank, post_id = json.loads(base64.urlsafe_b64decode(cursor))
+        return float(rank), int(post_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+def matching_ids(query):
+    """SQL и параметры подзапроса с id постов, подходящих под запрос,
+    для `filter(pk__in=RawSQL(...))`."""
+    return (f'SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s',
+            (match_expression(query) or '""',))
+
+
+def search(query, after=None, limit=10):
+    """Страница результатов: список пар (пост, сниппет) и курсор
+    следующей страницы или None.
+
+    BM25 считается для каждого найденного поста, поэтому для частых
+    слов ранжируются только SEARCH_MAX_RANKED самых новых совпадений:
+    время запроса не растёт с размером таблицы."""
+    expression = match_expression(query)
+    if not expression:
+        return [], None
+    sql = (
+        f"SELECT rowid, rank, snippet({TABLE}, -1, %s, %s, '…', %s) "
+        f'FROM {TABLE} WHERE {TABLE} MATCH %s '
+        f'AND rowid >= coalesce((SELECT rowid FROM {TABLE} '
+        f'WHERE {TABLE} MATCH %s ORDER BY rowid DESC LIMIT 1 OFFSET %s), 0)'
+    )
+    params = [
+        MARK_START, MARK_END, SNIPPET_TOKENS, expression,
+        expression, settings.SEARCH_MAX_RANKED - 1,
+    ]
+    position = after and decode_cursor(after)
+    if position:
+        sql += ' AND (rank > %s OR (rank = %s AND rowid < %s))'
+        params += [position[0], position[0], position[1]]
+    sql += ' ORDER BY rank, rowid DESC LIMIT %s'
+    params.append(limit + 1)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        [row[0] for row in rows[:limit]])
+    results = [
+        (posts[post_id], highlight(snippet))
+        for post_id, _, snippet in rows[:limit]
+        if post_id in posts
+    ]
+    next_cursor = None
+    if len(rows) > limit:
+        post_id, rank, _ = rows[limit - 1]
+        next_cursor = encode_cursor(rank, post_id)
+    return results, next_cursor
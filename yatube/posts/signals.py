@@ -0,0 +1,180 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from django.contrib.auth import get_user_model
+
+from . import counters, thumbnails, timeline
+from .caching import bump_version
+from .models import Comment, Follow, Group, Post, Profile
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_post_counts(sender, **kwargs):
+    bump_version('posts')
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    instance._loaded_group_id = instance.__dict__.get('group_id')
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_feeds(sender, instance, **kwargs):
+    group_ids = {instance.group_id, instance._loaded_group_id} - {None}
+    bump_version(
+        'index',
+        f'author:{instance.author_id}',
+        *(f'group:{group_id}' for group_id in group_ids),
+    )
+    instance._loaded_group_id = instance.group_id
+
+
+def invalidate_feeds_of(posts):
+    pairs = set(posts.values_list('author_id', 'group_id'))
+    bump_version(
+        'index',
+        *{f'author:{author_id}' for author_id, _ in pairs},
+        *{f'group:{group_id}' for _, group_id in pairs if group_id},
+    )
+
+
+def display_name(user):
+    return tuple(
+        user.__dict__.get(field)
+        for field in ('username', 'first_name', 'last_name')
+    )
+
+
+@receiver(post_init, sender=User)
+def remember_display_name(sender, instance, **kwargs):
+    instance._loaded_display_name = display_name(instance)
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_feeds(sender, instance, created, **kwargs):
+    if created or instance._loaded_display_name == display_name(instance):
+        return
+    instance._loaded_display_name = display_name(instance)
+    invalidate_feeds_of(instance.posts.all())
+    bump_version(*(
+        f'commenters:{post_id}'
+        for post_id in Comment.objects.filter(author=instance).values_list(
+            'post', flat=True).distinct()
+    ))
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group_feeds(sender, instance, created, **kwargs):
+    if not created:
+        bump_version(f'group:{instance.pk}')
+        invalidate_feeds_of(instance.posts.all())
+
+
+def image_name(post):
+    image = post.__dict__.get('image')
+    return getattr(image, 'name', image) or ''
+
+
+@receiver(post_init, sender=Post)
+def remember_image(sender, instance, **kwargs):
+    instance._loaded_image = image_name(instance)
+
+
+@receiver(post_save, sender=Post)
+def image_changed(sender, instance, created, **kwargs):
+    name = image_name(instance)
+    loaded = '' if created else instance._loaded_image
+    if name != loaded:
+        if name:
+            thumbnails.schedule(instance)
+        if loaded:
+            thumbnails.release(loaded)
+    instance._loaded_image = name
+
+
+@receiver(post_delete, sender=Post)
+def release_image(sender, instance, **kwargs):
+    if instance._loaded_image:
+        thumbnails.release(instance._loaded_image)
+
+
+@receiver(post_save, sender=Post)
+def publish_post(sender, instance, created, **kwargs):
+    if created:
+        timeline.publish(instance)
+
+
+@receiver(post_delete, sender=Post)
+def forget_recent_post(sender, instance, **kwargs):
+    cache.delete(timeline.recent_key(instance.author_id))
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    timeline.prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=User)
+def create_profile(sender, instance, created, **kwargs):
+    if created:
+        Profile.objects.get_or_create(user=instance)
+
+
+def counter_delta(signal, created):
+    if signal is post_delete:
+        return -1
+    return 1 if created else 0
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def count_posts(sender, instance, signal, created=False, **kwargs):
+    delta = counter_delta(signal, created)
+    if delta:
+        counters.change(
+            Profile.objects.filter(user=instance.author_id),
+            'posts_count',
+            delta,
+        )
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def count_follows(sender, instance, signal, created=False, **kwargs):
+    delta = counter_delta(signal, created)
+    if delta:
+        counters.change(
+            Profile.objects.filter(user=instance.author_id),
+            'followers_count',
+            delta,
+        )
+        counters.change(
+            Profile.objects.filter(user=instance.user_id),
+            'following_count',
+            delta,
+        )
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def count_comments(sender, instance, signal, created=False, **kwargs):
+    delta = counter_delta(signal, created)
+    if delta:
+        counters.change(
+            Post.objects.filter(pk=instance.post_id),
+            'comments_count',
+            delta,
+        )
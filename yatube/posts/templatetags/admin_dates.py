@@ -0,0 +1,144 @@
+"""Иерархия дат для админки больших таблиц.
+
+Стандартный тег `date_hierarchy` считает MIN и MAX одним запросом
+и DISTINCT по датам, усечённым функцией SQLite, то есть проходит всю
+выборку. Здесь каждый период находится поиском по индексу поля:
+первая запись не раньше начала периода. Запросов столько, сколько
+непустых периодов на уровне, но каждый читает одну запись.
+"""
+import datetime
+
+from django import template
+from django.conf import settings
+from django.contrib.admin.templatetags.base import InclusionAdminNode
+from django.utils import formats, timezone
+from django.utils.text import capfirst
+from django.utils.translation import gettext as _
+
+register = template.Library()
+
+
+def seek(queryset, field_name, start=None, descending=False):
+    ordered = queryset.order_by(('-' if descending else '') + field_name)
+    if start is not None:
+        ordered = ordered.filter(**{f'{field_name}__gte': start})
+    return ordered.values_list(field_name, flat=True).first()
+
+
+def local_date(value):
+    if not isinstance(value, datetime.datetime):
+        return value
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return value.date()
+
+
+def next_period(day, kind):
+    if kind == 'year':
+        return datetime.date(day.year + 1, 1, 1)
+    if kind == 'month':
+        return (day.replace(day=28) + datetime.timedelta(days=4)).replace(
+            day=1)
+    return day + datetime.timedelta(days=1)
+
+
+def boundary(day, sample):
+    """Начало дня `day` в типе значений поля."""
+    if not isinstance(sample, datetime.datetime):
+        return day
+    start = datetime.datetime.combine(day, datetime.time.min)
+    return timezone.make_aware(start) if settings.USE_TZ else start
+
+
+def periods(queryset, field_name, kind):
+    """Начала непустых периодов: 'year', 'month' или 'day'."""
+    found = []
+    start = None
+    while True:
+        value = seek(queryset, field_name, start)
+        if value is None:
+            return found
+        day = local_date(value)
+        if kind == 'year':
+            day = day.replace(month=1, day=1)
+        elif kind == 'month':
+            day = day.replace(day=1)
+        found.append(day)
+        start = boundary(next_period(day, kind), value)
+
+
+def date_hierarchy(cl):
+    """Контекст для шаблона `date_hierarchy.html` как у стандартного
+    тега Django."""
+    field_name = cl.date_hierarchy
+    year_field = f'{field_name}__year'
+    month_field = f'{field_name}__month'
+    day_field = f'{field_name}__day'
+    year = cl.params.get(year_field)
+    month = cl.params.get(month_field)
+    day = cl.params.get(day_field)
+
+    def link(filters):
+        return cl.get_query_string(filters, [f'{field_name}__'])
+
+    if not (year or month or day):
+        first = seek(cl.queryset, field_name)
+        last = seek(cl.queryset, field_name, descending=True)
+        if first and last:
+            first, last = local_date(first), local_date(last)
+            if first.year == last.year:
+                year = first.year
+                if first.month == last.month:
+                    month = first.month
+    if year and month and day:
+        current = datetime.date(int(year), int(month), int(day))
+        return {
+            'show': True,
+            'back': {
+                'link': link({year_field: year, month_field: month}),
+                'title': capfirst(
+                    formats.date_format(current, 'YEAR_MONTH_FORMAT')),
+            },
+            'choices': [{'title': capfirst(
+                formats.date_format(current, 'MONTH_DAY_FORMAT'))}],
+        }
+    if year and month:
+        return {
+            'show': True,
+            'back': {'link': link({year_field: year}), 'title': str(year)},
+            'choices': [{
+                'link': link({
+                    year_field: year, month_field: month, day_field: day.day,
+                }),
+                'title': capfirst(
+                    formats.date_format(day, 'MONTH_DAY_FORMAT')),
+            } for day in periods(cl.queryset, field_name, 'day')],
+        }
+    if year:
+        return {
+            'show': True,
+            'back': {'link': link({}), 'title': _('All dates')},
+            'choices': [{
+                'link': link({year_field: year, month_field: month.month}),
+                'title': capfirst(
+                    formats.date_format(month, 'YEAR_MONTH_FORMAT')),
+            } for month in periods(cl.queryset, field_name, 'month')],
+        }
+    return {
+        'show': True,
+        'back': None,
+        'choices': [{
+            'link': link({year_field: str(year.year)}),
+            'title': str(year.year),
+        } for year in periods(cl.queryset, field_name, 'year')],
+    }
+
+
+@register.tag(name='indexed_date_hierarchy')
+def indexed_date_hierarchy_tag(parser, token):
+    return InclusionAdminNode(
+        parser, token,
+        func=date_hierarchy,
+        template_name='date_hierarchy.html',
+        takes_context=False,
+    )
@@ -0,0 +1,30 @@
+from django import template
+from django.utils.http import urlencode
+
+from yatube.settings import MAX_PAGE_NUMBER
+
+from posts.paginators import CursorPage, encode_cursor
+
+register = template.Library()
+
+
+@register.filter
+def next_page_query(page):
+    if isinstance(page, CursorPage):
+        return urlencode({'before': page.next_cursor()})
+    number = page.next_page_number()
+    if number > MAX_PAGE_NUMBER:
+        return urlencode({'before': encode_cursor(page[len(page) - 1])})
+    return urlencode({'page': number})
+
+
+@register.filter
+def previous_page_query(page):
+    if isinstance(page, CursorPage):
+        return urlencode({'after': page.previous_cursor()})
+    return urlencode({'page': page.previous_page_number()})
+
+
+@register.simple_tag
+def elided_page_range(page):
+    return list(page.paginator.get_elided_page_range(page.number))
@@ -0,0 +1,73 @@
+import hashlib
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from posts.thumbnails import picture, preload, ready_thumbnail
+
+register = template.Library()
+
+CARD_TEMPLATE = 'posts/includes/post_card.html'
+
+
+def card_key(post):
+    """Ключ карточки: id поста и хэш всего, что выводится в карточке.
+
+    Изменение поста, имени автора или группы даёт новый ключ,
+    поэтому явная инвалидация не нужна. Готовая миниатюра сохраняет
+    пост, и `updated` тоже попадает в хэш.
+    """
+    author, group = post.author, post.group
+    content = '\x00'.join(str(part) for part in (
+        post.heading, post.text, post.pub_date.isoformat(),
+        post.updated.isoformat(), post.image.name, post.image_variants,
+        author.username, author.first_name, author.last_name,
+        group.slug if group else '', group.title if group else '',
+    ))
+    digest = hashlib.md5(content.encode()).hexdigest()
+    return f'post_card:{post.pk}:{digest}'
+
+
+@register.simple_tag
+def post_picture(post, size):
+    """Варианты картинки для `<picture>` или None."""
+    return picture(post, size)
+
+
+@register.simple_tag
+def post_thumbnail(image, size):
+    """Готовая миниатюра или None: запрос не ждёт её создания."""
+    return ready_thumbnail(image, size)
+
+
+@register.simple_tag
+def post_cards(posts):
+    """Отрисованные карточки постов страницы.
+
+    Готовые карточки берутся из кэша одним `get_many`,
+    отрисовываются только недостающие. Варианты картинки берутся из
+    поста, а миниатюры постов без вариантов читаются из хранилища sorl
+    одним обращением.
+    """
+    keys = [card_key(post) for post in posts]
+    cards = cache.get_many(keys)
+    posts = {key: post for key, post in zip(keys, posts) if key not in cards}
+    pictures = {key: picture(post, 'card') for key, post in posts.items()}
+    thumbnails = preload((
+        post.image for key, post in posts.items() if not pictures[key]
+    ), 'card')
+    missing = {
+        key: render_to_string(CARD_TEMPLATE, {
+            'post': post,
+            'picture': pictures[key],
+            'thumbnail': thumbnails.get(post.image.name),
+        })
+        for key, post in posts.items()
+    }
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_CACHE_TIMEOUT)
+        cards.update(missing)
+    return [mark_safe(cards[key]) for key in keys]
@@ -0,0 +1,125 @@
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, User
+from .variables import TEST_GROUP_SLUG, TEST_GROUP_TITLE
+
+ROWS = 100_000
+READERS = 320
+# Иерархия дат добавляет два запроса на границы выборки и по одному
+# на каждый год с записями (в данных их два) и на конец поиска.
+QUERY_BUDGET = {
+    'admin:posts_post_changelist': 9,
+    'admin:posts_comment_changelist': 9,
+    'admin:posts_follow_changelist': 4,
+}
+
+
+class AdminChangelistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@yatube.ru', 'password')
+        cls.group = Group.objects.create(
+            title=TEST_GROUP_TITLE, slug=TEST_GROUP_SLUG, description='')
+        User.objects.bulk_create(
+            User(username=f'reader{number}') for number in range(READERS))
+        posts, comments, follows, users = (
+            model._meta.db_table for model in (Post, Comment, Follow, User))
+        with connection.cursor() as cursor:
+            cursor.execute(f"""
+                WITH RECURSIVE seq(n) AS (
+                    SELECT 1 UNION ALL SELECT n + 1 FROM seq WHERE n < %s
+                )
+                INSERT INTO {posts}(heading, text, pub_date, updated,
+                    author_id, group_id, image, image_variants,
+                    comments_count)
+                SELECT 'Пост', 'Текст поста ' || n,
+                    datetime('2020-01-01', '+' || (n * 10) || ' minutes'),
+                    datetime('now'), %s, %s, '', '', 1
+                FROM seq
+            """, [ROWS, cls.admin.pk, cls.group.pk])
+            cursor.execute(f"""
+                INSERT INTO {comments}(post_id, author_id, text, created)
+                SELECT id, author_id, 'Комментарий', pub_date FROM {posts}
+            """)
+            cursor.execute(f"""
+                INSERT INTO {follows}(user_id, author_id)
+                SELECT reader.id, author.id
+                FROM {users} reader JOIN {users} author
+                    ON reader.id != author.id
+                LIMIT %s
+            """, [ROWS])
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def test_changelists_fit_query_budget(self):
+        """Списки админки укладываются в бюджет запросов на 100 тысячах
+        строк и не считают все строки таблицы"""
+        self.assertEqual(Follow.objects.count(), ROWS)
+        for name, budget in QUERY_BUDGET.items():
+            for params in ({}, {'p': 5}, {'q': 'reader1'}):
+                with self.subTest(name=name, params=params):
+                    with CaptureQueriesContext(connection) as queries:
+                        response = self.client.get(reverse(name), params)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertLessEqual(len(queries), budget)
+                    self.assert_bounded(queries, limited='q' not in params)
+
+    def assert_bounded(self, queries, limited=True):
+        """Запросы к таблицам постов не считают DISTINCT, MIN и MAX
+        по всей выборке, а без поиска и читают ограниченное число строк.
+        Найденное поиском, если оно умещается на страницу, админка
+        выбирает без LIMIT."""
+        for query in queries:
+            sql = query['sql']
+            if 'posts_' not in sql:
+                continue
+            with self.subTest(sql=sql):
+                if limited:
+                    self.assertIn('LIMIT', sql)
+                for scan in ('DISTINCT', 'MIN(', 'MAX('):
+                    self.assertNotIn(scan, sql)
+
+    def test_date_hierarchy_narrows_changelist(self):
+        """Иерархия дат заменяет фильтры по тексту и находит периоды
+        поиском по индексу"""
+        url = reverse('admin:posts_comment_changelist')
+        levels = (
+            ({}, ('created__year=2020', 'created__year=2021')),
+            ({'created__year': 2021},
+             ('created__month=1', 'created__month=11')),
+            ({'created__year': 2020, 'created__month': 2},
+             ('created__day=1', 'created__day=29')),
+        )
+        for params, links in levels:
+            with self.subTest(params=params):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url, params)
+                for link in links:
+                    self.assertContains(response, link)
+                self.assertNotContains(response, 'created__year=2022')
+                self.assert_bounded(queries)
+        response = self.client.get(
+            url,
+            {'created__year': 2020, 'created__month': 1, 'created__day': 2},
+        )
+        self.assertEqual(response.context['cl'].result_count, 144)
+
+    def test_autocomplete_instead_of_selects(self):
+        """Связанные объекты выбираются автодополнением"""
+        response = self.client.get(reverse('admin:posts_comment_add'))
+        form = response.context['adminform'].form
+        for field in ('post', 'author'):
+            self.assertIsInstance(
+                form.fields[field].widget.widget, AutocompleteSelect)
+        response = self.client.get(
+            reverse('admin:auth_user_autocomplete'), {'term': 'reader31'})
+        self.assertEqual(
+            [item['text'] for item in response.json()['results']],
+            ['reader31'] + [f'reader31{digit}' for digit in range(10)])
@@ -0,0 +1,72 @@
+from io import BytesIO
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from posts.forms import PostForm
+from .variables import TEST_HEADING, TEST_POST_TEXT
+
+ORIENTATION = 0x0112
+ROTATED_RIGHT = 6
+
+
+def upload(size, image_format='JPEG', name='photo.jpg', **options):
+    content = BytesIO()
+    Image.new('RGB', size, (200, 30, 30)).save(
+        content, image_format, **options)
+    return SimpleUploadedFile(name, content.getvalue())
+
+
+@override_settings(POST_IMAGE_MAX_SIDE=100)
+class ImageIngestTests(TestCase):
+    def clean(self, image):
+        form = PostForm(
+            data={'heading': TEST_HEADING, 'text': TEST_POST_TEXT},
+            files={'image': image},
+        )
+        form.is_valid()
+        return form
+
+    def test_image_downsampled_rotated_and_stripped(self):
+        """Картинка уменьшается, поворачивается по EXIF и теряет EXIF"""
+        exif = Image.Exif()
+        exif[ORIENTATION] = ROTATED_RIGHT
+        form = self.clean(upload((400, 200), exif=exif.tobytes()))
+        self.assertNotIn('image', form.errors)
+        with Image.open(form.cleaned_data['image']) as image:
+            self.assertEqual(image.size, (50, 100))
+            self.assertEqual(image.format, 'JPEG')
+            self.assertFalse(image.getexif())
+
+    def test_small_image_kept_format(self):
+        """Маленькая картинка не увеличивается и сохраняет формат"""
+        form = self.clean(upload((40, 20), 'PNG', 'small.png'))
+        image_file = form.cleaned_data['image']
+        self.assertEqual(image_file.name, 'small.png')
+        with Image.open(image_file) as image:
+            self.assertEqual((image.size, image.format), ((40, 20), 'PNG'))
+
+    def test_limits_rejected_before_decoding(self):
+        """Слишком большие файлы и картинки отклоняются"""
+        cases = (
+            ({'POST_IMAGE_MAX_BYTES': 10}, upload((40, 20))),
+            ({'POST_IMAGE_MAX_PIXELS': 500}, upload((40, 20))),
+            ({'POST_IMAGE_MEMORY_LIMIT': 1000},
+             upload((40, 20), 'PNG', 'big.png')),
+        )
+        for limits, image in cases:
+            with self.subTest(limits=limits), override_settings(**limits):
+                form = self.clean(image)
+                self.assertIn('image', form.errors)
+
+    @override_settings(POST_IMAGE_MEMORY_LIMIT=150 * 100 * 4 * 2)
+    def test_jpeg_decoded_in_draft_mode(self):
+        """JPEG декодируется в уменьшенном масштабе и укладывается
+        в ограничение памяти, которое PNG того же размера превышает"""
+        self.assertIn(
+            'image', self.clean(upload((800, 400), 'PNG', 'big.png')).errors)
+        form = self.clean(upload((800, 400)))
+        self.assertNotIn('image', form.errors)
+        with Image.open(form.cleaned_data['image']) as image:
+            self.assertEqual(image.size, (100, 50))
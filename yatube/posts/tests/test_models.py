@@ -1,9 +1,14 @@
-from django.test import TestCase
+from io import StringIO
 
-from posts.models import Group, Post, User
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post, Profile, User
 from .variables import (TEST_POST_TEXT, TEST_AUTHOR_USERNAME,
                         TEST_GROUP_TITLE, TEST_GROUP_SLUG,
-                        TEST_GROUP_DESCRIPTION)
+                        TEST_GROUP_DESCRIPTION, TEST_AUTH_USER,
+                        TEST_COMMENT)
 
 
 class PostModelTest(TestCase):
@@ -42,3 +47,76 @@ class GroupModelTest(TestCase):
         """Проверяем, что у моделей группы корректно работает __str__."""
         group = GroupModelTest.group
         self.assertEqual(group.title, str(group))
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=TEST_AUTHOR_USERNAME)
+        cls.reader = User.objects.create_user(username=TEST_AUTH_USER)
+
+    def counters(self, user):
+        profile = Profile.objects.get(user=user)
+        return (profile.posts_count, profile.followers_count,
+                profile.following_count)
+
+    def test_counters_follow_changes(self):
+        """Счётчики меняются при создании и удалении объектов"""
+        post = Post.objects.create(author=self.author, text=TEST_POST_TEXT)
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text=TEST_COMMENT)
+        self.assertEqual(self.counters(self.author), (1, 1, 0))
+        self.assertEqual(self.counters(self.reader), (0, 0, 1))
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 0)
+        post.delete()
+        self.assertEqual(self.counters(self.author), (0, 0, 0))
+        self.assertEqual(self.counters(self.reader), (0, 0, 0))
+
+    def test_recount_repairs_drift(self):
+        """Команда recount исправляет разошедшиеся счётчики"""
+        post = Post.objects.create(author=self.author, text=TEST_POST_TEXT)
+        Follow.objects.create(user=self.reader, author=self.author)
+        Comment.objects.create(
+            post=post, author=self.reader, text=TEST_COMMENT)
+        Profile.objects.update(
+            posts_count=5, followers_count=5, following_count=5)
+        Post.objects.update(comments_count=5)
+        Profile.objects.filter(user=self.reader).delete()
+        call_command('recount', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.counters(self.author), (1, 1, 0))
+        self.assertEqual(self.counters(self.reader), (0, 0, 1))
+
+    def test_users_without_profile(self):
+        """Страницы работают у пользователей, созданных без сигнала,
+        а профиль создаётся с посчитанными счётчиками"""
+        User.objects.bulk_create([User(username='imported')])
+        imported = User.objects.get(username='imported')
+        post = Post.objects.create(author=imported, text=TEST_POST_TEXT)
+        Profile.objects.filter(user=imported).delete()
+        Follow.objects.create(user=self.reader, author=imported)
+        reader = Client()
+        reader.force_login(self.reader)
+        reader.post(
+            reverse('posts:add_comment', args=(post.pk,)),
+            {'text': TEST_COMMENT})
+        self.assertTrue(imported.notifications.exists())
+        Profile.objects.filter(user=imported).delete()
+        client = Client()
+        client.force_login(imported)
+        for url in (
+            reverse('posts:profile', args=(imported.username,)),
+            reverse('posts:post_detail', args=(post.pk,)),
+            reverse('posts:notifications'),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(client.get(url).status_code, 200)
+        self.assertEqual(self.counters(imported), (1, 1, 0))
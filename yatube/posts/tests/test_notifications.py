@@ -0,0 +1,133 @@
+from django.core import mail
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.models import Job
+from posts import notifications
+from posts.models import Notification, Post, Profile, User
+from .variables import TEST_COMMENT, TEST_HEADING, TEST_POST_TEXT
+
+
+class NotificationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [
+            User.objects.create_user(
+                username=f'author{number}', email=f'author{number}@yatube.ru')
+            for number in range(2)
+        ]
+        cls.posts = [
+            Post.objects.create(
+                heading=f'{TEST_HEADING} {number}',
+                text=TEST_POST_TEXT,
+                author=author,
+            )
+            for number, author in enumerate(cls.authors)
+        ]
+        cls.commenter = User.objects.create_user(username='commenter')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.commenter)
+
+    def comment(self, post, text=TEST_COMMENT, client=None):
+        (client or self.client).post(
+            reverse('posts:add_comment', kwargs={'post_id': post.pk}),
+            data={'text': text},
+        )
+
+    def test_instant_delivery(self):
+        """С мгновенной доставкой письмо уходит на каждый комментарий"""
+        Profile.objects.filter(user=self.authors[0]).update(
+            comment_emails=Profile.INSTANT)
+        self.comment(self.posts[0])
+        self.comment(self.posts[0])
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].to, [self.authors[0].email])
+        self.assertFalse(
+            Notification.objects.filter(emailed=None).exists())
+        self.assertFalse(
+            Job.objects.filter(task__endswith='send_digests').exists())
+
+    def test_digest_groups_comments_per_recipient(self):
+        """Сводка приходит одним письмом на получателя, своё
+        комментирование и прочитанные уведомления в неё не попадают"""
+        for number in range(3):
+            self.comment(self.posts[0], f'{TEST_COMMENT} {number}')
+        self.comment(self.posts[1])
+        author_client = Client()
+        author_client.force_login(self.authors[0])
+        self.comment(self.posts[0], 'Ответ автора', author_client)
+        read = Notification.objects.filter(recipient=self.authors[1])
+        self.comment(self.posts[1], 'Прочитано')
+        read.filter(comment__text='Прочитано').update(read=True)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(
+            Job.objects.filter(task='posts.notifications.send_digests')
+            .count(), 1)
+        with self.assertNumQueries(4):
+            self.assertEqual(notifications.send_digests(), 2)
+        messages = {message.to[0]: message for message in mail.outbox}
+        first = messages[self.authors[0].email]
+        self.assertEqual(first.subject, 'Новые комментарии: 3')
+        self.assertIn(
+            f'commenter: {TEST_COMMENT} 0\ncommenter: {TEST_COMMENT} 1',
+            first.body)
+        self.assertNotIn('Ответ автора', first.body)
+        self.assertNotIn('Прочитано', messages[self.authors[1].email].body)
+        self.assertEqual(notifications.send_digests(), 0)
+
+    def test_digest_separates_posts_with_same_heading(self):
+        """Комментарии к разным постам с одинаковым заголовком идут
+        в сводке разными группами"""
+        twin = Post.objects.create(
+            heading=self.posts[0].heading,
+            text=TEST_POST_TEXT,
+            author=self.authors[0],
+        )
+        self.comment(self.posts[0], f'{TEST_COMMENT} 0')
+        self.comment(twin, f'{TEST_COMMENT} 1')
+        notifications.send_digests()
+        self.assertEqual(
+            mail.outbox[0].body.count(f'"{self.posts[0].heading}"'), 2)
+
+    def test_pending_sent_after_switch_to_instant(self):
+        """Уведомления, накопленные для сводки, уходят и после перехода
+        на мгновенную доставку"""
+        self.comment(self.posts[0])
+        author_client = Client()
+        author_client.force_login(self.authors[0])
+        author_client.post(
+            reverse('posts:notifications'),
+            data={'comment_emails': Profile.INSTANT},
+        )
+        self.assertEqual(notifications.send_digests(), 1)
+        self.assertEqual(mail.outbox[0].to, [self.authors[0].email])
+        self.assertIn(TEST_COMMENT, mail.outbox[0].body)
+
+    def test_digest_queries_do_not_depend_on_volume(self):
+        """Число запросов сводки не растёт с числом уведомлений"""
+        for post in self.posts * 5:
+            self.comment(post)
+        with self.assertNumQueries(4):
+            notifications.send_digests()
+
+    def test_inbox_marks_read_and_saves_preference(self):
+        """Лента уведомлений отмечает их прочитанными и меняет способ
+        доставки писем"""
+        self.comment(self.posts[0])
+        author_client = Client()
+        author_client.force_login(self.authors[0])
+        response = author_client.get(reverse('posts:notifications'))
+        self.assertContains(response, TEST_COMMENT)
+        self.assertContains(response, 'Новое')
+        self.assertTrue(Notification.objects.get().read)
+        self.assertNotContains(
+            author_client.get(reverse('posts:notifications')), 'Новое')
+        author_client.post(
+            reverse('posts:notifications'),
+            data={'comment_emails': Profile.INSTANT},
+        )
+        self.assertEqual(
+            Profile.objects.get(user=self.authors[0]).comment_emails,
+            Profile.INSTANT)
@@ -0,0 +1,79 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post, Group, User, Comment, Follow
+from .variables import (TEST_GROUP_TITLE, TEST_GROUP_SLUG,
+                        TEST_GROUP_DESCRIPTION, TEST_POST_TEXT,
+                        TEST_AUTHOR_USERNAME, TEST_AUTH_USER,
+                        TEST_COMMENT, NUMBER_OF_TEST_POSTS)
+
+QUERY_BUDGET = {
+    'posts:index': 4,
+    'posts:group_list': 5,
+    'posts:profile': 6,
+    'posts:follow_index': 5,
+    'posts:post_detail': 5,
+}
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username=TEST_AUTHOR_USERNAME, first_name='Имя')
+        cls.reader = User.objects.create_user(username=TEST_AUTH_USER)
+        cls.group = Group.objects.create(
+            title=TEST_GROUP_TITLE,
+            slug=TEST_GROUP_SLUG,
+            description=TEST_GROUP_DESCRIPTION,
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(
+            text=TEST_POST_TEXT, author=cls.author, group=cls.group)
+        cls.urls = {
+            'posts:index': reverse('posts:index'),
+            'posts:group_list': reverse(
+                'posts:group_list', kwargs={'slug': cls.group.slug}),
+            'posts:profile': reverse(
+                'posts:profile', kwargs={'username': cls.author.username}),
+            'posts:follow_index': reverse('posts:follow_index'),
+        }
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return len(queries)
+
+    def test_feed_queries_do_not_depend_on_page_size(self):
+        """Число запросов ленты не зависит от количества постов"""
+        single = {name: self.count_queries(url)
+                  for name, url in self.urls.items()}
+        for _ in range(NUMBER_OF_TEST_POSTS):
+            Post.objects.create(
+                text=TEST_POST_TEXT, author=self.author, group=self.group)
+        for name, url in self.urls.items():
+            with self.subTest(view=name):
+                queries = self.count_queries(url)
+                self.assertEqual(queries, single[name])
+                self.assertLessEqual(queries, QUERY_BUDGET[name])
+
+    def test_post_detail_queries_do_not_depend_on_comments(self):
+        """Число запросов страницы поста не зависит от комментариев"""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        single = self.count_queries(url)
+        for number in range(NUMBER_OF_TEST_POSTS):
+            commenter = User.objects.create_user(username=f'commenter{number}')
+            Comment.objects.create(
+                post=self.post, author=commenter, text=TEST_COMMENT)
+        queries = self.count_queries(url)
+        self.assertEqual(queries, single)
+        self.assertLessEqual(queries, QUERY_BUDGET['posts:post_detail'])
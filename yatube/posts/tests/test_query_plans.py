@@ -0,0 +1,74 @@
+import re
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post, Group, User, Comment, Follow
+from .variables import (TEST_GROUP_TITLE, TEST_GROUP_SLUG,
+                        TEST_GROUP_DESCRIPTION, TEST_POST_TEXT,
+                        TEST_AUTHOR_USERNAME, TEST_AUTH_USER,
+                        TEST_COMMENT)
+
+FEED_TABLES = re.compile(r'"posts_(post|timeline|comment|follow)"')
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?posts_\w+$')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=TEST_AUTHOR_USERNAME)
+        cls.reader = User.objects.create_user(username=TEST_AUTH_USER)
+        cls.group = Group.objects.create(
+            title=TEST_GROUP_TITLE,
+            slug=TEST_GROUP_SLUG,
+            description=TEST_GROUP_DESCRIPTION,
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.post = Post.objects.create(
+            text=TEST_POST_TEXT, author=cls.author, group=cls.group)
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text=TEST_COMMENT)
+        cls.urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': cls.group.slug}),
+            reverse('posts:profile', kwargs={'username': cls.author}),
+            reverse('posts:follow_index'),
+            reverse('posts:post_detail', kwargs={'post_id': cls.post.pk}),
+        )
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def feed_queries(self, url, params=None):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url, params)
+        return [query['sql'] for query in queries
+                if query['sql'].startswith('SELECT')
+                and FEED_TABLES.search(query['sql'])]
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент идут по индексам без сортировки во временном дереве"""
+        for url in self.urls:
+            for params in (None, {'before': ''}):
+                for sql in self.feed_queries(url, params):
+                    with self.subTest(url=url, params=params, sql=sql):
+                        plan = self.explain(sql)
+                        self.assertFalse(
+                            [step for step in plan if 'TEMP B-TREE' in step],
+                            plan)
+                        self.assertFalse(
+                            [step for step in plan if FULL_SCAN.match(step)],
+                            plan)
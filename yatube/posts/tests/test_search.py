@@ -0,0 +1,122 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.sql import (
+    emit_post_migrate_signal, emit_pre_migrate_signal)
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.test import (
+    Client, TestCase, TransactionTestCase, override_settings)
+from django.urls import reverse
+
+from posts import search
+from posts.models import Group, Post, User
+from yatube.settings import NUM_OF_POSTS
+from .variables import TEST_GROUP_SLUG, TEST_GROUP_TITLE
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='writer', first_name='Лев', last_name='Толстой')
+        cls.group = Group.objects.create(
+            title=TEST_GROUP_TITLE, slug=TEST_GROUP_SLUG, description='')
+        cls.about_cats = Post.objects.create(
+            heading='Кошки', text='Рассказ о домашних животных',
+            author=cls.author)
+        cls.mentions_cats = Post.objects.create(
+            heading='Собаки', text='Собаки не любят <b>кошек</b>',
+            author=cls.author, group=cls.group)
+
+    def found(self, query):
+        results, _ = search.search(query)
+        return [post for post, _ in results]
+
+    def test_ranked_prefix_search(self):
+        """Ищется по началу слов, совпадение в заголовке выше"""
+        self.assertEqual(
+            self.found('кош'), [self.about_cats, self.mentions_cats])
+        self.assertEqual(self.found('толстой'), self.found('ЛЕВ'))
+        self.assertEqual(
+            self.found(TEST_GROUP_TITLE), [self.mentions_cats])
+        self.assertEqual(self.found('кошки OR "* NEAR('), [])
+        self.assertEqual(self.found('!!!'), [])
+
+    def test_index_follows_changes(self):
+        """Индекс следует за изменениями постов, авторов и групп,
+        в том числе через QuerySet.update"""
+        Post.objects.filter(pk=self.about_cats.pk).update(text='Про ежей')
+        self.assertEqual(self.found('ежей'), [self.about_cats])
+        self.assertEqual(self.found('домашних'), [])
+        User.objects.filter(pk=self.author.pk).update(last_name='Чехов')
+        self.assertEqual(len(self.found('чехов')), 2)
+        Group.objects.filter(pk=self.group.pk).update(title='Зоопарк')
+        self.assertEqual(self.found('зоопарк'), [self.mentions_cats])
+        Post.objects.filter(pk=self.mentions_cats.pk).delete()
+        self.assertEqual(self.found('собаки'), [])
+
+    def test_snippet_escaped_and_highlighted(self):
+        """Сниппет экранирован, совпадения выделены"""
+        response = Client().get(reverse('posts:search'), {'q': 'любят'})
+        self.assertContains(
+            response, 'Собаки не <mark>любят</mark> &lt;b&gt;кошек')
+
+    def test_keyset_pagination(self):
+        """Страницы листаются курсором без пропусков и повторов"""
+        Post.objects.bulk_create(
+            Post(heading='Выпуск', text=f'Новости {number}',
+                 author=self.author)
+            for number in range(NUM_OF_POSTS + 3)
+        )
+        client = Client()
+        response = client.get(reverse('posts:search'), {'q': 'выпуск'})
+        first = [post for post, _ in response.context['results']]
+        self.assertEqual(len(first), NUM_OF_POSTS)
+        response = client.get(
+            f'{reverse("posts:search")}?{response.context["next_query"]}')
+        second = [post for post, _ in response.context['results']]
+        self.assertEqual(len(second), 3)
+        self.assertIsNone(response.context['next_query'])
+        self.assertFalse(set(first) & set(second))
+
+    @override_settings(SEARCH_MAX_RANKED=2)
+    def test_ranks_only_newest_matches(self):
+        """Для частых слов ранжируются только самые новые совпадения"""
+        newest = Post.objects.create(
+            heading='Про кошек', text='', author=self.author)
+        self.assertEqual(
+            self.found('кош'), [newest, self.mentions_cats])
+
+    def test_rebuild_and_admin_search(self):
+        """Команда заполняет индекс заново, админка ищет по нему"""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.TABLE}')
+        self.assertEqual(self.found('кошки'), [])
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('Проиндексировано постов: 2', out.getvalue())
+        admin = User.objects.create_superuser(
+            'admin', 'admin@yatube.ru', 'password')
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'домашних'})
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.about_cats])
+
+
+class SearchMigrationTests(TransactionTestCase):
+    def test_migrations_can_rebuild_tables(self):
+        """Миграции пересоздают таблицы постов и групп, после них
+        триггеры поиска снова работают"""
+        emit_pre_migrate_signal(0, False, DEFAULT_DB_ALIAS)
+        with connection.schema_editor() as editor:
+            for model, name in ((Post, 'heading'), (Group, 'title')):
+                field = model._meta.get_field(name)
+                editor.alter_field(model, field, field)
+        emit_post_migrate_signal(0, False, DEFAULT_DB_ALIAS)
+        post = Post.objects.create(
+            heading='Миграции', text='', author=User.objects.create(
+                username='migrator'))
+        self.assertEqual(
+            [found for found, _ in search.search('миграции')[0]], [post])
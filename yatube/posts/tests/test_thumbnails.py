@@ -0,0 +1,357 @@
+import json
+import os
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
+
+from PIL import Image
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.images import ImageFile
+
+from core.models import Job
+from posts import thumbnails
+from posts.models import Post, User
+from yatube.settings import NUM_OF_POSTS
+from .variables import TEST_AUTHOR_USERNAME, TEST_IMAGE, TEST_POST_TEXT
+
+
+def gif(number):
+    """Картинка 2x1 своего цвета для каждого номера: одинаковые
+    загрузки хранятся одним файлом."""
+    content = BytesIO()
+    Image.new('RGB', (2, 1), (number % 256, number // 256, 0)).save(
+        content, 'GIF')
+    return content.getvalue()
+
+
+class TemporaryMediaTestCase(TestCase):
+    """Каждый тест работает со своим MEDIA_ROOT: имена файлов зависят
+    только от содержимого и совпали бы между тестами и запусками."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=directory)
+        media.enable()
+        self.addCleanup(media.disable)
+
+
+class ThumbnailTests(TemporaryMediaTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=TEST_AUTHOR_USERNAME)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.client = Client()
+
+    def create_post(self, name, content=None):
+        if content is None:
+            content = gif(Post.objects.count())
+        return Post.objects.create(
+            text=TEST_POST_TEXT,
+            author=self.author,
+            image=SimpleUploadedFile(
+                name=name, content=content, content_type='image/gif'),
+        )
+
+    def register_without_pillow(self, post):
+        source = ImageFile(post.image)
+        source.set_size([2, 1])
+        thumbnail, _ = thumbnails.resolve(
+            source, *settings.POST_THUMBNAILS['card'])
+        thumbnail.set_size([960, 339])
+        thumbnails.register(
+            post.pk, source.serialize(), [thumbnail.serialize()])
+        return thumbnail
+
+    @mock.patch('posts.thumbnails.release')
+    @mock.patch('posts.thumbnails.schedule')
+    def test_thumbnails_scheduled_for_new_image(self, schedule, release):
+        """Миниатюры ставятся в очередь только при смене картинки,
+        старая картинка освобождается при смене и удалении поста"""
+        post = self.create_post('scheduled.gif')
+        first_image = post.image.name
+        self.assertEqual(schedule.call_count, 1)
+        post.text = TEST_POST_TEXT + '1'
+        post.save()
+        Post.objects.get(pk=post.pk).save()
+        Post.objects.create(text=TEST_POST_TEXT, author=self.author)
+        self.assertEqual(schedule.call_count, 1)
+        release.assert_not_called()
+        post.image = SimpleUploadedFile(
+            name='replaced.gif', content=gif(1000),
+            content_type='image/gif')
+        post.save()
+        self.assertEqual(schedule.call_count, 2)
+        release.assert_called_once_with(first_image)
+        Post.objects.get(pk=post.pk).delete()
+        release.assert_called_with(post.image.name)
+
+    def test_original_image_until_thumbnail_ready(self):
+        """Пока миниатюры нет, выводится исходная картинка"""
+        post = self.create_post('original.gif')
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, post.image.url)
+        self.assertIsNone(thumbnails.ready_thumbnail(post.image, 'card'))
+
+    def test_page_thumbnails_preloaded_at_once(self):
+        """Миниатюры всей страницы читаются одним запросом к хранилищу"""
+        posts = [
+            self.create_post(f'page_{number}.gif')
+            for number in range(NUM_OF_POSTS)
+        ]
+        ready = {
+            post.image.name: self.register_without_pillow(post).name
+            for post in posts[::2]
+        }
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'))
+        kvstore_queries = [
+            query for query in queries
+            if 'thumbnail_kvstore' in query['sql']
+        ]
+        self.assertEqual(len(kvstore_queries), 1)
+        found = thumbnails.preload(
+            [post.image for post in posts], 'card')
+        self.assertEqual(
+            {name: thumbnail.name for name, thumbnail in found.items()
+             if thumbnail},
+            ready,
+        )
+        for name in ready.values():
+            self.assertContains(response, name)
+
+    def test_variants_rendered_without_kvstore(self):
+        """Карточка с вариантами выводит srcset без обращений к sorl"""
+        post = self.create_post('variants.gif')
+        post.image_variants = json.dumps({
+            'source': post.image.name,
+            'sizes': {'card': [
+                {
+                    'format': image_format,
+                    'width': width,
+                    'height': int(geometry.split('x')[1]),
+                    'name': f'cache/{width}.{image_format.lower()}',
+                    'bytes': width * 10,
+                }
+                for image_format, width, geometry, _
+                in thumbnails.variant_specs('card')
+            ]},
+        })
+        post.save()
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('posts:index'))
+        self.assertFalse([
+            query for query in queries
+            if 'thumbnail_kvstore' in query['sql']
+        ])
+        for fragment in (
+            '<source type="image/webp" srcset="/media/cache/480.webp 480w, '
+            '/media/cache/960.webp 960w, /media/cache/1440.webp 1440w"',
+            'src="/media/cache/1440.jpeg" srcset="/media/cache/480.jpeg 480w',
+            'width="1440" height="508" loading="lazy"',
+        ):
+            with self.subTest(fragment=fragment):
+                self.assertContains(response, fragment)
+        with override_settings(POST_IMAGE_FORMATS=('WEBP', 'PNG')):
+            self.assertIsNone(thumbnails.picture(post, 'card'))
+        post.image = 'posts/other.gif'
+        self.assertEqual(post.variants, {})
+
+    @skipUnless(hasattr(Image, 'ANTIALIAS'),
+                'движку sorl-thumbnail 12.7 нужен Pillow до 10.0')
+    def test_ready_thumbnail_rendered(self):
+        """Созданные в фоне миниатюра и варианты попадают в ленту
+        и на страницу поста"""
+        post = self.create_post('ready.gif')
+        self.client.get(reverse('posts:index'))
+        thumbnails.register(post.pk, *thumbnails.render(post.image.name))
+        post.refresh_from_db()
+        thumbnail = thumbnails.ready_thumbnail(post.image, 'card')
+        self.assertEqual(thumbnail.size, [960, 339])
+        self.assertEqual(
+            thumbnail.name,
+            get_thumbnail(
+                post.image, '960x339', crop='center', upscale=True).name,
+        )
+        variants = post.variants['card']
+        self.assertEqual(
+            [(variant['format'], variant['width']) for variant in variants],
+            [('WEBP', 480), ('JPEG', 480)],
+        )
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                for variant in variants:
+                    self.assertContains(
+                        response, default.storage.url(variant['name']))
+                self.assertNotContains(response, post.image.url)
+
+
+class RegenerateThumbnailsTests(TemporaryMediaTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=TEST_AUTHOR_USERNAME)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.checkpoint = os.path.join(directory, 'checkpoint')
+        self.posts = [
+            Post.objects.create(
+                text=TEST_POST_TEXT,
+                author=self.author,
+                image=SimpleUploadedFile(
+                    name=f'regenerate_{number}.gif', content=gif(number),
+                    content_type='image/gif'),
+            )
+            for number in range(3)
+        ]
+
+    def call(self, *args):
+        out = StringIO()
+        call_command(
+            'regenerate_thumbnails', '--workers=1',
+            f'--checkpoint={self.checkpoint}', *args, stdout=out,
+        )
+        return out.getvalue()
+
+    def test_dry_run_resumes_from_checkpoint(self):
+        """Пробный запуск начинает с контрольной точки и ничего не пишет"""
+        with open(self.checkpoint, 'w') as checkpoint:
+            checkpoint.write(str(self.posts[0].pk))
+        output = self.call('--dry-run', '--prune')
+        self.assertIn('Картинок: 2, будет создано миниатюр для: 2', output)
+        self.assertIn('Будет удалено миниатюр: ', output)
+        for post in self.posts:
+            self.assertFalse(any(
+                default.storage.exists(name)
+                for name in thumbnails.thumbnail_names(post.image.name)
+            ))
+        self.assertIn('Картинок: 3', self.call('--dry-run', '--restart'))
+
+    @mock.patch('posts.thumbnails.make_pool', ThreadPoolExecutor)
+    def test_prune_keeps_thumbnails_of_posts(self):
+        """Лишние миниатюры удаляются, нужные регистрируются в sorl.
+        Процессы пула не видят MEDIA_ROOT теста, поэтому пул здесь
+        из потоков."""
+        for post in self.posts:
+            for name in thumbnails.thumbnail_names(post.image.name):
+                default.storage.save(name, ContentFile(TEST_IMAGE))
+        orphan = default.storage.save(
+            'cache/00/00/orphan.jpg', ContentFile(TEST_IMAGE))
+        output = self.call('--prune')
+        self.assertIn(
+            'Обработано картинок: 3 (созданы: 0, уже были: 3', output)
+        self.assertFalse(default.storage.exists(orphan))
+        self.assertFalse(os.path.exists(self.checkpoint))
+        for post in self.posts:
+            with self.subTest(post=post.pk):
+                self.assertIsNotNone(
+                    thumbnails.ready_thumbnail(post.image, 'card'))
+
+
+class SharedImageTests(TemporaryMediaTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=TEST_AUTHOR_USERNAME)
+
+    def create_post(self, content, name='shared.gif'):
+        return Post.objects.create(
+            text=TEST_POST_TEXT,
+            author=self.author,
+            image=SimpleUploadedFile(
+                name=name, content=content, content_type='image/gif'),
+        )
+
+    @override_settings(IMAGE_RELEASE_GRACE=0)
+    def test_same_upload_stored_once(self):
+        """Одинаковые загрузки хранятся одним файлом, который удаляется
+        вместе с миниатюрами, когда на него не ссылается ни один пост"""
+        first = self.create_post(gif(2000), 'first.gif')
+        second = self.create_post(gif(2000), 'second.gif')
+        other = self.create_post(gif(2001))
+        name = first.image.name
+        self.assertEqual(second.image.name, name)
+        self.assertNotEqual(other.image.name, name)
+        thumbnail = next(iter(thumbnails.thumbnail_names(name)))
+        default.storage.save(thumbnail, ContentFile(TEST_IMAGE))
+        first.delete()
+        self.assertFalse(thumbnails.delete_unused(name))
+        self.assertTrue(first.image.storage.exists(name))
+        second.delete()
+        self.assertTrue(thumbnails.delete_unused(name))
+        self.assertFalse(first.image.storage.exists(name))
+        self.assertFalse(default.storage.exists(thumbnail))
+        self.assertTrue(other.image.storage.exists(other.image.name))
+
+    def test_fresh_upload_not_released(self):
+        """Файл, который только что загрузили снова, не удаляется,
+        а проверка повторяется позже"""
+        post = self.create_post(gif(2000))
+        name = post.image.name
+        post.delete()
+        Job.objects.all().delete()
+        self.assertFalse(thumbnails.delete_unused(name))
+        self.assertTrue(post.image.storage.exists(name))
+        self.assertEqual(
+            Job.objects.get().task, 'posts.thumbnails.delete_unused')
+
+    def test_move_images(self):
+        """Старые картинки переносятся в хранилище по хэшу содержимого"""
+        storage = FileSystemStorage()
+        legacy = [
+            storage.save(f'posts/legacy_{number}.gif',
+                         ContentFile(gif(3000)))
+            for number in range(2)
+        ]
+        posts = [
+            Post.objects.create(text=TEST_POST_TEXT, author=self.author)
+            for _ in range(3)
+        ]
+        for post, name in zip(posts, legacy + ['posts/missing.gif']):
+            Post.objects.filter(pk=post.pk).update(
+                image=name, image_variants=json.dumps({'source': name}))
+        out = StringIO()
+        call_command('move_images', stdout=out, stderr=StringIO())
+        self.assertIn(
+            'Перенесено файлов: 1, совпали с уже перенесёнными: 1, '
+            'не найдено: 1', out.getvalue())
+        self.assertEqual(
+            Post.objects.get(pk=posts[2].pk).image.name, 'posts/missing.gif')
+        names = set()
+        for post in posts[:2]:
+            post.refresh_from_db()
+            names.add(post.image.name)
+            self.assertEqual(post.image_variants, '')
+        self.assertEqual(len(names), 1)
+        name = names.pop()
+        self.assertTrue(post.image.storage.is_blob_name(name))
+        self.assertEqual(post.image.read(), gif(3000))
+        for name in legacy:
+            self.assertFalse(storage.exists(name))
@@ -0,0 +1,206 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core import jobs
+from posts import timeline
+from posts.models import Post, User, Follow, Timeline
+from .variables import (TEST_POST_TEXT, TEST_AUTHOR_USERNAME,
+                        TEST_AUTH_USER)
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=TEST_AUTHOR_USERNAME)
+        cls.reader = User.objects.create_user(username=TEST_AUTH_USER)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def feed(self):
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        return [post.pk for post in response.context['page_obj']]
+
+    def test_new_post_fanned_out_to_followers(self):
+        """Новый пост попадает в ленты подписчиков"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text=TEST_POST_TEXT, author=self.author)
+        self.assertTrue(
+            Timeline.objects.filter(user=self.reader, post=post).exists())
+        self.assertEqual(self.feed(), [post.pk])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка переносит старые посты, отписка убирает их"""
+        posts = [Post.objects.create(text=TEST_POST_TEXT, author=self.author)
+                 for _ in range(3)]
+        self.authorized_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.author}))
+        self.assertEqual(self.feed(), [post.pk for post in posts[::-1]])
+        self.authorized_client.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.author}))
+        self.assertEqual(self.feed(), [])
+        self.assertFalse(Timeline.objects.filter(user=self.reader).exists())
+
+    @override_settings(TIMELINE_LENGTH=2)
+    def test_timeline_is_capped(self):
+        """Лента ограничена TIMELINE_LENGTH записями"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [Post.objects.create(text=TEST_POST_TEXT, author=self.author)
+                 for _ in range(4)]
+        self.assertEqual(self.feed(), [post.pk for post in posts[:1:-1]])
+
+    def test_rebuild_timelines_command(self):
+        """Команда rebuild_timelines восстанавливает ленты"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text=TEST_POST_TEXT, author=self.author)
+        Timeline.objects.all().delete()
+        self.assertEqual(self.feed(), [])
+        call_command('rebuild_timelines', stdout=StringIO())
+        self.assertEqual(self.feed(), [post.pk])
+
+    @override_settings(TIMELINE_LENGTH=2)
+    def test_trim_breaks_ties_by_post(self):
+        """Посты с одинаковым временем не раздувают ленту сверх
+        TIMELINE_LENGTH"""
+        posts = [Post.objects.create(text=TEST_POST_TEXT, author=self.author)
+                 for _ in range(4)]
+        Timeline.objects.bulk_create(
+            Timeline(user=self.reader, post=post, pub_date=posts[0].pub_date)
+            for post in posts)
+        timeline.trim([self.reader.pk])
+        self.assertEqual(
+            set(Timeline.objects.filter(user=self.reader).values_list(
+                'post', flat=True)),
+            {post.pk for post in posts[2:]})
+
+    def test_failed_rebuild_keeps_other_timelines(self):
+        """Сбой пересборки не опустошает ленты, до которых она
+        не дошла"""
+        other = User.objects.create_user(username='other')
+        for user in (self.reader, other):
+            Follow.objects.create(user=user, author=self.author)
+        post = Post.objects.create(text=TEST_POST_TEXT, author=self.author)
+        rebuild = timeline.rebuild
+
+        def fail_second(user_ids):
+            if user_ids != [self.reader.pk]:
+                raise RuntimeError('сбой')
+            rebuild(user_ids)
+
+        with mock.patch.object(timeline, 'rebuild', fail_second):
+            with self.assertRaises(RuntimeError):
+                call_command(
+                    'rebuild_timelines', '--batch-size=1', stdout=StringIO())
+        for user in (self.reader, other):
+            with self.subTest(user=user.username):
+                self.assertEqual(
+                    list(Timeline.objects.filter(user=user).values_list(
+                        'post', flat=True)),
+                    [post.pk])
+
+    def test_timeline_cursor_pagination(self):
+        """Курсорная пагинация работает по ленте подписок"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [Post.objects.create(text=TEST_POST_TEXT, author=self.author)
+                 for _ in range(12)]
+        url = reverse('posts:follow_index')
+        page_obj = self.authorized_client.get(
+            url, {'before': ''}).context['page_obj']
+        next_page = self.authorized_client.get(
+            url, {'before': page_obj.next_cursor()}).context['page_obj']
+        self.assertEqual(
+            [post.pk for post in list(page_obj) + list(next_page)],
+            [post.pk for post in posts[::-1]])
+
+
+class HybridTimelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=TEST_AUTHOR_USERNAME)
+        cls.readers = [
+            User.objects.create_user(username=f'{TEST_AUTH_USER}{number}')
+            for number in range(5)
+        ]
+        for reader in cls.readers:
+            Follow.objects.create(user=reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.readers[0])
+
+    def tearDown(self):
+        cache.clear()
+
+    def feed(self):
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        return [post.pk for post in response.context['page_obj']]
+
+    @override_settings(TIMELINE_FANOUT_FOLLOWER_LIMIT=3)
+    def test_popular_author_posts_merged_on_read(self):
+        """Посты популярного автора подмешиваются в ленту при чтении"""
+        older = Post.objects.create(text=TEST_POST_TEXT, author=self.author)
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.readers[0], author=other)
+        pushed = Post.objects.create(text=TEST_POST_TEXT, author=other)
+        post = Post.objects.create(text=TEST_POST_TEXT, author=self.author)
+        self.assertFalse(Timeline.objects.filter(post=post).exists())
+        url = reverse('posts:follow_index')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.authorized_client.get(url)
+        self.assertEqual(
+            [feed_post.pk for feed_post in response.context['page_obj']],
+            [post.pk, pushed.pk, older.pk])
+        for query in queries:
+            self.assertFalse(
+                query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE')),
+                query['sql'])
+        self.assertFalse(Timeline.objects.filter(
+            post__author=self.author).exists())
+        page_obj = self.authorized_client.get(
+            url, {'before': ''}).context['page_obj']
+        self.assertEqual(
+            [feed_post.pk for feed_post in page_obj],
+            [post.pk, pushed.pk, older.pk])
+        self.assertFalse(page_obj.has_next())
+        Post.objects.filter(pk__in=[older.pk, pushed.pk]).delete()
+        post.delete()
+        response = self.authorized_client.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    @override_settings(TIMELINE_FANOUT_INLINE_LIMIT=0,
+                       TIMELINE_FANOUT_BATCH_SIZE=2)
+    def test_fan_out_in_batches(self):
+        """Отложенная раздача поста доходит до всех подписчиков"""
+        post = Post.objects.create(text=TEST_POST_TEXT, author=self.author)
+        self.assertFalse(Timeline.objects.filter(post=post).exists())
+        timeline.fan_out(post)
+        self.assertEqual(
+            set(Timeline.objects.filter(post=post).values_list(
+                'user', flat=True)),
+            {reader.pk for reader in self.readers})
+
+    @override_settings(TIMELINE_FANOUT_INLINE_LIMIT=2,
+                       TIMELINE_FANOUT_BATCH_SIZE=2)
+    def test_deferred_fan_out(self):
+        """Раздача поста автора с многими подписчиками откладывается
+        в фоновую задачу и доходит до всех подписчиков"""
+        post = Post.objects.create(text=TEST_POST_TEXT, author=self.author)
+        self.assertFalse(Timeline.objects.filter(post=post).exists())
+        self.assertEqual(self.feed(), [])
+        self.assertEqual(jobs.work(['timeline'], burst=True), 1)
+        self.assertEqual(
+            set(Timeline.objects.filter(post=post).values_list(
+                'user', flat=True)),
+            {reader.pk for reader in self.readers})
+        self.assertEqual(self.feed(), [post.pk])
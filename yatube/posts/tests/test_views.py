@@ -1,6 +1,11 @@
+from django.conf import settings
 from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
 from django import forms
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.db.models.fields.files import ImageFieldFile
@@ -8,6 +13,8 @@ from django.db.models.fields.files import ImageFieldFile
 from http import HTTPStatus
 
 from posts.models import Post, Group, User, Comment, Follow
+from posts.paginators import CachedCountPaginator
+from posts.templatetags.post_cards import card_key as post_card_key
 from yatube.settings import NUM_OF_POSTS
 from .variables import (NUMBER_OF_TEST_POSTS, TEST_GROUP_TITLE,
                         TEST_GROUP_SLUG, TEST_GROUP_DESCRIPTION,
@@ -195,6 +202,72 @@ class CacheViewsTests(TestCase):
         cache.clear()
         self.assertNotEqual(response.content, cache.get('index_page'))
 
+    def test_feed_cache_varies_by_page_and_user(self):
+        """Кэш ленты разделяет страницы, гостей и пользователей"""
+        cache.clear()
+        Post.objects.bulk_create(
+            Post(text=f'{TEST_POST_TEXT} {number}', author=self.author)
+            for number in range(NUM_OF_POSTS + 1)
+        )
+        url = reverse('posts:index')
+        first = self.guest_client.get(url).content
+        second = self.guest_client.get(url, {'page': 2}).content
+        self.assertNotEqual(first, second)
+        self.assertEqual(first, self.guest_client.get(url).content)
+        switcher = reverse('posts:follow_index').encode()
+        self.assertNotIn(switcher, first)
+        self.assertIn(switcher, self.authorized_client.get(url).content)
+
+    def test_post_cards_cached(self):
+        """Карточки постов кэшируются и обновляются при смене автора"""
+        cache.clear()
+        post = Post.objects.create(text=TEST_POST_TEXT, author=self.author)
+        card = post_card_key(post)
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:profile', args=(TEST_AUTHOR_USERNAME,)),
+        )
+        for page in pages:
+            self.guest_client.get(page)
+        self.assertIn(post.text, cache.get(card))
+        self.author.first_name = 'Новое имя'
+        self.author.save()
+        for page in pages:
+            with self.subTest(page=page):
+                self.assertContains(
+                    self.guest_client.get(page), self.author.first_name)
+        post.refresh_from_db()
+        self.assertNotEqual(card, post_card_key(post))
+
+    def test_feed_cache_invalidated_by_posts(self):
+        """Новый, изменённый и удалённый пост сразу видны в лентах"""
+        cache.clear()
+        group = Group.objects.create(
+            title=TEST_GROUP_TITLE,
+            slug=TEST_GROUP_SLUG,
+            description=TEST_GROUP_DESCRIPTION,
+        )
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(TEST_GROUP_SLUG,)),
+            reverse('posts:profile', args=(TEST_AUTHOR_USERNAME,)),
+        )
+        for page in pages:
+            self.guest_client.get(page)
+        post = Post.objects.create(
+            text='Свежий пост', author=self.author, group=group)
+        for page in pages:
+            with self.subTest(page=page):
+                self.assertContains(self.guest_client.get(page), post.text)
+        post.group = None
+        post.save()
+        self.assertNotContains(self.guest_client.get(pages[1]), post.text)
+        post.delete()
+        for page in pages:
+            with self.subTest(page=page):
+                self.assertNotContains(
+                    self.guest_client.get(page), post.text)
+
 
 class PaginatorViewsTests(TestCase):
     @classmethod
@@ -241,6 +314,186 @@ class PaginatorViewsTests(TestCase):
                     len(response.context['page_obj']), NUMBER_OF_TEST_POSTS
                     - NUM_OF_POSTS)
 
+    def test_cursor_paginator_in_pages(self):
+        """Курсорная пагинация проходит ленту без пропусков и повторов"""
+        expected = list(Post.objects.order_by(
+            '-pub_date', '-pk').values_list('pk', flat=True))
+        for page in self.first_pages + (reverse('posts:index'),):
+            with self.subTest(reverse_name=page):
+                page_obj = self.authorized_client.get(
+                    page, {'before': ''}).context['page_obj']
+                seen = [post.pk for post in page_obj]
+                while page_obj.has_next():
+                    page_obj = self.authorized_client.get(
+                        page, {'before': page_obj.next_cursor()}
+                    ).context['page_obj']
+                    seen += [post.pk for post in page_obj]
+                self.assertEqual(seen, expected)
+                self.assertIsNone(page_obj.number)
+                page_obj = self.authorized_client.get(
+                    page, {'after': page_obj.previous_cursor()}
+                ).context['page_obj']
+                self.assertEqual(
+                    [post.pk for post in page_obj], expected[:NUM_OF_POSTS])
+                self.assertFalse(page_obj.has_previous())
+
+    def test_paginator_count_cached(self):
+        """Количество записей кэшируется до изменения постов"""
+        cache.clear()
+        page = self.first_pages[0]
+        self.authorized_client.get(page)
+        with CaptureQueriesContext(connection) as queries:
+            self.authorized_client.get(page)
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries))
+        Post.objects.create(
+            text=TEST_POST_TEXT, author=self.author, group=self.group)
+        response = self.authorized_client.get(page)
+        self.assertEqual(
+            response.context['page_obj'].paginator.count,
+            NUMBER_OF_TEST_POSTS + 1)
+
+    def test_elided_page_range(self):
+        """Список страниц сокращается до первой, последней и ±3"""
+        paginator = CachedCountPaginator(list(range(100)), 1)
+        ellipsis = CachedCountPaginator.ELLIPSIS
+        self.assertEqual(
+            list(paginator.get_elided_page_range(50)),
+            [1, ellipsis, 47, 48, 49, 50, 51, 52, 53, ellipsis, 100])
+        self.assertEqual(
+            list(paginator.get_elided_page_range(2)),
+            [1, 2, 3, 4, 5, ellipsis, 100])
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username=TEST_AUTHOR_USERNAME)
+        cls.group = Group.objects.create(
+            title=TEST_GROUP_TITLE,
+            slug=TEST_GROUP_SLUG,
+            description=TEST_GROUP_DESCRIPTION,
+        )
+        cls.post = Post.objects.create(
+            text=TEST_POST_TEXT, author=cls.author, group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=(TEST_GROUP_SLUG,)),
+            reverse('posts:profile', args=(TEST_AUTHOR_USERNAME,)),
+            reverse('posts:post_detail', args=(self.post.pk,)),
+        )
+
+    def revalidate(self, page, response):
+        return self.guest_client.get(
+            page, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_not_modified(self):
+        """Неизменённая страница отдаётся как 304 без отрисовки"""
+        for page in self.pages:
+            with self.subTest(page=page):
+                with CaptureQueriesContext(connection) as rendered:
+                    response = self.guest_client.get(page)
+                with CaptureQueriesContext(connection) as queries:
+                    self.assertEqual(
+                        self.revalidate(page, response).status_code,
+                        HTTPStatus.NOT_MODIFIED,
+                    )
+                self.assertLess(len(queries), len(rendered))
+                response = self.guest_client.get(
+                    page,
+                    HTTP_IF_MODIFIED_SINCE=response['Last-Modified'],
+                )
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED)
+
+    def test_modified_after_changes(self):
+        """Новый пост, правка и комментарий меняют валидаторы"""
+        responses = {page: self.guest_client.get(page) for page in self.pages}
+        Post.objects.create(
+            text=TEST_POST_TEXT, author=self.author, group=self.group)
+        for page in self.pages[:3]:
+            with self.subTest(page=page):
+                self.assertEqual(
+                    self.revalidate(page, responses[page]).status_code,
+                    HTTPStatus.OK,
+                )
+        detail = self.pages[3]
+        for change in (
+            lambda: Comment.objects.create(
+                post=self.post, author=self.author, text=TEST_COMMENT),
+            lambda: Post.objects.get(pk=self.post.pk).save(),
+        ):
+            response = self.guest_client.get(detail)
+            change()
+            self.assertEqual(
+                self.revalidate(detail, response).status_code, HTTPStatus.OK)
+
+    def test_validators_depend_on_page_and_user(self):
+        """ETag различается для страниц и пользователей"""
+        url = reverse('posts:index')
+        authorized_client = Client()
+        authorized_client.force_login(self.author)
+        etags = {
+            self.guest_client.get(url)['ETag'],
+            self.guest_client.get(url, {'page': 2})['ETag'],
+            authorized_client.get(url)['ETag'],
+        }
+        self.assertEqual(len(etags), 3)
+
+    def test_validators_follow_login(self):
+        """После нового входа страница с CSRF-токеном отрисовывается
+        заново"""
+        client = Client()
+        client.force_login(self.author)
+        detail = self.pages[3]
+        client.get(detail)
+        self.assertIn(settings.CSRF_COOKIE_NAME, client.cookies)
+        response = client.get(detail)
+        self.assertEqual(
+            client.get(
+                detail, HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+            HTTPStatus.NOT_MODIFIED,
+        )
+        client.cookies[settings.CSRF_COOKIE_NAME] = get_random_string(64)
+        self.assertEqual(
+            client.get(
+                detail, HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+            HTTPStatus.OK,
+        )
+        response = client.get(detail)
+        User.objects.filter(pk=self.author.pk).update(
+            last_login=timezone.now())
+        self.assertEqual(
+            client.get(
+                detail, HTTP_IF_NONE_MATCH=response['ETag']).status_code,
+            HTTPStatus.OK,
+        )
+
+    def test_detail_modified_after_commenter_rename(self):
+        """Переименование автора комментария меняет ETag поста, а сам
+        ETag не читает все комментарии"""
+        commenter = User.objects.create_user(username='commenter')
+        Comment.objects.create(
+            post=self.post, author=commenter, text=TEST_COMMENT)
+        detail = self.pages[3]
+        response = self.guest_client.get(detail)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(
+                self.revalidate(detail, response).status_code,
+                HTTPStatus.NOT_MODIFIED)
+        for query in queries:
+            if 'posts_comment' in query['sql']:
+                self.assertIn('LIMIT 1', query['sql'])
+        commenter.username = 'renamed'
+        commenter.save()
+        self.assertEqual(
+            self.revalidate(detail, response).status_code, HTTPStatus.OK)
+
 
 class PostViewsFollowTests(TestCase):
     @classmethod
@@ -0,0 +1,310 @@
+"""Миниатюры картинок постов.
+
+Миниатюры всех размеров из POST_THUMBNAILS создаёт фоновая задача,
+поставленная в очередь в транзакции, в которой у поста появилась новая
+картинка. `render` только декодирует картинку и пишет файлы миниатюр,
+поэтому `regenerate_thumbnails` выполняет его в пуле процессов, а
+записи в хранилище ключей sorl и в базу делает `register`. Шаблоны никогда
+не создают миниатюры сами: `preload` и `ready_thumbnail` возвращают
+готовые миниатюры или None.
+"""
+import collections
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import (
+    ImageFile, deserialize_image_file, serialize_image_file)
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.models import KVStore
+
+from core.jobs import job
+from .models import Post
+
+
+def source_file(name):
+    """Исходная картинка поста в хранилище поля `Post.image`: от класса
+    хранилища зависят ключи sorl."""
+    return ImageFile(name, Post._meta.get_field('image').storage)
+
+
+def make_pool(workers):
+    """Процессы запускаются через spawn: fork многопоточного процесса
+    с открытыми соединениями к базе небезопасен."""
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=django.setup,
+    )
+
+
+def resolve(source, geometry, options):
+    """Файл миниатюры с тем же именем и параметрами, что выбрал бы
+    `sorl.thumbnail.get_thumbnail`."""
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    name = backend._get_thumbnail_filename(source, geometry, options)
+    return ImageFile(name, default.storage), options
+
+
+def preload(images, size):
+    """Готовые миниатюры размера `size` из POST_THUMBNAILS для многих
+    картинок сразу: {имя картинки: миниатюра или None}.
+
+    Повторяет чтение `cached_db_kvstore` sorl, но одним `get_many`
+    к кэшу и одним запросом к базе для промахов вместо обращения
+    на каждую картинку.
+    """
+    geometry, options = settings.POST_THUMBNAILS[size]
+    keys = {}
+    for image in images:
+        if image:
+            thumbnail, _ = resolve(ImageFile(image), geometry, options)
+            keys[add_prefix(thumbnail.key)] = image.name
+    if not keys:
+        return {}
+    kv_cache = default.kvstore.cache
+    values = kv_cache.get_many(list(keys))
+    missing = set(keys) - set(values)
+    if missing:
+        stored = dict(KVStore.objects.filter(
+            key__in=missing).values_list('key', 'value'))
+        fetched = {key: stored.get(key, EMPTY_VALUE) for key in missing}
+        kv_cache.set_many(fetched, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+        values.update(fetched)
+    return {
+        name: None if values[key] == EMPTY_VALUE
+        else deserialize_image_file(values[key])
+        for key, name in keys.items()
+    }
+
+
+def ready_thumbnail(image, size):
+    """Готовая миниатюра одной картинки или None."""
+    if not image:
+        return None
+    return preload([image], size)[image.name]
+
+
+MIME_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png', 'WEBP': 'image/webp'}
+
+
+def variant_specs(size, source_width=None):
+    """Формат, ширина, геометрия и опции вариантов размера `size`
+    для `srcset`. Варианты шире исходной картинки не создаются,
+    кроме самого узкого."""
+    geometry, options = settings.POST_THUMBNAILS[size]
+    width, height = (int(side) for side in geometry.split('x'))
+    widths = settings.POST_IMAGE_WIDTHS
+    if source_width is not None:
+        widths = [
+            target for target in widths if target <= source_width
+        ] or widths[:1]
+    for target in widths:
+        for image_format in settings.POST_IMAGE_FORMATS:
+            yield (
+                image_format,
+                target,
+                f'{target}x{round(target * height / width)}',
+                {**options, 'format': image_format},
+            )
+
+
+def thumbnail_names(name):
+    """Имена всех файлов миниатюр и вариантов картинки, включая файлы
+    для THUMBNAIL_ALTERNATIVE_RESOLUTIONS."""
+    source = source_file(name)
+    specs = []
+    for size, (geometry, options) in settings.POST_THUMBNAILS.items():
+        specs.append((geometry, options))
+        specs.extend(spec[2:] for spec in variant_specs(size))
+    names = set()
+    for geometry, options in specs:
+        thumbnail, _ = resolve(source, geometry, options)
+        base, extension = os.path.splitext(thumbnail.name)
+        names.add(thumbnail.name)
+        names.update(
+            f'{base}@{resolution}x{extension}'
+            for resolution in sorl_settings.THUMBNAIL_ALTERNATIVE_RESOLUTIONS
+        )
+    return names
+
+
+class Renderer:
+    """Создаёт миниатюры одной картинки, декодируя её не больше раза."""
+
+    def __init__(self, name):
+        self.source = source_file(name)
+        self.source.set_size()
+        self.image = None
+        self.thumbnails = []
+
+    @property
+    def created(self):
+        return self.image is not None
+
+    def thumbnail(self, geometry, options):
+        thumbnail, options = resolve(self.source, geometry, options)
+        if thumbnail.exists():
+            thumbnail.set_size()
+        else:
+            engine, backend = default.engine, default.backend
+            if self.image is None:
+                self.image = engine.get_image(self.source)
+            options['image_info'] = engine.get_image_info(self.image)
+            backend._create_thumbnail(self.image, geometry, options, thumbnail)
+            backend._create_alternative_resolutions(
+                self.image, geometry, options, thumbnail.name)
+        self.thumbnails.append(serialize_image_file(thumbnail))
+        return thumbnail
+
+    def variants(self, size):
+        variants = []
+        for image_format, width, geometry, options in variant_specs(
+                size, self.source.width):
+            thumbnail = self.thumbnail(geometry, options)
+            variants.append({
+                'format': image_format,
+                'width': thumbnail.width,
+                'height': thumbnail.height,
+                'name': thumbnail.name,
+                'bytes': default.storage.size(thumbnail.name),
+            })
+        return variants
+
+    def close(self):
+        if self.image is not None:
+            default.engine.cleanup(self.image)
+
+
+def render(name, force=False):
+    """Выполняется в задаче или в процессе пула: пишет недостающие
+    файлы миниатюр и вариантов (все, если `force`). Возвращает исходник
+    и миниатюры в сериализованном виде, то, был ли создан хоть один
+    файл, и описание вариантов для `Post.image_variants`."""
+    if force:
+        for thumbnail_name in thumbnail_names(name):
+            default.storage.delete(thumbnail_name)
+    renderer = Renderer(name)
+    sizes = {}
+    try:
+        for size, (geometry, options) in settings.POST_THUMBNAILS.items():
+            renderer.thumbnail(geometry, options)
+            sizes[size] = renderer.variants(size)
+    finally:
+        renderer.close()
+    return (
+        serialize_image_file(renderer.source),
+        renderer.thumbnails,
+        renderer.created,
+        {'source': name, 'sizes': sizes},
+    )
+
+
+def register(post_id, source, thumbnails, created=True, variants=None):
+    """Записывает миниатюры в хранилище ключей sorl, а варианты - в пост.
+    Если появились новые файлы или описание вариантов изменилось,
+    сохраняет пост, чтобы сменились ключи кэша его карточки и
+    страниц."""
+    source = deserialize_image_file(source)
+    default.kvstore.get_or_set(source)
+    for thumbnail in thumbnails:
+        default.kvstore.set(deserialize_image_file(thumbnail), source)
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None or post.image.name != source.name:
+        return
+    variants = json.dumps(variants, sort_keys=True) if variants else ''
+    if created or post.image_variants != variants:
+        post.image_variants = variants
+        post.save(update_fields=['image_variants', 'updated'])
+
+
+def picture(post, size):
+    """Данные для `<picture>` из сохранённых в посте вариантов или None,
+    если варианты для текущей картинки ещё не созданы или среди них нет
+    запасного формата (например, после смены POST_IMAGE_FORMATS). Файлы
+    при этом не открываются."""
+    variants = post.variants.get(size)
+    if not variants:
+        return None
+    by_format = collections.defaultdict(list)
+    for variant in variants:
+        by_format[variant['format']].append(variant)
+    fallback_format = settings.POST_IMAGE_FORMATS[-1]
+
+    def srcset(items):
+        return ', '.join(
+            f'{default.storage.url(item["name"])} {item["width"]}w'
+            for item in items
+        )
+
+    fallback = by_format.pop(fallback_format, None)
+    if not fallback:
+        return None
+    largest = fallback[-1]
+    return {
+        'sources': [
+            {'type': MIME_TYPES[image_format], 'srcset': srcset(items)}
+            for image_format, items in by_format.items()
+        ],
+        'src': default.storage.url(largest['name']),
+        'srcset': srcset(fallback),
+        'width': largest['width'],
+        'height': largest['height'],
+    }
+
+
+@job(queue='thumbnails', timeout=600)
+def generate(post_id, name):
+    register(post_id, *render(name))
+
+
+def schedule(post):
+    """Ставит создание миниатюр поста в очередь."""
+    name = post.image.name
+    generate.enqueue(
+        (post.pk, name), key=f'thumbnails:{post.pk}:{name}'[:200])
+
+
+@job(queue='thumbnails')
+def delete_unused(name):
+    """Удаляет картинку со всеми миниатюрами и вариантами, если на неё
+    больше не ссылается ни один пост. Одинаковые загрузки хранятся
+    одним файлом, поэтому ссылки считаются по имени. Картинку, которую
+    только что загрузили ещё раз, задача проверит снова позже; файлы
+    со старыми именами загрузить повторно нельзя."""
+    in_use = Post.objects.filter(image=name).exists
+    if in_use():
+        return False
+    storage = Post._meta.get_field('image').storage
+    grace = settings.IMAGE_RELEASE_GRACE if storage.is_blob_name(name) else 0
+    if not storage.discard(name, in_use, grace):
+        if not in_use():
+            release(name, countdown=grace)
+        return False
+    for thumbnail_name in thumbnail_names(name):
+        default.storage.delete(thumbnail_name)
+    default.kvstore.delete(source_file(name))
+    return True
+
+
+def release(name, countdown=None):
+    """Пост перестал ссылаться на картинку: задача в очереди удалит её,
+    если она больше никому не нужна."""
+    delete_unused.enqueue(
+        (name,), countdown=countdown, key=f'release:{name}'[:200])
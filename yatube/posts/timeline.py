@@ -0,0 +1,193 @@
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, OuterRef, Q, Subquery
+
+from core.jobs import job
+from .caching import bump_version
+from .models import Follow, Post, Profile, Timeline
+
+User = get_user_model()
+
+PULL_AUTHORS_KEY = 'timeline:pull_authors'
+PULL_AUTHORS_TIMEOUT = 300
+TRIM_CHUNK_SIZE = 100
+
+
+def recent_key(author_id):
+    return f'timeline:recent:{author_id}'
+
+
+def trim(user_ids):
+    """Оставляет в лентах пользователей не больше TIMELINE_LENGTH записей.
+
+    Граница сравнивается по тому же ключу `(pub_date, post_id)`, по
+    которому упорядочена лента, поэтому посты с одинаковым временем
+    не раздувают её.
+    """
+    oldest_kept = Timeline.objects.filter(
+        user=OuterRef('pk')
+    ).order_by('-pub_date', '-post_id')[
+        settings.TIMELINE_LENGTH - 1:settings.TIMELINE_LENGTH]
+    cutoffs = list(User.objects.filter(pk__in=user_ids).annotate(
+        cutoff_date=Subquery(oldest_kept.values('pub_date')),
+        cutoff_post=Subquery(oldest_kept.values('post_id')),
+    ).exclude(cutoff_date=None).values_list(
+        'pk', 'cutoff_date', 'cutoff_post'))
+    for start in range(0, len(cutoffs), TRIM_CHUNK_SIZE):
+        Timeline.objects.filter(reduce(or_, (
+            Q(user=user_id, pub_date__lt=pub_date)
+            | Q(user=user_id, pub_date=pub_date, post_id__lt=post_id)
+            for user_id, pub_date, post_id
+            in cutoffs[start:start + TRIM_CHUNK_SIZE]
+        ))).delete()
+
+
+def pull_author_ids():
+    """Авторы, чьи посты не раздаются подписчикам, а подмешиваются при
+    чтении ленты."""
+    author_ids = cache.get(PULL_AUTHORS_KEY)
+    if author_ids is None:
+        author_ids = set(Profile.objects.filter(
+            followers_count__gt=settings.TIMELINE_FANOUT_FOLLOWER_LIMIT
+        ).values_list('user', flat=True))
+        cache.set(PULL_AUTHORS_KEY, author_ids, PULL_AUTHORS_TIMEOUT)
+    return author_ids
+
+
+def recent_posts(author_ids):
+    """Последние посты авторов в виде {author_id: [(pub_date, pk), ...]}."""
+    keys = {recent_key(author_id): author_id for author_id in author_ids}
+    recent = {keys[key]: value for key, value in cache.get_many(keys).items()}
+    for author_id in set(author_ids) - set(recent):
+        recent[author_id] = list(Post.objects.filter(
+            author=author_id
+        ).order_by('-pub_date').values_list(
+            'pub_date', 'pk')[:settings.TIMELINE_RECENT_POSTS])
+        cache.set(recent_key(author_id), recent[author_id], None)
+    return recent
+
+
+def fan_out(post):
+    """Добавляет пост в ленты подписчиков автора пачками."""
+    follower_ids = Follow.objects.filter(
+        author=post.author_id).order_by('user').values_list('user', flat=True)
+    batch_size = settings.TIMELINE_FANOUT_BATCH_SIZE
+    last_id = 0
+    while True:
+        batch = list(follower_ids.filter(user__gt=last_id)[:batch_size])
+        if not batch:
+            return
+        with transaction.atomic():
+            Timeline.objects.bulk_create(
+                (Timeline(user_id=user_id, post=post, pub_date=post.pub_date)
+                 for user_id in batch),
+                ignore_conflicts=True,
+            )
+            trim(batch)
+        last_id = batch[-1]
+
+
+@job(queue='timeline', timeout=1800)
+def fan_out_later(post_id):
+    post = Post.objects.filter(pk=post_id).first()
+    if post is not None:
+        fan_out(post)
+        bump_version('posts')
+
+
+def publish(post):
+    """Раздаёт новый пост подписчикам.
+
+    Посты авторов с числом подписчиков больше
+    TIMELINE_FANOUT_FOLLOWER_LIMIT не раздаются: подписчики забирают их
+    из кэша последних постов автора при чтении ленты. Небольшие раздачи
+    выполняются сразу, остальные - фоновой задачей.
+    """
+    followers = Profile.objects.filter(user=post.author_id).values_list(
+        'followers_count', flat=True).first() or 0
+    if followers > settings.TIMELINE_FANOUT_FOLLOWER_LIMIT:
+        cache.delete(recent_key(post.author_id))
+        author_ids = pull_author_ids()
+        if post.author_id not in author_ids:
+            cache.set(
+                PULL_AUTHORS_KEY,
+                author_ids | {post.author_id},
+                PULL_AUTHORS_TIMEOUT,
+            )
+    elif followers > settings.TIMELINE_FANOUT_INLINE_LIMIT:
+        fan_out_later.delay(post.pk)
+    elif followers:
+        fan_out(post)
+
+
+def pulled_post_ids(user_id):
+    """Последние посты авторов, на которых подписан пользователь и чьи
+    посты не раздаются при публикации."""
+    author_ids = pull_author_ids()
+    if author_ids:
+        author_ids = list(Follow.objects.filter(
+            user=user_id, author__in=author_ids
+        ).values_list('author', flat=True))
+    if not author_ids:
+        return []
+    return [
+        pk for posts in recent_posts(author_ids).values()
+        for pub_date, pk in posts
+    ]
+
+
+def feed(user_id):
+    """Посты ленты пользователя с ключами `feed_date` и `feed_post`.
+
+    Посты авторов из pull_author_ids() подмешиваются в запрос по
+    первичному ключу из кэша последних постов и в Timeline не пишутся.
+    """
+    pulled = pulled_post_ids(user_id)
+    if not pulled:
+        return Post.objects.filter(timelines__user=user_id).annotate(
+            feed_date=F('timelines__pub_date'),
+            feed_post=F('timelines__post'),
+        )
+    return Post.objects.filter(
+        Q(pk__in=Timeline.objects.filter(user=user_id).values('post'))
+        | Q(pk__in=pulled)
+    ).annotate(feed_date=F('pub_date'), feed_post=F('pk'))
+
+
+def backfill(user_id, author_id):
+    """Переносит последние посты автора в ленту нового подписчика."""
+    posts = Post.objects.filter(author=author_id).order_by(
+        '-pub_date').values_list('pk', 'pub_date')[:settings.TIMELINE_LENGTH]
+    Timeline.objects.bulk_create(
+        (Timeline(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for pk, pub_date in posts),
+        ignore_conflicts=True,
+    )
+    trim([user_id])
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты пользователя посты автора, от которого он отписался."""
+    Timeline.objects.filter(user=user_id, post__author=author_id).delete()
+
+
+def rebuild(user_ids):
+    """Пересобирает ленты пользователей с нуля по текущим подпискам.
+    Вызывается в транзакции, чтобы читатели не видели пустую ленту."""
+    Timeline.objects.filter(user__in=user_ids).delete()
+    for user_id in user_ids:
+        posts = Post.objects.filter(
+            author__following__user=user_id
+        ).order_by('-pub_date', '-pk').values_list(
+            'pk', 'pub_date')[:settings.TIMELINE_LENGTH]
+        Timeline.objects.bulk_create(
+            (Timeline(user_id=user_id, post_id=pk, pub_date=pub_date)
+             for pk, pub_date in posts),
+            ignore_conflicts=True,
+        )
+    bump_version('posts')
@@ -1,69 +1,216 @@
+import hashlib
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
-from django.core.mail import send_mail
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag, urlencode
 
+from core.resilience import retry_write, serve_stale
 from yatube.settings import NUM_OF_POSTS
 
-from .forms import PostForm, CommentForm
-from .models import Group, Post, Follow
+from . import notifications, search, timeline
+from .counters import profile_of
+from .caching import fragment_key, get_modified, get_version
+from .forms import CommentForm, NotificationSettingsForm, PostForm
+from .models import Follow, Group, Notification, Post
+from .paginators import CachedCountPaginator, CursorPaginator
 
 User = get_user_model()
 
 
-def get_paginator(request, kwargs):
-    paginator = Paginator(kwargs, NUM_OF_POSTS)
+def get_paginator(request, post_list, signature=None,
+                  keys=CursorPaginator.keys):
+    if 'before' in request.GET or 'after' in request.GET:
+        paginator = CursorPaginator(post_list, NUM_OF_POSTS, keys)
+        return paginator.get_page(
+            before=request.GET.get('before'),
+            after=request.GET.get('after'),
+        )
+    paginator = CachedCountPaginator(
+        post_list.order_by(*(f'-{key}' for key in keys)),
+        NUM_OF_POSTS,
+        signature,
+    )
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return page_obj
 
 
+def feed_cache(request, scope, page_obj):
+    """Контекст для `{% cache %}` ленты: ключ зависит от версии области,
+    страницы или курсора и от того, гость ли пользователь."""
+    variant = 'user' if request.user.is_authenticated else 'guest'
+    if page_obj.number is None:
+        page = urlencode(sorted(
+            (key, request.GET[key])
+            for key in ('before', 'after') if key in request.GET
+        ))
+    else:
+        page = page_obj.number
+    return {
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+        'feed_cache_key': fragment_key(scope, page, variant),
+    }
+
+
+def page_validators(request, *parts, last_modified):
+    """ETag и Last-Modified страницы.
+
+    ETag учитывает параметры пагинации, пользователя, для которого
+    отрисована шапка сайта, его вход и CSRF-cookie: после нового входа
+    токен в формах страницы меняется, и старая копия не подходит.
+    """
+    user = request.user
+    viewer = (
+        (user.pk, user.username, user.last_login)
+        if user.is_authenticated else None
+    )
+    csrf = request.META.get('CSRF_COOKIE')
+    query = sorted(
+        (key, value) for key, value in request.GET.items()
+        if key in ('page', 'before', 'after')
+    )
+    if user.is_authenticated and user.last_login:
+        last_modified = max(last_modified, user.last_login.timestamp())
+    digest = hashlib.md5(
+        repr((parts, query, viewer, csrf)).encode()).hexdigest()
+    return {'etag': quote_etag(digest), 'last_modified': int(last_modified)}
+
+
+def feed_validators(request, scope, *parts):
+    return page_validators(
+        request, scope, get_version(scope), *parts,
+        last_modified=get_modified(scope),
+    )
+
+
+def render_with_validators(request, template, context, validators):
+    response = render(request, template, context)
+    response['ETag'] = validators['etag']
+    response['Last-Modified'] = http_date(validators['last_modified'])
+    return response
+
+
+@serve_stale
 def index(request):
-    post_list = Post.objects.all()
+    validators = feed_validators(request, 'index')
+    not_modified = get_conditional_response(request, **validators)
+    if not_modified is not None:
+        return not_modified
+    post_list = Post.objects.select_related('author', 'group')
+    page_obj = get_paginator(request, post_list, 'index')
     context = {
-        'page_obj': get_paginator(request, post_list),
+        'page_obj': page_obj,
+        **feed_cache(request, 'index', page_obj),
     }
-    return render(request, 'posts/index.html', context)
+    return render_with_validators(
+        request, 'posts/index.html', context, validators)
 
 
+@serve_stale
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
+    validators = feed_validators(request, f'group:{group.pk}')
+    not_modified = get_conditional_response(request, **validators)
+    if not_modified is not None:
+        return not_modified
+    post_list = group.posts.select_related('author')
+    page_obj = get_paginator(request, post_list, f'group:{slug}')
     context = {
         'group': group,
-        'page_obj': get_paginator(request, post_list),
+        'page_obj': page_obj,
+        **feed_cache(request, f'group:{group.pk}', page_obj),
     }
-    return render(request, 'posts/group_list.html', context)
+    return render_with_validators(
+        request, 'posts/group_list.html', context, validators)
 
 
+@serve_stale
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    paginator = Paginator(author.posts.all(), NUM_OF_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    author = get_object_or_404(
+        User.objects.select_related('profile'), username=username)
     following = (request.user.is_authenticated and Follow.objects.filter(
         user=request.user,
         author=author).exists()
     )
+    profile = profile_of(author)
+    validators = feed_validators(
+        request,
+        f'author:{author.pk}',
+        author.get_full_name(),
+        profile.followers_count,
+        profile.following_count,
+        following,
+    )
+    not_modified = get_conditional_response(request, **validators)
+    if not_modified is not None:
+        return not_modified
+    page_obj = get_paginator(
+        request, author.posts.select_related('group'), f'author:{author.pk}')
     context = {
         'author': author,
         'page_obj': page_obj,
-        'following': following
+        'following': following,
+        **feed_cache(request, f'author:{author.pk}', page_obj),
     }
-    return render(request, 'posts/profile.html', context)
+    return render_with_validators(
+        request, 'posts/profile.html', context, validators)
 
 
+@serve_stale
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__profile', 'group'),
+        pk=post_id,
+    )
+    last_comment = post.comments.order_by('-created').values_list(
+        'created', flat=True).first()
+    commenters = f'commenters:{post.pk}'
+    author, group = post.author, post.group
+    validators = page_validators(
+        request,
+        post.pk,
+        post.updated,
+        post.comments_count,
+        last_comment,
+        get_version(commenters),
+        author.username,
+        author.get_full_name(),
+        profile_of(author).posts_count,
+        group and (group.slug, group.title),
+        last_modified=max(
+            max(filter(None, (post.updated, last_comment))).timestamp(),
+            get_modified(commenters),
+        ),
+    )
+    not_modified = get_conditional_response(request, **validators)
+    if not_modified is not None:
+        return not_modified
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
+    comments = post.comments.select_related('author')
     context = {
         'post': post,
         'form': form,
         'comments': comments,
     }
-    return render(request, 'posts/post_detail.html', context)
+    return render_with_validators(
+        request, 'posts/post_detail.html', context, validators)
+
+
+def post_search(request):
+    query = request.GET.get('q', '').strip()
+    results, next_cursor = search.search(
+        query, request.GET.get('after'), NUM_OF_POSTS)
+    context = {
+        'query': query,
+        'results': results,
+        'next_query': next_cursor and urlencode(
+            {'q': query, 'after': next_cursor}),
+    }
+    return render(request, 'posts/search.html', context)
 
 
 @login_required
@@ -73,7 +220,7 @@ def post_create(request):
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        retry_write(post.save)()
         return redirect("posts:profile", request.user)
     context = {
         'form': form
@@ -93,7 +240,7 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        retry_write(form.save)()
         return redirect('posts:post_detail', post_id=post_id)
     context = {
         'post': post,
@@ -103,37 +250,38 @@ def post_edit(request, post_id):
     return render(request, 'posts/create_post.html', context)
 
 
+@retry_write
+def save_comment(comment):
+    """Комментарий, уведомление и письмо о нём записываются одной
+    транзакцией: либо всё, либо ничего."""
+    comment.save()
+    notifications.notify(comment)
+
+
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author__profile'), pk=post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
-    send_mail(
-        'Новый комментарий',
-        f'У вас новый комментарий к посту "{post.heading}". '+ 
-        f'{comment.author}: {comment.text}',
-        'YaTube@YaTube.ru',
-        [request.user.email],
-        fail_silently=False,
-    ) 
+        save_comment(comment)
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-
-    follow_posts = Post.objects.filter(author__following__user=request.user)
-
-    paginator = Paginator(follow_posts, NUM_OF_POSTS)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-
+    follow_posts = timeline.feed(request.user.pk).select_related(
+        'author', 'group')
     context = {
-        'page_obj': page_obj
+        'page_obj': get_paginator(
+            request,
+            follow_posts,
+            f'follower:{request.user.pk}',
+            keys=('feed_date', 'feed_post'),
+        )
     }
     return render(request, 'posts/follow.html', context)
 
@@ -143,7 +291,7 @@ def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
 
     if request.user != author:
-        Follow.objects.get_or_create(
+        retry_write(Follow.objects.get_or_create)(
             user=request.user,
             author=author,
         )
@@ -154,6 +302,28 @@ def profile_follow(request, username):
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(user=request.user, author=author).delete()
+    retry_write(
+        Follow.objects.filter(user=request.user, author=author).delete)()
 
     return redirect('posts:profile', username=username)
+
+
+@login_required
+def notification_list(request):
+    form = NotificationSettingsForm(
+        request.POST or None, instance=profile_of(request.user))
+    if form.is_valid():
+        retry_write(form.save)()
+        return redirect('posts:notifications')
+    items = request.user.notifications.select_related(
+        'comment__author', 'comment__post').order_by('-created')
+    page_obj = Paginator(items, NUM_OF_POSTS).get_page(
+        request.GET.get('page'))
+    unread = [item.pk for item in page_obj if not item.read]
+    retry_write(Notification.objects.filter(pk__in=unread).update)(read=True)
+    context = {
+        'form': form,
+        'page_obj': page_obj,
+        'unread': set(unread),
+    }
+    return render(request, 'posts/notifications.html', context)
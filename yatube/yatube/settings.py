@@ -69,6 +69,56 @@ INTERNAL_IPS = [
 
 NUM_OF_POSTS = 10
 
+TIMELINE_LENGTH = 1000
+
+TIMELINE_FANOUT_FOLLOWER_LIMIT = 10000
+
+TIMELINE_FANOUT_INLINE_LIMIT = 100
+
+TIMELINE_FANOUT_BATCH_SIZE = 1000
+
+TIMELINE_RECENT_POSTS = 100
+
+MAX_PAGE_NUMBER = 50
+
+FEED_CACHE_TIMEOUT = 60 * 60 * 24
+
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24 * 7
+
+STALE_READ_DEADLINE = 2
+
+STALE_PAGE_TIMEOUT = 60 * 60 * 24
+
+STALE_PAGE_REFRESH = 10
+
+DB_WRITE_RETRIES = 3
+
+DB_RETRY_BACKOFF = 0.05
+
+POST_THUMBNAILS = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+
+POST_IMAGE_WIDTHS = (480, 960, 1440)
+
+POST_IMAGE_FORMATS = ('WEBP', 'JPEG')
+
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+
+POST_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+
+POST_IMAGE_MAX_PIXELS = 50 * 10 ** 6
+
+POST_IMAGE_MAX_SIDE = 2560
+
+POST_IMAGE_MEMORY_LIMIT = 128 * 1024 * 1024
+
+# Сколько секунд после загрузки картинку нельзя удалить, даже если на неё
+# ещё не ссылается ни один пост: столько может идти сохранение поста.
+IMAGE_RELEASE_GRACE = 10 * 60
+
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
@@ -77,7 +127,39 @@ LOGIN_URL = 'users:login'
 
 LOGIN_REDIRECT_URL = 'posts:index'
 
-EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+# Поиск ранжирует не больше стольких самых новых совпадений.
+SEARCH_MAX_RANKED = 5000
+
+# Сводка комментариев уходит не позже чем через столько секунд после
+# первого неотправленного уведомления.
+COMMENT_DIGEST_WINDOW = 60 * 60
+
+# Фоновые задачи core.jobs выполняет `manage.py runworker`.
+# Секунды, на которые задача по умолчанию занята исполнителем.
+JOB_VISIBILITY_TIMEOUT = 300
+
+# Секунды до второй попытки упавшей задачи, дальше задержка удваивается.
+JOB_RETRY_BACKOFF = 30
+
+# Сколько секунд хранить выполненные задачи для статистики.
+JOB_KEEP_DONE = 24 * 60 * 60
+
+# Письма записываются в таблицу core.OutboxMessage вместе с транзакцией
+# запроса, а отправляет их `manage.py send_outbox` через бэкенд
+# OUTBOX_EMAIL_BACKEND.
+EMAIL_BACKEND = 'core.outbox.OutboxBackend'
+
+OUTBOX_EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+
+OUTBOX_BATCH_SIZE = 100
+
+OUTBOX_MAX_ATTEMPTS = 6
+
+# Секунды до второй попытки, дальше задержка удваивается.
+OUTBOX_RETRY_BACKOFF = 60
+
+# На сколько секунд письмо забирается отправителем.
+OUTBOX_LEASE = 300
 
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
@@ -130,11 +212,47 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# Файлы общего кэша и шины инвалидации. У каждой копии проекта свой
+# каталог, тесты получают временный (yatube.test_runner).
+CACHE_DIR = os.environ.get(
+    'YATUBE_CACHE_DIR', os.path.join(BASE_DIR, 'cache'))
+
+
+def cache_settings(directory):
+    return {
+        'default': {
+            'BACKEND': 'core.tiered.TieredCache',
+            'LOCATION': 'shared',
+            'OPTIONS': {
+                'BUS': os.path.join(directory, 'bus.sqlite3'),
+                'L1_SIZE': 1000,
+                'L1_TIMEOUT': 5,
+            },
+        },
+        'shared': {
+            'BACKEND': 'core.cache.MmapCache',
+            'LOCATION': os.path.join(directory, 'shared.cache'),
+            'OPTIONS': {
+                'SLOTS': 4096,
+                'SLOT_SIZE': 16384,
+            },
+        },
+        # Копии страниц для core.resilience.serve_stale: у них свой файл,
+        # чтобы они не вытесняли фрагменты и счётчики из 'shared'.
+        'stale': {
+            'BACKEND': 'core.cache.MmapCache',
+            'LOCATION': os.path.join(directory, 'stale.cache'),
+            'OPTIONS': {
+                'SLOTS': 1024,
+                'SLOT_SIZE': 65536,
+            },
+        },
     }
-}
+
+
+CACHES = cache_settings(CACHE_DIR)
+
+TEST_RUNNER = 'yatube.test_runner.TemporaryCacheRunner'
 
 LANGUAGE_CODE = 'ru-Ru'
 
@@ -0,0 +1,24 @@
+import shutil
+import tempfile
+
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from .settings import cache_settings
+
+
+class TemporaryCacheRunner(DiscoverRunner):
+    """Запускает тесты с файлами кэша во временном каталоге, чтобы они
+    не читали и не сбрасывали кэш работающего сайта."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_dir = tempfile.mkdtemp(prefix='yatube-cache-')
+        self.cache_override = override_settings(
+            CACHES=cache_settings(self.cache_dir))
+        self.cache_override.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_override.disable()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        super().teardown_test_environment(**kwargs)
@@ -17,8 +17,11 @@ from django.contrib import admin
 from django.urls import include, path
 from django.conf import settings
 
+from core.views import cache_stats
+
 urlpatterns = [
     path('', include('posts.urls', namespace='posts')),
+    path('admin/cache-stats/', cache_stats, name='cache_stats'),
     path('admin/', admin.site.urls),
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),